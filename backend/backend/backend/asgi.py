@@ -3,6 +3,12 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this entry point (e.g. ``uvicorn backend.asgi:application``)
+so the chat endpoints are handled asynchronously: a chat waiting on Gemini holds no
+worker thread, and /api/chat/stream/ sends Server-Sent Events as they are produced.
+Under WSGI each chat ties up a worker and the stream is buffered and sent in one piece.
+``manage.py loadtest_chat`` checks that the ticket APIs stay fast while chats are in flight.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -0,0 +1,93 @@
+"""
+In-process background jobs for slow work that must not block a request
+(remote embedding / LLM calls).
+
+Jobs run on a shared thread pool after the surrounding transaction
+commits. Submitting a job under a `key` that is already queued is a
+no-op, and one submitted while the same key is running runs again once
+that finishes, so bursts of edits to one object coalesce into at most
+one extra run. Jobs live in process memory: anything lost on a restart
+must be recoverable by a catch-up command (e.g. `manage.py embed_kb`).
+"""
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import metrics
+
+_executor = None
+_executor_lock = threading.Lock()
+_state_lock = threading.Lock()
+_queued = set()      # keys waiting to start
+_running = set()     # keys currently running
+_rerun = {}          # key -> (func, args, kwargs) submitted while running
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "BACKGROUND_WORKERS", 4),
+                thread_name_prefix="background",
+            )
+        return _executor
+
+
+def run_in_background(func, *args, key=None, **kwargs):
+    """
+    Run func(*args, **kwargs) on the background pool once the current
+    transaction commits (immediately if there is none). With
+    BACKGROUND_TASKS_SYNC the job runs inline instead, for scripts and tests.
+    """
+    transaction.on_commit(lambda: _submit(func, args, kwargs, key))
+
+
+def _submit(func, args, kwargs, key):
+    if getattr(settings, "BACKGROUND_TASKS_SYNC", False):
+        _run(func, args, kwargs, key=None)
+        return
+    if key is not None:
+        with _state_lock:
+            if key in _queued:
+                metrics.incr("background.coalesced")
+                return
+            if key in _running:
+                _rerun[key] = (func, args, kwargs)
+                metrics.incr("background.coalesced")
+                return
+            _queued.add(key)
+    metrics.incr("background.submitted")
+    _get_executor().submit(_run, func, args, kwargs, key)
+
+
+def _run(func, args, kwargs, key):
+    if key is not None:
+        with _state_lock:
+            _queued.discard(key)
+            _running.add(key)
+    try:
+        func(*args, **kwargs)
+        metrics.incr("background.succeeded")
+    except Exception:
+        metrics.incr("background.failed")
+        print(f"❌ Background job {getattr(func, '__name__', func)} failed:\n{traceback.format_exc()}")
+    finally:
+        close_old_connections()
+        if key is not None:
+            with _state_lock:
+                _running.discard(key)
+                again = _rerun.pop(key, None)
+            if again is not None:
+                _submit(*again, key)
+
+
+def pending_count():
+    with _state_lock:
+        return len(_queued) + len(_running)
+
+
+metrics.register_gauge("background.pending", pending_count)
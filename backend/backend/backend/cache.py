@@ -0,0 +1,110 @@
+"""
+Cache backends shared by the query embedding and classification caches.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of a text, for building cache keys."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def normalize_words(text):
+    """Lowercase words only: case, punctuation and spacing ignored ("WiFi is down!!" == "wifi is down")."""
+    return " ".join(_NON_WORD.sub(" ", (text or "").lower()).split())
+
+
+class LocalLRUCache:
+    """Thread-safe in-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_size=10000, ttl=86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheBackend:
+    """
+    Stores entries in a Django cache alias so every worker shares them.
+    Eviction (LRU or otherwise) is whatever that cache backend does; entries expire after `ttl`.
+
+    The alias is shared with other users (throttle buckets, ...), so clear() can't
+    flush it: entries are written under a cache version (the generation stored at
+    <prefix>generation) and clear() bumps the generation, orphaning only this
+    backend's entries until they expire.
+    """
+
+    def __init__(self, alias="default", ttl=86400, prefix=""):
+        self.alias = alias
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def generation_key(self):
+        return self.prefix + "generation"
+
+    def _generation(self):
+        generation = self.cache.get(self.generation_key)
+        if generation is None:
+            self.cache.add(self.generation_key, 1, None)
+            generation = self.cache.get(self.generation_key, 1)
+        return generation
+
+    def get(self, key):
+        return self.cache.get(self.prefix + key, version=self._generation())
+
+    def set(self, key, value):
+        self.cache.set(self.prefix + key, value, self.ttl, version=self._generation())
+
+    def delete(self, key):
+        self.cache.delete(self.prefix + key, version=self._generation())
+
+    def clear(self):
+        try:
+            self.cache.incr(self.generation_key)
+        except ValueError:
+            # No generation stored (never used, or evicted): anything left is from an unknown one
+            self.cache.add(self.generation_key, 2, None)
@@ -0,0 +1,139 @@
+"""
+Circuit breaker for calls to slow or unreliable external services.
+"""
+import threading
+import time
+from collections import deque
+
+from . import metrics
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    closed    - calls go through. It opens after `failure_threshold` consecutive
+                failures, or when more than (1 - latency_quantile) of the last
+                `window` calls ran over their latency budget, i.e. the p95 latency
+                is above budget.
+    open      - allow() returns False so callers use their fallback straight away.
+    half_open - after `reset_timeout` seconds one probe call is let through;
+                success closes the circuit, failure (or a slow probe) re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, latency_quantile=0.95,
+                 window=50, min_samples=20, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_quantile = latency_quantile
+        self.min_samples = min_samples
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._slow = deque(maxlen=window)  # True for each recent call over its latency budget
+        self._opened_at = None
+        self._probing = False
+        self._trips = 0
+        self._reason = None
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self):
+        """True if a call may go ahead now; in half-open state only one probe at a time."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+        metrics.incr(f"{self.name}.circuit.rejected")
+        return False
+
+    def record_success(self, seconds, budget=None):
+        """Report a completed call that took `seconds`; `budget` is its latency budget, if any."""
+        slow = budget is not None and seconds > budget
+        with self._lock:
+            self._failures = 0
+            if self._state == self.HALF_OPEN:
+                if slow:
+                    self._trip("slow probe")
+                else:
+                    self._close()
+                return
+            if budget is None:
+                return
+            self._slow.append(slow)
+            if len(self._slow) >= self.min_samples and self._slow_fraction() > 1 - self.latency_quantile:
+                self._trip(f"p{round(self.latency_quantile * 100)} latency over budget")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN:
+                self._trip("failed probe")
+            elif self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._trip(f"{self._failures} consecutive failures")
+
+    def record_cancelled(self):
+        """A call its caller abandoned: frees the half-open probe without judging the service."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self):
+        """State for monitoring (registered as a gauge in backend.metrics)."""
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "slow_fraction": round(self._slow_fraction(), 4) if self._slow else None,
+                "trips": self._trips,
+                "last_trip_reason": self._reason,
+                "open_for_seconds": (
+                    round(self._clock() - self._opened_at, 1) if self._state != self.CLOSED else None
+                ),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._close()
+            self._trips = 0
+            self._reason = None
+
+    # ----- internals (caller holds the lock) -----
+
+    def _slow_fraction(self):
+        return sum(self._slow) / len(self._slow) if self._slow else 0.0
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probing = False
+
+    def _trip(self, reason):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self._probing = False
+        self._slow.clear()
+        self._trips += 1
+        self._reason = reason
+        metrics.incr(f"{self.name}.circuit.opened")
+        print(f"⚠️ {self.name} circuit opened ({reason}); using fallbacks for {self.reset_timeout:g}s")
+
+    def _close(self):
+        if self._state != self.CLOSED:
+            print(f"✅ {self.name} circuit closed")
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probing = False
+        self._failures = 0
+        self._slow.clear()
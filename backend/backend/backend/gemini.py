@@ -0,0 +1,227 @@
+"""
+Shared Google Gemini client used by ticket classification, chat and KB embeddings.
+
+genai.configure() sets process-wide state, so it runs once per API key
+instead of once per request. Model names are resolved from list_models()
+once per capability and cached for GEMINI_MODEL_TTL_SECONDS, and each
+call's latency is recorded under "gemini.<operation>" in backend.metrics.
+
+Every call has a deadline (GEMINI_TIMEOUT_SECONDS and friends) and goes
+through one shared circuit breaker: while it is open, calls raise
+GeminiCircuitOpen immediately and callers take their local fallback
+instead of tying up a worker waiting on a failing API. The breaker state
+is exported as the "gemini.circuit" gauge.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from django.conf import settings
+
+from . import metrics
+from .circuit_breaker import CircuitBreaker
+
+# capability -> (generation method the model must support, substring its name must contain, fallback)
+CAPABILITIES = {
+    "generate": ("generateContent", "gemini", "gemini-pro"),
+    "embed": ("embedContent", "embedding", "models/embedding-001"),
+}
+
+
+class GeminiUnavailable(Exception):
+    """Raised when no GEMINI_API_KEY is configured."""
+
+
+class GeminiCircuitOpen(GeminiUnavailable):
+    """Raised instead of calling Gemini while the circuit breaker is open."""
+
+
+class GeminiClientManager:
+    """Thread-safe owner of the genai configuration, resolved model names and model objects."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configured_key = None
+        self._resolved = {}   # capability -> (model name, expires_at)
+        self._models = {}     # model name -> GenerativeModel
+
+    @property
+    def api_key(self):
+        return os.getenv("GEMINI_API_KEY")
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def configure(self):
+        """Configure genai for the current API key (a no-op if already done)."""
+        api_key = self.api_key
+        if not api_key:
+            raise GeminiUnavailable("No GEMINI_API_KEY found")
+        if api_key != self._configured_key:
+            with self._lock:
+                if api_key != self._configured_key:
+                    genai.configure(api_key=api_key)
+                    self._configured_key = api_key
+                    self._resolved.clear()
+                    self._models.clear()
+
+    def resolve_model(self, capability="generate"):
+        """Name of the first available model for `capability`, cached with a TTL."""
+        self.configure()
+        cached = self._resolved.get(capability)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+
+        method, name_part, fallback = CAPABILITIES[capability]
+        model_name = fallback
+        ttl = getattr(settings, "GEMINI_MODEL_TTL_SECONDS", 3600)
+        timeout = settings.GEMINI_TIMEOUT_SECONDS
+        try:
+            # list_models() pages lazily, so the whole listing is read inside the guarded call
+            models = self._call("list_models", timeout, lambda: list(
+                genai.list_models(request_options=_request_options(timeout))))
+            for m in models:
+                if method in m.supported_generation_methods and name_part in m.name:
+                    model_name = m.name
+                    break
+        except Exception as e:
+            print(f"⚠️ Could not list Gemini models, using {fallback}: {e}")
+            # Look again once the circuit could have closed, rather than keeping the fallback for the full TTL
+            ttl = min(ttl, breaker.reset_timeout)
+        with self._lock:
+            self._resolved[capability] = (model_name, time.monotonic() + ttl)
+        return model_name
+
+    def generative_model(self, capability="generate"):
+        model_name = self.resolve_model(capability)
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.setdefault(model_name, genai.GenerativeModel(model_name))
+        return model
+
+    def generate_content(self, prompt, operation="generate", timeout=None, **kwargs):
+        """Run a prompt on the resolved generation model, within `timeout` seconds."""
+        timeout = timeout or settings.GEMINI_TIMEOUT_SECONDS
+        model = self.generative_model()
+        return self._call(operation, timeout, lambda: model.generate_content(
+            prompt, request_options=_request_options(timeout), **kwargs))
+
+    def embed_content(self, operation="embed", timeout=None, **kwargs):
+        """genai.embed_content with the shared configuration; kwargs pass straight through."""
+        timeout = timeout or settings.GEMINI_EMBED_TIMEOUT_SECONDS
+        self.configure()
+        return self._call(operation, timeout, lambda: genai.embed_content(
+            request_options=_request_options(timeout), **kwargs))
+
+    async def generate_content_async(self, prompt, operation="generate", timeout=None, **kwargs):
+        """generate_content for async views: waits on the API without holding a thread."""
+        timeout = timeout or settings.GEMINI_TIMEOUT_SECONDS
+        model = await asyncio.to_thread(self.generative_model)   # list_models() at most once per TTL
+        self._admit(operation)
+        started = time.perf_counter()
+        try:
+            with timed(operation):
+                result = await asyncio.wait_for(
+                    model.generate_content_async(prompt, request_options=_request_options(timeout), **kwargs),
+                    timeout,
+                )
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success(time.perf_counter() - started,
+                               budget=timeout * settings.GEMINI_BREAKER_LATENCY_BUDGET)
+        return result
+
+    def stream_content(self, prompt, operation="generate_stream", timeout=None, **kwargs):
+        """
+        Yield the answer's text piece by piece as Gemini generates it. Time to the
+        first piece is recorded as gemini.<operation>.first_token.
+        """
+        timeout = timeout or settings.GEMINI_TIMEOUT_SECONDS
+        model = self.generative_model()
+        self._admit(operation)
+        started = time.perf_counter()
+        first_token = True
+        failed = False
+        try:
+            with timed(operation):
+                stream = model.generate_content(prompt, stream=True, request_options=_request_options(timeout),
+                                                **kwargs)
+                for chunk in stream:
+                    if first_token:
+                        metrics.observe(f"gemini.{operation}.first_token", time.perf_counter() - started)
+                        first_token = False
+                    if chunk.text:
+                        yield chunk.text
+        except Exception:
+            failed = True
+            breaker.record_failure()
+            raise
+        finally:
+            # A client that stops reading early is not a Gemini failure
+            if not failed:
+                breaker.record_success(time.perf_counter() - started,
+                                       budget=timeout * settings.GEMINI_BREAKER_LATENCY_BUDGET)
+
+    def _admit(self, operation):
+        if not breaker.allow():
+            metrics.incr(f"gemini.{operation}.short_circuited")
+            raise GeminiCircuitOpen(f"Gemini circuit open, skipping {operation}")
+
+    def _call(self, operation, timeout, func):
+        self._admit(operation)
+        started = time.perf_counter()
+        try:
+            with timed(operation):
+                result = func()
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success(time.perf_counter() - started,
+                               budget=timeout * settings.GEMINI_BREAKER_LATENCY_BUDGET)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._configured_key = None
+            self._resolved.clear()
+            self._models.clear()
+
+
+def _request_options(timeout):
+    # No client-side retries: a retry would run past the deadline
+    return {"timeout": timeout, "retry": None}
+
+
+@contextmanager
+def timed(operation):
+    """Record the duration of a Gemini call as gemini.<operation>, counting failures separately."""
+    name = f"gemini.{operation}"
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.incr(f"{name}.error")
+        raise
+    else:
+        metrics.incr(f"{name}.ok")
+    finally:
+        metrics.observe(name, time.perf_counter() - started)
+
+
+breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=getattr(settings, "GEMINI_BREAKER_FAILURES", 5),
+    reset_timeout=getattr(settings, "GEMINI_BREAKER_RESET_SECONDS", 30),
+)
+metrics.register_gauge("gemini.circuit", breaker.snapshot)
+
+gemini = GeminiClientManager()
@@ -0,0 +1,75 @@
+"""
+Lightweight in-process metrics: counters, latency samples and gauges.
+
+Values are per worker process; GET /api/metrics/ returns this process's
+snapshot. Names are dotted, e.g. "kb.query_embedding_cache.hit".
+"""
+import threading
+from collections import defaultdict, deque
+
+import numpy as np
+
+SAMPLE_WINDOW = 1000  # latency samples kept per timer for percentiles
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = defaultdict(lambda: deque(maxlen=SAMPLE_WINDOW))
+_timing_counts = defaultdict(int)
+_gauges = {}
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, seconds):
+    """Record one latency sample (in seconds) for timer `name`."""
+    with _lock:
+        _timings[name].append(seconds)
+        _timing_counts[name] += 1
+
+
+def register_gauge(name, func):
+    """Report func() under `name` at snapshot time (e.g. a cache size)."""
+    _gauges[name] = func
+
+
+def percentile(name, q):
+    """q-th percentile (0-100) of the recent samples for `name` in seconds, or None."""
+    with _lock:
+        samples = list(_timings.get(name, ()))
+    if not samples:
+        return None
+    return float(np.percentile(samples, q))
+
+
+def snapshot():
+    with _lock:
+        counters = dict(_counters)
+        timings = {name: (list(samples), _timing_counts[name]) for name, samples in _timings.items()}
+    summary = {}
+    for name, (samples, count) in timings.items():
+        if not samples:
+            continue
+        ms = np.asarray(samples) * 1000
+        summary[name] = {
+            "count": count,
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        }
+    gauges = {}
+    for name, func in list(_gauges.items()):
+        try:
+            gauges[name] = func()
+        except Exception as e:
+            gauges[name] = f"error: {e}"
+    return {"counters": counters, "timings": summary, "gauges": gauges}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+        _timing_counts.clear()
@@ -0,0 +1,86 @@
+"""
+Rate limiting primitives shared across apps.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: holds up to `capacity` tokens, refilled at
+    `rate` tokens per second. acquire() blocks until enough tokens exist,
+    so callers are smoothed to the configured rate with bursts up to capacity.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests, burst=None):
+        return cls(requests / 60.0, burst if burst is not None else max(1, requests // 10))
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available right now; returns False instead of waiting."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then take them. Returns seconds waited."""
+        if tokens > self.capacity:
+            # More than the bucket can ever hold: take it in full-bucket installments.
+            waited = 0.0
+            while tokens > 0:
+                step = min(tokens, self.capacity)
+                waited += self.acquire(step)
+                tokens -= step
+            return waited
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many operations run at once. try_acquire() never waits, so callers
+    can turn work away immediately ("busy") instead of queueing it.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @property
+    def in_flight(self):
+        return self._in_flight
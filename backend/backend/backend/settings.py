@@ -152,8 +152,126 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Reverse proxies in front of Django; throttles take the client IP from X-Forwarded-For only this deep
+    "NUM_PROXIES": int(os.getenv('NUM_PROXIES', 0)),
 }
 
+# Shared cache (throttle buckets, KB_QUERY_CACHE_BACKEND='django'). Set REDIS_URL (needs the redis
+# package) so all workers share it; without it each process has its own local-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.getenv('REDIS_URL')}}
+
+# Throttles for the public endpoints that make paid Gemini calls: token buckets per authenticated
+# user (_USER_*) or per client IP (_ANON_*), refilled at _PER_MINUTE and holding up to _BURST requests,
+# kept in the THROTTLE_CACHE_ALIAS cache. Over the limit gets a 429 with Retry-After.
+THROTTLE_CACHE_ALIAS = os.getenv('THROTTLE_CACHE_ALIAS', 'default')
+CHAT_THROTTLE_ANON_PER_MINUTE = float(os.getenv('CHAT_THROTTLE_ANON_PER_MINUTE', 10))
+CHAT_THROTTLE_ANON_BURST = int(os.getenv('CHAT_THROTTLE_ANON_BURST', 5))
+CHAT_THROTTLE_USER_PER_MINUTE = float(os.getenv('CHAT_THROTTLE_USER_PER_MINUTE', 20))
+CHAT_THROTTLE_USER_BURST = int(os.getenv('CHAT_THROTTLE_USER_BURST', 10))
+KB_SEARCH_THROTTLE_ANON_PER_MINUTE = float(os.getenv('KB_SEARCH_THROTTLE_ANON_PER_MINUTE', 30))
+KB_SEARCH_THROTTLE_ANON_BURST = int(os.getenv('KB_SEARCH_THROTTLE_ANON_BURST', 10))
+KB_SEARCH_THROTTLE_USER_PER_MINUTE = float(os.getenv('KB_SEARCH_THROTTLE_USER_PER_MINUTE', 60))
+KB_SEARCH_THROTTLE_USER_BURST = int(os.getenv('KB_SEARCH_THROTTLE_USER_BURST', 20))
+
+# Gemini model names are looked up once per capability and cached this long
+GEMINI_MODEL_TTL_SECONDS = int(os.getenv('GEMINI_MODEL_TTL_SECONDS', 3600))
+
+# Per-call Gemini deadlines: interactive generation (chat, single classification),
+# embeddings, and batch calls (bulk classification, batch article embedding)
+GEMINI_TIMEOUT_SECONDS = float(os.getenv('GEMINI_TIMEOUT_SECONDS', 8))
+GEMINI_EMBED_TIMEOUT_SECONDS = float(os.getenv('GEMINI_EMBED_TIMEOUT_SECONDS', 3))
+GEMINI_BATCH_TIMEOUT_SECONDS = float(os.getenv('GEMINI_BATCH_TIMEOUT_SECONDS', 60))
+
+# Circuit breaker shared by all Gemini calls: opens after N consecutive failures
+# or when p95 latency exceeds the budget (a fraction of each call's deadline),
+# then sends callers to their local fallbacks until a half-open probe succeeds
+GEMINI_BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', 5))
+GEMINI_BREAKER_LATENCY_BUDGET = float(os.getenv('GEMINI_BREAKER_LATENCY_BUDGET', 0.75))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv('GEMINI_BREAKER_RESET_SECONDS', 30))
+
+# Bulk ticket classification: tickets per Gemini prompt, concurrent prompts,
+# request rate, and the most tickets one API call may classify. The API classifies
+# within the request, so its cap defaults to one prompt's worth; larger backlogs
+# go through `manage.py classify_tickets`.
+TICKET_CLASSIFY_BATCH_SIZE = int(os.getenv('TICKET_CLASSIFY_BATCH_SIZE', 20))
+TICKET_CLASSIFY_WORKERS = int(os.getenv('TICKET_CLASSIFY_WORKERS', 4))
+TICKET_CLASSIFY_REQUESTS_PER_MINUTE = int(os.getenv('TICKET_CLASSIFY_REQUESTS_PER_MINUTE', 60))
+TICKET_CLASSIFY_API_MAX = int(os.getenv('TICKET_CLASSIFY_API_MAX', TICKET_CLASSIFY_BATCH_SIZE))
+
+# LLM ticket classifications are cached by normalized subject + description
+# ('local' per-process LRU or 'django' to share a Django cache alias)
+TICKET_CLASSIFY_CACHE_BACKEND = os.getenv('TICKET_CLASSIFY_CACHE_BACKEND', 'local')
+TICKET_CLASSIFY_CACHE_ALIAS = os.getenv('TICKET_CLASSIFY_CACHE_ALIAS', 'default')
+TICKET_CLASSIFY_CACHE_SIZE = int(os.getenv('TICKET_CLASSIFY_CACHE_SIZE', 10000))
+TICKET_CLASSIFY_CACHE_TTL = int(os.getenv('TICKET_CLASSIFY_CACHE_TTL', 604800))
+
+# Local NumPy ticket classifier (manage.py train_ticket_classifier); predictions
+# at or above the confidence threshold skip Gemini entirely
+TICKET_LOCAL_MODEL_PATH = os.getenv('TICKET_LOCAL_MODEL_PATH', str(BASE_DIR / 'var' / 'ticket_classifier.npz'))
+TICKET_LOCAL_MODEL_CONFIDENCE = float(os.getenv('TICKET_LOCAL_MODEL_CONFIDENCE', 0.85))
+
+# Background jobs (embedding, LLM refinement) run on an in-process thread pool.
+# BACKGROUND_TASKS_SYNC=True runs them inline instead (scripts/tests).
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 4))
+BACKGROUND_TASKS_SYNC = os.getenv('BACKGROUND_TASKS_SYNC', 'False') == 'True'
+
+# Chats handled at once per process (/api/chat/ + /api/chat/stream/); more get a 503 "busy".
+# Under ASGI an /api/chat/ request waiting on Gemini holds no thread, so this bounds Gemini load.
+CHAT_MAX_CONCURRENCY = int(os.getenv('CHAT_MAX_CONCURRENCY', 200))
+# A stream blocks a thread on Gemini's synchronous streaming API for the whole answer, so
+# streams run on a pool of their own this size (within CHAT_MAX_CONCURRENCY) and get "busy"
+# when it is full, rather than queueing or starving the executor /api/chat/ runs its ORM work on.
+CHAT_STREAM_MAX_CONCURRENCY = int(os.getenv('CHAT_STREAM_MAX_CONCURRENCY', 32))
+
+# Chatbot sessions: the last CHAT_SESSION_CACHE_SIZE conversations are kept in memory and written
+# to the DB when evicted. Older messages beyond CHAT_SESSION_RECENT_TURNS are folded, CHAT_SESSION_SUMMARY_BATCH
+# at a time, into a rolling summary, so history costs a bounded number of prompt tokens.
+CHAT_SESSION_CACHE_SIZE = int(os.getenv('CHAT_SESSION_CACHE_SIZE', 1000))
+CHAT_SESSION_RECENT_TURNS = int(os.getenv('CHAT_SESSION_RECENT_TURNS', 6))
+CHAT_SESSION_SUMMARY_BATCH = int(os.getenv('CHAT_SESSION_SUMMARY_BATCH', 4))
+CHAT_SESSION_SUMMARY_TOKENS = int(os.getenv('CHAT_SESSION_SUMMARY_TOKENS', 250))
+CHAT_SESSION_TURN_TOKENS = int(os.getenv('CHAT_SESSION_TURN_TOKENS', 150))
+CHAT_SESSION_TTL = int(os.getenv('CHAT_SESSION_TTL', 86400))
+
+# Chatbot FAQ short-circuit: questions matching an active FAQ question (same normalized text, or a
+# question embedding with cosine >= CHAT_FAQ_THRESHOLD) or a canned response title are answered
+# without the LLM. The index is rebuilt on FAQ edits and every CHAT_FAQ_REFRESH_SECONDS.
+CHAT_FAQ_THRESHOLD = float(os.getenv('CHAT_FAQ_THRESHOLD', 0.92))
+CHAT_FAQ_REFRESH_SECONDS = int(os.getenv('CHAT_FAQ_REFRESH_SECONDS', 300))
+
+# Chatbot semantic answer cache: a question whose embedding is at least this
+# similar to a cached one reuses its answer while the source articles are unchanged
+CHAT_ANSWER_CACHE_SIZE = int(os.getenv('CHAT_ANSWER_CACHE_SIZE', 1000))
+CHAT_ANSWER_CACHE_TTL = int(os.getenv('CHAT_ANSWER_CACHE_TTL', 3600))
+CHAT_ANSWER_CACHE_THRESHOLD = float(os.getenv('CHAT_ANSWER_CACHE_THRESHOLD', 0.95))
+
+# Knowledge base semantic search
+# Full rebuild interval for the per-process vector index (picks up other workers' writes)
+KB_VECTOR_INDEX_REFRESH_SECONDS = int(os.getenv('KB_VECTOR_INDEX_REFRESH_SECONDS', 300))
+# IVF approximate index, built by `manage.py build_kb_ann` and mmapped by every worker.
+# Below KB_ANN_MIN_SIZE vectors the exact scan is used; KB_ANN_NPROBE trades latency for recall.
+KB_ANN_INDEX_PATH = os.getenv('KB_ANN_INDEX_PATH', str(BASE_DIR / 'var' / 'kb_ann'))
+KB_ANN_MIN_SIZE = int(os.getenv('KB_ANN_MIN_SIZE', 5000))
+KB_ANN_NPROBE = int(os.getenv('KB_ANN_NPROBE', 8))
+# Chunk index ANN directory, and RAG passage sizing (tokens are estimated at ~4 chars each)
+KB_CHUNK_ANN_INDEX_PATH = os.getenv('KB_CHUNK_ANN_INDEX_PATH', str(BASE_DIR / 'var' / 'kb_chunk_ann'))
+KB_CHUNK_TOKENS = int(os.getenv('KB_CHUNK_TOKENS', 200))
+KB_CHUNK_OVERLAP_TOKENS = int(os.getenv('KB_CHUNK_OVERLAP_TOKENS', 40))
+KB_RAG_TOKEN_BUDGET = int(os.getenv('KB_RAG_TOKEN_BUDGET', 1500))
+# Passages whose not-yet-included text is under this share of their tokens are left out of the context
+KB_RAG_MIN_NOVELTY = float(os.getenv('KB_RAG_MIN_NOVELTY', 0.5))
+# Batch embedding (`manage.py embed_kb`): API request quota and resume checkpoint for --all runs
+KB_EMBED_REQUESTS_PER_MINUTE = int(os.getenv('KB_EMBED_REQUESTS_PER_MINUTE', 100))
+KB_EMBED_CHECKPOINT_PATH = os.getenv('KB_EMBED_CHECKPOINT_PATH', str(BASE_DIR / 'var' / 'embed_kb.checkpoint.json'))
+# Reciprocal-rank fusion constant for hybrid BM25 + vector ranking
+KB_RRF_K = int(os.getenv('KB_RRF_K', 60))
+# Query embedding cache: 'local' (per-process LRU) or 'django' (shared CACHES alias)
+KB_QUERY_CACHE_BACKEND = os.getenv('KB_QUERY_CACHE_BACKEND', 'local')
+KB_QUERY_CACHE_ALIAS = os.getenv('KB_QUERY_CACHE_ALIAS', 'default')
+KB_QUERY_CACHE_SIZE = int(os.getenv('KB_QUERY_CACHE_SIZE', 10000))
+KB_QUERY_CACHE_TTL = int(os.getenv('KB_QUERY_CACHE_TTL', 86400))
+
 # CORS (for React frontend, adjust later for security)
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -0,0 +1,80 @@
+"""
+Request coalescing: identical concurrent calls share one upstream call.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from backend import metrics
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key within this process: the first
+    caller runs the function and the others wait for, and share, its result or
+    exception. Nothing is kept after the call finishes (caching is up to the
+    caller), so only callers that overlap it are coalesced; each one that joins
+    a call in flight is counted as <name>.coalesced.
+
+    do() is for threads; ado() for coroutines. Both use one table of calls in
+    flight, so callers on different threads and event loops (e.g. one loop per
+    async_to_sync request) share a call too. In ado() the call runs as a task
+    on the first caller's loop, so it carries on for the other waiters if that
+    caller is cancelled (e.g. its client disconnected).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}   # key -> concurrent.futures.Future of the call in flight
+
+    def _join(self, key):
+        """(future, leader): the call in flight for key, or a new one this caller must run."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                future.set_running_or_notify_cancel()   # waiters can't cancel the shared call
+        if not leader:
+            metrics.incr(f"{self.name}.coalesced")
+        return future, leader
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def ado(self, key, func):
+        """Await func() (a coroutine function), sharing the call with concurrent callers of the same key."""
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(func())
+            task.add_done_callback(lambda done: self._task_done(key, future, done))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _task_done(self, key, future, task):
+        if task.cancelled():
+            # Only happens if the leader's event loop shuts down mid-call
+            self._finish(key, future, error=asyncio.CancelledError())
+            return
+        error = task.exception()
+        self._finish(key, future, None if error is not None else task.result(), error)
+
+    def __len__(self):
+        return len(self._calls)
@@ -0,0 +1,82 @@
+"""
+Helpers for async views and streaming responses (Server-Sent Events) served through backend/asgi.py.
+"""
+import asyncio
+import json
+import threading
+
+from django.db import connections
+
+
+def sse_event(event, data):
+    """One Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def iterate_in_thread(func, *args, on_exit=None, executor=None, **kwargs):
+    """
+    Run the blocking generator func(*args, **kwargs) on one thread of `executor`
+    (the event loop's default one if None) and
+    yield its items to the event loop as they are produced. The whole generator
+    stays on that thread, so its DB connection is used and closed in one place.
+    Exceptions raised by the generator are re-raised here.
+
+    If the consumer stops early (e.g. the client disconnected and the response
+    was closed) the producer stops before its next item and closes the
+    generator, so its finally blocks run and its upstream call is dropped.
+    on_exit() is called on the producer thread once the generator is done, for
+    resources that must be held until the work has actually stopped.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    finished = object()
+    cancelled = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            pass   # event loop already closed: nobody is reading
+
+    def produce():
+        generator = None
+        try:
+            generator = func(*args, **kwargs)
+            for item in generator:
+                if cancelled.is_set():
+                    break
+                put(item)
+        finally:
+            try:
+                if generator is not None:
+                    generator.close()
+                connections.close_all()
+            finally:
+                if on_exit is not None:
+                    on_exit()
+                put(finished)
+
+    producer = loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is finished:
+                break
+            yield item
+        await producer
+    finally:
+        cancelled.set()
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Await blocking func(*args, **kwargs) (ORM queries, sync API clients) on an
+    executor thread, closing that thread's DB connections afterwards.
+    """
+    def call():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+
+    return await asyncio.get_running_loop().run_in_executor(None, call)
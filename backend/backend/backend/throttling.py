@@ -0,0 +1,134 @@
+"""
+Token-bucket request throttling backed by a Django cache, so limits hold across workers.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from backend import metrics
+
+
+class CacheTokenBucket:
+    """
+    One token bucket per key, stored in a Django cache alias: each holds up to
+    `burst` tokens and refills at `rate` tokens per second. The alias must be a
+    shared cache (Redis, Memcached, database) for every worker to see the same
+    buckets; the default local-memory cache gives per-process limits.
+
+    Updates are serialized per key by a short lock taken with cache.add(), which
+    is atomic on every shared backend. A bucket left idle long enough to refill
+    expires from the cache, as a missing bucket counts as full.
+    """
+
+    LOCK_TIMEOUT = 1          # seconds; frees the lock if a worker dies holding it
+    LOCK_ATTEMPTS = 20
+    LOCK_RETRY_DELAY = 0.005
+
+    def __init__(self, rate, burst, alias="default", prefix="throttle:"):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.alias = alias
+        self.prefix = prefix
+        self.idle_timeout = math.ceil(self.burst / self.rate) + 1
+
+    @classmethod
+    def per_minute(cls, requests, burst, **kwargs):
+        return cls(requests / 60.0, burst, **kwargs)
+
+    def take(self, key, tokens=1):
+        """
+        Take tokens from key's bucket. Returns 0 if they were taken, else the
+        seconds until enough will have refilled. If the cache is down requests
+        are let through rather than failing the endpoint.
+        """
+        try:
+            return self._take(caches[self.alias], self.prefix + key, tokens)
+        except Exception as e:
+            print(f"⚠️ Throttle cache unavailable, not throttling: {e}")
+            return 0
+
+    def _take(self, cache, bucket_key, tokens):
+        lock_key = bucket_key + ":lock"
+        for _ in range(self.LOCK_ATTEMPTS):
+            if cache.add(lock_key, 1, self.LOCK_TIMEOUT):
+                break
+            time.sleep(self.LOCK_RETRY_DELAY)
+        else:
+            # Only a flood of concurrent requests for one key keeps the lock busy this long
+            return 1 / self.rate
+        try:
+            now = time.time()   # wall clock: buckets are shared between processes
+            level, updated = cache.get(bucket_key) or (self.burst, now)
+            level = min(self.burst, level + max(0.0, now - updated) * self.rate)
+            if level < tokens:
+                return (tokens - level) / self.rate
+            cache.set(bucket_key, (level - tokens, now), self.idle_timeout)
+            return 0
+        finally:
+            cache.delete(lock_key)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle giving each authenticated user, or each client IP for anonymous
+    requests, a CacheTokenBucket. Subclasses set `scope` and `setting_prefix`;
+    rates come from <setting_prefix>_USER_PER_MINUTE / _USER_BURST and
+    _ANON_PER_MINUTE / _ANON_BURST, in the THROTTLE_CACHE_ALIAS cache.
+    Client IPs honour REST_FRAMEWORK["NUM_PROXIES"] for X-Forwarded-For.
+    Rejections are counted as throttle.<scope>.rejected.{user,anon}.
+
+    Works for plain Django views too (call allow_request(request, None)): those
+    are keyed on the user id in the JWT, if a valid one is sent.
+    """
+
+    scope = None
+    setting_prefix = None
+
+    def __init__(self):
+        self._wait = 0
+
+    def bucket(self, kind):
+        return CacheTokenBucket.per_minute(
+            getattr(settings, f"{self.setting_prefix}_{kind}_PER_MINUTE"),
+            getattr(settings, f"{self.setting_prefix}_{kind}_BURST"),
+            alias=getattr(settings, "THROTTLE_CACHE_ALIAS", "default"),
+            prefix=f"throttle:{self.scope}:{kind.lower()}:",
+        )
+
+    def allow_request(self, request, view):
+        user_id = self.get_user_id(request)
+        if user_id is not None:
+            kind, ident = "USER", str(user_id)
+        else:
+            kind, ident = "ANON", self.get_ident(request)
+        self._wait = self.bucket(kind).take(ident)
+        if self._wait:
+            metrics.incr(f"throttle.{self.scope}.rejected.{kind.lower()}")
+            return False
+        return True
+
+    def wait(self):
+        return self._wait
+
+    def get_user_id(self, request):
+        """Id of the authenticated user, or None. Plain Django requests read it from the JWT (no DB lookup)."""
+        if isinstance(request, Request):
+            return request.user.pk if request.user.is_authenticated else None
+        auth = JWTAuthentication()
+        header = auth.get_header(request)
+        if header is None:
+            return None
+        try:
+            raw_token = auth.get_raw_token(header)
+            if raw_token is None:
+                return None
+            return auth.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+        except AuthenticationFailed:
+            return None
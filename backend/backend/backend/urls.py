@@ -20,12 +20,14 @@ from tickets.views import (
     CommentThreadViewSet,   # NEW
     CommentViewSet,         # NEW
     chat_with_ai,           # NEW AI Chatbot
+    chat_stream,
 )
 from knowledge.views import (
     KnowledgeBaseViewSet,
     CannedResponseViewSet,
     FAQViewSet, # NEW
 )
+from .views import metrics_view
 from users.views import (
     RegisterView,
     CustomTokenObtainPairView,  # Returns user role for frontend routing
@@ -49,6 +51,10 @@ urlpatterns = [
 
     # Chatbot Endpoint
     path("api/chat/", chat_with_ai, name="chat-ai"),
+    path("api/chat/stream/", chat_stream, name="chat-ai-stream"),
+
+    # Performance metrics (admins/agents)
+    path("api/metrics/", metrics_view, name="metrics"),
 
     # ===== Authentication Endpoints =====
     path("api/auth/register/", RegisterView.as_view(), name="register")
@@ -0,0 +1,17 @@
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from . import metrics
+
+
+@api_view(["GET"])
+@permission_classes([permissions.IsAuthenticated])
+def metrics_view(request):
+    """
+    Process-level performance counters (cache hit rates, AI call latency, ...).
+    GET /api/metrics/ - admins/agents only
+    """
+    if request.user.role not in [1, 3] and not request.user.is_staff:
+        return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
+    return Response(metrics.snapshot())
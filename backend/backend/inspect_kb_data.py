@@ -19,7 +19,7 @@ for a in articles:
         print(f"\nID: {a.id}")
         print(f"Title: {a.title}")
         print(f"Created By: {a.created_by}")
-        print(f"Embedding length: {len(a.embedding) if a.embedding else 'None'}")
+        print(f"Embedding length: {a.embedding_dim or 'None'}")
         print(f"Is Active: {a.is_active}")
     except Exception as e:
         print(f"❌ Error accessing article {a.id}: {e}")
@@ -0,0 +1,157 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) approximate nearest-neighbour index for unit vectors.
+
+    Vectors are clustered with spherical k-means and stored sorted by
+    cluster, so each inverted list is a contiguous slice of one matrix.
+    A query scores the centroids, then scans only the `n_probe` closest
+    lists: raising n_probe trades latency for recall (n_probe == n_lists
+    is an exact search).
+
+    The index is persisted as plain .npy files and loaded with mmap, so
+    every worker process on a host shares one copy through the page cache.
+    """
+
+    FILES = ("centroids.npy", "vectors.npy", "ids.npy", "offsets.npy")
+
+    def __init__(self, centroids, vectors, ids, offsets, built_at=None):
+        self.centroids = centroids    # (n_lists, dim) float32, unit length
+        self.vectors = vectors        # (n, dim) float32, grouped by list
+        self.ids = ids                # (n,) int64, aligned with vectors
+        self.offsets = offsets        # (n_lists + 1,) int64, list i = [offsets[i], offsets[i+1])
+        self.built_at = built_at if built_at is not None else time.time()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    # ----- building -----
+
+    @classmethod
+    def build(cls, ids, vectors, n_lists=None, iterations=20, sample_size=50000, seed=0):
+        """
+        Cluster unit-length `vectors` (n, dim) into `n_lists` inverted lists.
+        Defaults to ~4*sqrt(n) lists, a common IVF starting point.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("Cannot build an IVF index from zero vectors")
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(seed)
+        if n > sample_size:
+            train = vectors[rng.choice(n, sample_size, replace=False)]
+        else:
+            train = vectors
+        centroids = _spherical_kmeans(train, n_lists, iterations, rng)
+
+        assignment = _assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(centroids, vectors[order], ids[order], offsets)
+
+    # ----- querying -----
+
+    def search(self, query, top_k=5, n_probe=8):
+        """Return (ids, scores) of the approximate top_k by inner product, best first."""
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = max(1, min(n_probe, self.n_lists))
+
+        centroid_scores = self.centroids @ query
+        if n_probe < self.n_lists:
+            probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probe = np.arange(self.n_lists)
+
+        # Each list is a contiguous slice, so scoring reads straight from the (mmapped) matrix.
+        slices = [(self.offsets[i], self.offsets[i + 1]) for i in probe if self.offsets[i] < self.offsets[i + 1]]
+        if not slices:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = np.concatenate([self.vectors[start:end] @ query for start, end in slices])
+        ids = np.concatenate([self.ids[start:end] for start, end in slices])
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return ids[top], scores[top]
+
+    # ----- persistence -----
+
+    def save(self, path):
+        """Write the index to directory `path`, replacing any previous index there."""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, array in zip(self.FILES, (self.centroids, self.vectors, self.ids, self.offsets)):
+            np.save(os.path.join(tmp_path, name), np.ascontiguousarray(array))
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump({
+                "built_at": self.built_at,
+                "size": len(self),
+                "dim": self.dim,
+                "n_lists": self.n_lists,
+            }, f)
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load an index saved by save(); arrays are memory-mapped read-only by default."""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(path, name), mmap_mode=mode) for name in cls.FILES]
+        return cls(*arrays, built_at=meta["built_at"])
+
+
+def _assign(vectors, centroids, batch_size=8192):
+    """Index of the closest (highest inner product) centroid for each vector."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        block = vectors[start:start + batch_size]
+        assignment[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def _spherical_kmeans(vectors, k, iterations, rng):
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=k)
+        starts = (np.cumsum(counts) - counts)[counts > 0]
+        sums = np.zeros_like(centroids)
+        sums[counts > 0] = np.add.reduceat(vectors[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        if empty.any():
+            # Re-seed empty clusters from random points so no list goes unused.
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            norms[empty] = np.linalg.norm(sums[empty], axis=1)
+        centroids = (sums / norms[:, None]).astype(np.float32)
+    return centroids
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from backend import metrics
+from .models import KnowledgeBase
+
+
+class SemanticAnswerCache:
+    """
+    Reuses chatbot answers for questions that mean the same thing.
+
+    Entries are (question embedding, answer, source article versions). A lookup
+    takes the cached question with the highest cosine similarity; it is a hit
+    if that is at least `threshold`, the entry is within its TTL, and every
+    source article still exists, is active and has the same updated_at. Vectors
+    live in one preallocated matrix, so a lookup is a single mat-vec product.
+    Least recently used entries are evicted when the cache is full.
+
+    Article saves in this process also evict dependent entries straight away
+    (see knowledge/signals.py); the updated_at check covers edits made in other
+    worker processes.
+    """
+
+    def __init__(self, max_size=1000, ttl=3600, threshold=0.95, name="chat.answer_cache"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.name = name
+        self._lock = threading.Lock()
+        self._vectors = None                  # (max_size, dim) float32 unit rows
+        self._live = np.zeros(max_size, dtype=bool)
+        self._entries = OrderedDict()         # slot -> (answer, {article_id: updated_at}, expires_at)
+
+    def get(self, vector):
+        """A copy of the cached answer for a question embedding, or None."""
+        if vector is None or not self.max_size:
+            return None
+        query = _unit(vector)
+        with self._lock:
+            slot, score = self._best_match(query)
+            entry = self._entries.get(slot) if slot is not None else None
+            if entry is not None and entry[2] < time.monotonic():
+                self._drop(slot)
+                entry = None
+            if entry is None or score < self.threshold:
+                metrics.incr(f"{self.name}.miss")
+                return None
+            self._entries.move_to_end(slot)
+
+        answer, sources, _ = entry
+        if not _sources_current(sources):
+            with self._lock:
+                if self._entries.get(slot) is entry:
+                    self._drop(slot)
+            metrics.incr(f"{self.name}.stale")
+            return None
+        metrics.incr(f"{self.name}.hit")
+        return dict(answer)
+
+    def set(self, vector, answer, articles):
+        """Cache `answer` for a question embedding, remembering the versions of its source articles."""
+        if vector is None or not self.max_size:
+            return
+        vector = _unit(vector)
+        sources = {article.pk: article.updated_at for article in articles}
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.size:
+                # First entry, or the embedding model changed
+                self._vectors = np.zeros((self.max_size, vector.size), dtype=np.float32)
+                self._live[:] = False
+                self._entries.clear()
+            slot, score = self._best_match(vector)
+            if slot is None or score < 1 - 1e-6:
+                slot = self._free_slot()
+            self._vectors[slot] = vector
+            self._live[slot] = True
+            self._entries[slot] = (dict(answer), sources, time.monotonic() + self.ttl)
+            self._entries.move_to_end(slot)
+
+    def invalidate_article(self, article_id):
+        """Drop every answer that used this article."""
+        with self._lock:
+            for slot in [s for s, (_, sources, _) in self._entries.items() if article_id in sources]:
+                self._drop(slot)
+
+    def invalidate_unsourced(self):
+        """Drop answers given without any KB article; a new article may now cover them."""
+        with self._lock:
+            for slot in [s for s, (_, sources, _) in self._entries.items() if not sources]:
+                self._drop(slot)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._live[:] = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ----- internals (caller holds the lock) -----
+
+    def _best_match(self, query):
+        if not self._entries or self._vectors is None or self._vectors.shape[1] != query.size:
+            return None, -1.0
+        scores = self._vectors @ query
+        scores[~self._live] = -np.inf
+        slot = int(scores.argmax())
+        return slot, float(scores[slot])
+
+    def _free_slot(self):
+        if len(self._entries) < self.max_size:
+            return int(np.flatnonzero(~self._live)[0])
+        slot, _ = self._entries.popitem(last=False)
+        self._live[slot] = False
+        return slot
+
+    def _drop(self, slot):
+        self._entries.pop(slot, None)
+        self._live[slot] = False
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _sources_current(sources):
+    if not sources:
+        return True
+    current = dict(
+        KnowledgeBase.objects.filter(pk__in=sources, is_active=True).values_list("pk", "updated_at")
+    )
+    return current == sources
+
+
+def build_answer_cache():
+    cache = SemanticAnswerCache(
+        max_size=getattr(settings, "CHAT_ANSWER_CACHE_SIZE", 1000),
+        ttl=getattr(settings, "CHAT_ANSWER_CACHE_TTL", 3600),
+        threshold=getattr(settings, "CHAT_ANSWER_CACHE_THRESHOLD", 0.95),
+    )
+    metrics.register_gauge("chat.answer_cache.size", cache.__len__)
+    return cache
+
+
+answer_cache = build_answer_cache()
@@ -0,0 +1,140 @@
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its
+my not of on or our so that the their then there these this to was we what when
+where which who why will with you your
+""".split())
+
+# Title and tag words say more about an article than body text does.
+FIELD_WEIGHTS = {"title": 3, "tags": 2, "content": 1}
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Process-level inverted index over active KnowledgeBase articles, ranked with Okapi BM25.
+
+    Title, tags and content are indexed as one document with title/tag terms
+    counted FIELD_WEIGHTS times. Like the vector index it is built lazily,
+    updated by the KnowledgeBase save/delete signals and rebuilt every
+    KB_VECTOR_INDEX_REFRESH_SECONDS to pick up other workers' writes.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)   # term -> {article id: weighted tf}
+        self._doc_terms = {}                 # article id -> Counter of its terms
+        self._doc_len = {}                   # article id -> weighted length
+        self._total_len = 0
+        self._built_at = None
+
+    def build(self):
+        from .models import KnowledgeBase
+
+        rows = KnowledgeBase.objects.filter(is_active=True).values_list("id", "title", "content", "tags")
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._doc_terms, self._doc_len, self._total_len = {}, {}, 0
+            for article_id, title, content, tags in rows.iterator():
+                self._add(article_id, title, content, tags)
+            self._built_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        refresh = getattr(settings, "KB_VECTOR_INDEX_REFRESH_SECONDS", 300)
+        if self._built_at is None or time.monotonic() - self._built_at > refresh:
+            self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    # ----- incremental updates -----
+
+    def _add(self, article_id, title, content, tags):
+        terms = Counter()
+        for field, text in (("title", title), ("tags", (tags or "").replace(",", " ")), ("content", content)):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                terms[token] += weight
+        for term, tf in terms.items():
+            self._postings[term][article_id] = tf
+        length = sum(terms.values())
+        self._doc_terms[article_id] = terms
+        self._doc_len[article_id] = length
+        self._total_len += length
+
+    def remove(self, article_id):
+        with self._lock:
+            terms = self._doc_terms.pop(article_id, None)
+            if terms is None:
+                return
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(article_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_len -= self._doc_len.pop(article_id)
+
+    def upsert(self, article_id, title, content, tags):
+        with self._lock:
+            if self._built_at is None:
+                return  # Not loaded yet; the first search will build from the DB.
+            self.remove(article_id)
+            self._add(article_id, title, content, tags)
+
+    # ----- querying -----
+
+    def search(self, query, top_k=5):
+        """Return [(article_id, bm25_score), ...] best first."""
+        self._ensure_fresh()
+        terms = set(tokenize(query))
+        scores = defaultdict(float)
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs or not terms:
+                return []
+            avg_len = self._total_len / n_docs
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for article_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[article_id] / avg_len)
+                    scores[article_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def __len__(self):
+        return len(self._doc_len)
+
+
+def reciprocal_rank_fusion(*rankings, k=60):
+    """
+    Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank), rank starting at 1.
+    Returns [(id, fused_score), ...] best first.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, article_id in enumerate(ranking, start=1):
+            fused[article_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+bm25_index = BM25Index()
@@ -0,0 +1,59 @@
+import hashlib
+import re
+
+# Sentence ends, or blank lines between paragraphs/list items.
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token for English prose)."""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def content_hash(title, content, rag_data=""):
+    """Fingerprint of the text an article's embeddings are generated from."""
+    text = f"{title}\n\n{content}" + (f"\n\n{rag_data}" if rag_data else "")
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_passages(text, max_tokens=200, overlap_tokens=40):
+    """
+    Split text into passages of at most ~max_tokens, breaking on sentence
+    boundaries. Consecutive passages share ~overlap_tokens of trailing
+    sentences so an answer spanning a boundary survives in one of them.
+    """
+    sentences = []
+    for sentence in SENTENCE_SPLIT_RE.split(text or ""):
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        if estimate_tokens(sentence) <= max_tokens:
+            sentences.append(sentence)
+            continue
+        # A single over-long "sentence" (tables, run-on lists) is cut by words.
+        words, piece = sentence.split(), []
+        for word in words:
+            if piece and estimate_tokens(" ".join(piece + [word])) > max_tokens:
+                sentences.append(" ".join(piece))
+                piece = []
+            piece.append(word)
+        if piece:
+            sentences.append(" ".join(piece))
+
+    passages, current = [], []
+    for sentence in sentences:
+        if current and estimate_tokens(" ".join(current + [sentence])) > max_tokens:
+            passages.append(" ".join(current))
+            # Carry trailing sentences forward as overlap.
+            overlap = []
+            for previous in reversed(current):
+                if estimate_tokens(" ".join([previous] + overlap)) > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+            current = overlap
+            if current and estimate_tokens(" ".join(current + [sentence])) > max_tokens:
+                current = []
+        current.append(sentence)
+    if current:
+        passages.append(" ".join(current))
+    return passages
@@ -0,0 +1,61 @@
+import re
+
+from django.conf import settings
+
+from backend.cache import normalize_text
+from .chunking import estimate_tokens
+
+# Passages are sentences joined by single spaces (see chunking.split_passages)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def article_block(title, texts):
+    return f"---\nTitle: {title}\nContent: " + "\n".join(texts) + "\n---\n"
+
+
+def build_context(passages, token_budget=None, min_novelty=None):
+    """
+    Pack ranked passages (best first) into the RAG context for the chat prompt,
+    within token_budget estimated tokens (default KB_RAG_TOKEN_BUDGET).
+
+    Sentences already in the context (chunk overlap, or the same text in two
+    articles) are dropped from later passages, and a passage whose new text is
+    under `min_novelty` of its tokens (default KB_RAG_MIN_NOVELTY) is skipped.
+    A passage that doesn't fit is skipped too, as a shorter lower-ranked one may.
+    Passages are grouped under their article's title, articles in order of their
+    best passage and passages in article order.
+
+    Returns (context_text, passages used, estimated tokens of context_text).
+    """
+    if token_budget is None:
+        token_budget = getattr(settings, "KB_RAG_TOKEN_BUDGET", 1500)
+    if min_novelty is None:
+        min_novelty = getattr(settings, "KB_RAG_MIN_NOVELTY", 0.5)
+
+    seen = set()
+    articles = {}   # article id -> (article, [(position, text, passage), ...]), best article first
+    used = 0
+    for passage in passages:
+        sentences = [s for s in SENTENCE_END_RE.split(passage.text.strip()) if s]
+        novel = [s for s in sentences if normalize_text(s) not in seen]
+        if not novel:
+            continue
+        text = " ".join(novel)
+        if estimate_tokens(text) < min_novelty * estimate_tokens(passage.text):
+            continue
+        tokens = estimate_tokens(text) + 1   # + the newline joining it to the article's other passages
+        if passage.article.id not in articles:
+            tokens += estimate_tokens(article_block(passage.article.title, []))
+        if used + tokens > token_budget:
+            continue
+        used += tokens
+        seen.update(normalize_text(s) for s in novel)
+        articles.setdefault(passage.article.id, (passage.article, []))[1].append((passage.position, text, passage))
+
+    blocks, selected = [], []
+    for article, parts in articles.values():
+        parts.sort(key=lambda part: part[0])
+        blocks.append(article_block(article.title, [text for _, text, _ in parts]))
+        selected.extend(passage for _, _, passage in parts)
+    context_text = "".join(blocks)
+    return context_text, selected, estimate_tokens(context_text)
@@ -0,0 +1,66 @@
+import hashlib
+
+import numpy as np
+from django.conf import settings
+
+from backend import metrics
+from backend.cache import DjangoCacheBackend, LocalLRUCache, normalize_text
+from backend.singleflight import SingleFlight
+
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+class QueryEmbeddingCache:
+    """
+    Caches query embeddings keyed on (embedding model, normalized query text).
+    Vectors are stored as float32 bytes so both backends hold them compactly.
+    Concurrent misses for the same query share one compute() call.
+    """
+
+    def __init__(self, backend, name="kb.query_embedding_cache"):
+        self.backend = backend
+        self.name = name
+        self.flight = SingleFlight(name)
+
+    @staticmethod
+    def make_key(text, model):
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_or_compute(self, text, model, compute):
+        """
+        Return the cached vector for `text`, or call compute() and cache its result.
+        Failed computations (None) are not cached.
+        """
+        key = self.make_key(text, model)
+        cached = self.backend.get(key)
+        if cached is not None:
+            metrics.incr(f"{self.name}.hit")
+            return np.frombuffer(cached, dtype=EMBEDDING_DTYPE)
+
+        metrics.incr(f"{self.name}.miss")
+        data = self.flight.do(key, lambda: self._compute(key, compute))
+        return None if data is None else np.frombuffer(data, dtype=EMBEDDING_DTYPE)
+
+    def _compute(self, key, compute):
+        vector = compute()
+        if vector is None:
+            return None
+        data = np.asarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+        self.backend.set(key, data)
+        return data
+
+    def clear(self):
+        self.backend.clear()
+
+
+def build_query_embedding_cache():
+    ttl = getattr(settings, "KB_QUERY_CACHE_TTL", 86400)
+    if getattr(settings, "KB_QUERY_CACHE_BACKEND", "local") == "django":
+        backend = DjangoCacheBackend(getattr(settings, "KB_QUERY_CACHE_ALIAS", "default"), ttl, prefix="kb:qemb:")
+    else:
+        backend = LocalLRUCache(getattr(settings, "KB_QUERY_CACHE_SIZE", 10000), ttl)
+        metrics.register_gauge("kb.query_embedding_cache.size", backend.__len__)
+    return QueryEmbeddingCache(backend)
+
+
+query_embedding_cache = build_query_embedding_cache()
@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from backend import metrics
+from backend.background import run_in_background
+from backend.cache import normalize_words
+from .models import FAQ, CannedResponse
+
+
+def question_key(text):
+    """Normalized form used for exact matches: lowercase words, punctuation and spacing ignored."""
+    return normalize_words(text)
+
+
+class FAQIndex:
+    """
+    Answers chat questions that an active FAQ (or a canned response) already
+    answers, so they skip the embedding and LLM calls.
+
+    exact   - dict of question_key(FAQ question / canned response title) -> entry;
+              checked before anything else, no remote calls.
+    similar - unit-normalised FAQ question embeddings (query task type, via the
+              query embedding cache so unchanged questions are not re-embedded);
+              a question embedding whose best cosine is >= `threshold` matches.
+
+    Entries are (answered_by, object id, answer text). Lookups read a snapshot
+    swapped in whole by rebuild(), which runs in the background when FAQs or
+    canned responses change (knowledge/signals.py) and every `refresh` seconds
+    to pick up other workers' edits.
+    """
+
+    def __init__(self, threshold=0.92, refresh=300, name="chat.faq_index"):
+        self.threshold = threshold
+        self.refresh = refresh
+        self.name = name
+        self._lock = threading.Lock()
+        self._exact = {}
+        self._matrix = None      # (n, dim) float32 unit rows
+        self._entries = []       # entry per matrix row
+        self._built_at = None
+        self._rebuild_pending = False
+
+    def match_text(self, text):
+        """Entry whose FAQ question (or canned response title) is this text, normalized; else None."""
+        self._ensure_fresh()
+        return self._exact.get(question_key(text))
+
+    def match_vector(self, vector):
+        """Entry of the FAQ question most similar to this question embedding, if similar enough; else None."""
+        matrix, entries = self._matrix, self._entries
+        if vector is None or matrix is None:
+            return None
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        if query.size != matrix.shape[1]:
+            return None
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        scores = matrix @ (query / norm)
+        best = int(scores.argmax())
+        return entries[best] if scores[best] >= self.threshold else None
+
+    def rebuild(self):
+        """Reload FAQs and canned responses and embed the FAQ questions."""
+        try:
+            self._rebuild()
+        finally:
+            self._rebuild_pending = False
+
+    def _rebuild(self):
+        from .utils import generate_query_embedding
+
+        exact, entries, vectors = {}, [], []
+        for canned_id, title, text in CannedResponse.objects.values_list("id", "title", "response_text"):
+            exact.setdefault(question_key(title), ("canned_response", canned_id, text))
+        for faq_id, question, answer in FAQ.objects.filter(is_active=True).values_list("id", "question", "answer"):
+            entry = ("faq_exact", faq_id, answer)
+            exact[question_key(question)] = entry   # FAQs win over canned responses with the same title
+            vector = generate_query_embedding(question)
+            if vector is not None:
+                entries.append(("faq_similar", faq_id, answer))
+                vectors.append(np.asarray(vector, dtype=np.float32).ravel())
+
+        matrix = None
+        if vectors and len({v.size for v in vectors}) == 1:
+            matrix = np.vstack(vectors)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._exact, self._matrix, self._entries = exact, matrix, entries
+            self._built_at = time.monotonic()
+        metrics.incr(f"{self.name}.rebuilt")
+
+    def schedule_rebuild(self):
+        run_in_background(self.rebuild, key="chat-faq-index")
+
+    def _ensure_fresh(self):
+        with self._lock:
+            stale = self._built_at is None or time.monotonic() - self._built_at > self.refresh
+            if not stale or self._rebuild_pending:
+                return
+            self._rebuild_pending = True
+        self.schedule_rebuild()
+
+    def __len__(self):
+        return len(self._exact)
+
+
+def build_faq_index():
+    index = FAQIndex(
+        threshold=getattr(settings, "CHAT_FAQ_THRESHOLD", 0.92),
+        refresh=getattr(settings, "CHAT_FAQ_REFRESH_SECONDS", 300),
+    )
+    metrics.register_gauge("chat.faq_index.size", index.__len__)
+    return index
+
+
+faq_index = build_faq_index()
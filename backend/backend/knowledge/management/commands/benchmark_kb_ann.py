@@ -0,0 +1,110 @@
+import json
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from knowledge.ann import IVFIndex
+from knowledge.models import KnowledgeBase
+from knowledge.vector_index import embeddings_to_matrix
+
+
+class Command(BaseCommand):
+    help = "Compare IVF approximate search against exact search: recall@k and p50/p99 latency per n_probe."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--synthetic", type=int, default=0,
+                            help="Benchmark N synthetic clustered vectors instead of the KB embeddings")
+        parser.add_argument("--dim", type=int, default=768, help="Dimension of synthetic vectors")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("-k", type=int, default=5)
+        parser.add_argument("--nprobe", default="1,2,4,8,16,32", help="Comma-separated n_probe values")
+        parser.add_argument("--lists", type=int, default=None)
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(42)
+        if options["synthetic"]:
+            matrix = _synthetic(options["synthetic"], options["dim"], rng)
+            ids = np.arange(len(matrix), dtype=np.int64)
+        else:
+            rows = list(
+                KnowledgeBase.objects.filter(is_active=True, embedding_dim__gt=0)
+                .exclude(embedding__isnull=True)
+                .values_list("id", "embedding", "embedding_dim")
+            )
+            ids, matrix, _ = embeddings_to_matrix(rows)
+        if len(ids) == 0:
+            self.stderr.write("No vectors to benchmark.")
+            return
+
+        k = options["k"]
+        # Queries are perturbed copies of stored vectors, like a paraphrased search.
+        picks = rng.choice(len(matrix), options["queries"])
+        queries = matrix[picks] + rng.normal(scale=0.5 / np.sqrt(matrix.shape[1]), size=(len(picks), matrix.shape[1]))
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+        started = time.perf_counter()
+        index = IVFIndex.build(ids, matrix, n_lists=options["lists"])
+        build_seconds = time.perf_counter() - started
+
+        exact_latencies, truth = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            scores = matrix @ query
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            exact_latencies.append(time.perf_counter() - t0)
+            truth.append(set(ids[top].tolist()))
+
+        results = {
+            "vectors": int(len(ids)),
+            "dim": int(matrix.shape[1]),
+            "lists": index.n_lists,
+            "k": k,
+            "build_seconds": round(build_seconds, 3),
+            "ann_min_size": settings.KB_ANN_MIN_SIZE,
+            "exact": _latency_summary(exact_latencies),
+            "ivf": [],
+        }
+        for n_probe in [int(n) for n in options["nprobe"].split(",")]:
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                t0 = time.perf_counter()
+                found, _ = index.search(query, k, n_probe)
+                latencies.append(time.perf_counter() - t0)
+                hits += len(expected & set(found.tolist()))
+            results["ivf"].append({
+                "n_probe": n_probe,
+                f"recall@{k}": round(hits / (k * len(queries)), 4),
+                **_latency_summary(latencies),
+            })
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"{results['vectors']} vectors x {results['dim']} dims, {index.n_lists} lists, "
+            f"built in {build_seconds:.2f}s, {len(queries)} queries, k={k}"
+        )
+        exact = results["exact"]
+        self.stdout.write(f"{'exact':>10}  recall 1.0000  p50 {exact['p50_ms']:8.3f} ms  p99 {exact['p99_ms']:8.3f} ms")
+        for row in results["ivf"]:
+            self.stdout.write(
+                f"{'nprobe=' + str(row['n_probe']):>10}  recall {row[f'recall@{k}']:.4f}  "
+                f"p50 {row['p50_ms']:8.3f} ms  p99 {row['p99_ms']:8.3f} ms"
+            )
+
+
+def _latency_summary(latencies):
+    ms = np.asarray(latencies) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p99_ms": round(float(np.percentile(ms, 99)), 3)}
+
+
+def _synthetic(n, dim, rng, clusters=256):
+    """Unit vectors drawn around random topic centres, roughly how article embeddings cluster."""
+    centres = rng.normal(size=(clusters, dim))
+    vectors = centres[rng.integers(clusters, size=n)] + rng.normal(scale=0.6, size=(n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
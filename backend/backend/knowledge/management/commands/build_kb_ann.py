@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from knowledge.ann import IVFIndex
+from knowledge.models import KnowledgeBase, KnowledgeChunk
+from knowledge.vector_index import embeddings_to_matrix, vector_index, chunk_index
+
+
+class Command(BaseCommand):
+    help = ("Build the IVF approximate nearest-neighbour index over KB article embeddings "
+            "(or passage embeddings with --chunks) and save it to KB_ANN_INDEX_PATH / KB_CHUNK_ANN_INDEX_PATH.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lists", type=int, default=None, help="Number of inverted lists (default ~4*sqrt(n))")
+        parser.add_argument("--iterations", type=int, default=20, help="k-means iterations")
+        parser.add_argument("--force", action="store_true", help="Build even below KB_ANN_MIN_SIZE")
+        parser.add_argument("--chunks", action="store_true", help="Index article passages instead of articles")
+
+    def handle(self, *args, **options):
+        # Anything saved after this instant is treated as newer than the index.
+        started = time.time()
+        if options["chunks"]:
+            queryset = KnowledgeChunk.objects.filter(article__is_active=True)
+            path, index_in_use = settings.KB_CHUNK_ANN_INDEX_PATH, chunk_index
+        else:
+            queryset = KnowledgeBase.objects.filter(is_active=True)
+            path, index_in_use = settings.KB_ANN_INDEX_PATH, vector_index
+        rows = list(
+            queryset.filter(embedding_dim__gt=0)
+            .exclude(embedding__isnull=True)
+            .values_list("id", "embedding", "embedding_dim")
+        )
+        ids, matrix, dim = embeddings_to_matrix(rows)
+        self.stdout.write(f"Loaded {len(ids)} embeddings ({dim} dims)")
+
+        if len(ids) < settings.KB_ANN_MIN_SIZE and not options["force"]:
+            self.stdout.write(self.style.WARNING(
+                f"Only {len(ids)} vectors (< KB_ANN_MIN_SIZE={settings.KB_ANN_MIN_SIZE}); "
+                "exact search is faster at this size. Use --force to build anyway."
+            ))
+            return
+
+        index = IVFIndex.build(ids, matrix, n_lists=options["lists"], iterations=options["iterations"])
+        index.built_at = started
+        index.save(path)
+        index_in_use.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Saved IVF index: {len(index)} vectors, {index.n_lists} lists, "
+            f"{time.time() - started:.1f}s -> {path}"
+        ))
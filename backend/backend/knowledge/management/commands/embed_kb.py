@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from backend.ratelimit import TokenBucket
+from knowledge.models import KnowledgeBase
+from knowledge.utils import (
+    EMBED_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    article_embedding_texts,
+    generate_embeddings,
+    needs_embedding,
+    store_article_embeddings,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Embed knowledge base articles and their passages in rate-limited batches. "
+        "Only articles whose content hash or embedding model changed are processed; "
+        "an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rpm", type=int, default=settings.KB_EMBED_REQUESTS_PER_MINUTE,
+                            help="Embedding requests per minute allowed by the API quota")
+        parser.add_argument("--burst", type=int, default=None, help="Token bucket capacity (default rpm/10)")
+        parser.add_argument("--workers", type=int, default=4, help="Concurrent embedding requests")
+        parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                            help="Texts per embed request (article + its passages count separately)")
+        parser.add_argument("--retries", type=int, default=3)
+        parser.add_argument("--all", action="store_true", help="Re-embed every active article, not just changed ones")
+        parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint from an earlier --all run")
+        parser.add_argument("--checkpoint", default=settings.KB_EMBED_CHECKPOINT_PATH)
+
+    def handle(self, *args, **options):
+        self.bucket = TokenBucket.per_minute(options["rpm"], options["burst"])
+        self.retries = options["retries"]
+        checkpoint_path = options["checkpoint"]
+
+        # Articles changed since their last embedding resume naturally (their hash still differs);
+        # the checkpoint file only matters for --all, where every article is due.
+        done = set()
+        if options["all"] and not options["restart"]:
+            done = self._load_checkpoint(checkpoint_path)
+            if done:
+                self.stdout.write(f"Resuming: {len(done)} articles already done in an earlier run")
+
+        articles = KnowledgeBase.objects.filter(is_active=True).only(
+            "id", "title", "content", "rag_data", "content_hash", "embedding_model"
+        )
+        pending = [
+            a for a in articles.iterator()
+            if a.id not in done and (options["all"] or needs_embedding(a))
+        ]
+        total = len(pending)
+        if not total:
+            self.stdout.write(self.style.SUCCESS("✅ All articles are up to date."))
+            return
+        self.stdout.write(
+            f"🔄 {total} articles to embed with {EMBEDDING_MODEL} "
+            f"({options['rpm']} req/min, {options['workers']} workers)"
+        )
+
+        batches = self._make_batches(pending, options["batch_size"])
+        started = time.monotonic()
+        completed, failed, texts_done = 0, [], 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {pool.submit(self._embed_batch, batch): batch for batch in batches}
+            try:
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    vectors = future.result()
+                    if vectors is not None:
+                        # DB writes stay on the main thread; workers only overlap API calls.
+                        self._store_batch(batch, vectors)
+                        completed += len(batch)
+                        texts_done += len(vectors)
+                        done.update(article.id for article, _, _ in batch)
+                        if options["all"]:
+                            self._save_checkpoint(checkpoint_path, done)
+                    else:
+                        failed.extend(article.id for article, _, _ in batch)
+                    self._report(completed, len(failed), total, texts_done, started)
+            except KeyboardInterrupt:
+                for pending_future in futures:
+                    pending_future.cancel()
+                self.stdout.write(self.style.WARNING("\nInterrupted; rerun to resume."))
+                raise
+
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f"\n⚠️ {len(failed)} articles failed (ids: {failed[:20]}{'...' if len(failed) > 20 else ''}); "
+                "rerun to retry them."
+            ))
+        else:
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            self.stdout.write(self.style.SUCCESS(f"\n✅ Done! {completed} articles embedded."))
+
+    def _make_batches(self, articles, batch_size):
+        """Pack whole articles (their article + passage texts) into requests of up to batch_size texts."""
+        batches, current, current_texts = [], [], 0
+        for article in articles:
+            passages, texts = article_embedding_texts(article)
+            if current and current_texts + len(texts) > batch_size:
+                batches.append(current)
+                current, current_texts = [], 0
+            current.append((article, passages, texts))
+            current_texts += len(texts)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, batch):
+        """Runs in a worker thread: only the rate-limited API call, no DB access."""
+        texts = [text for _, _, article_texts in batch for text in article_texts]
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire(math.ceil(len(texts) / EMBED_BATCH_SIZE))
+            # Mixed articles share one request, so no single document title applies.
+            vectors = generate_embeddings(texts, title=None)
+            if vectors is not None:
+                return vectors
+            if attempt < self.retries:
+                time.sleep(min(60, 2 ** attempt * 5))
+        return None
+
+    def _store_batch(self, batch, vectors):
+        offset = 0
+        for article, passages, article_texts in batch:
+            store_article_embeddings(article, passages, vectors[offset:offset + len(article_texts)])
+            offset += len(article_texts)
+
+    def _report(self, completed, failed, total, texts_done, started):
+        elapsed = time.monotonic() - started
+        rate = completed / elapsed if elapsed else 0.0
+        remaining = total - completed - failed
+        eta = remaining / rate if rate else float("inf")
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if math.isfinite(eta) else "--:--:--"
+        self.stdout.write(
+            f"\r   {completed}/{total} articles ({failed} failed) | "
+            f"{rate * 60:.1f} articles/min, {texts_done / elapsed * 60 if elapsed else 0:.0f} texts/min | "
+            f"ETA {eta_text}",
+            ending="",
+        )
+        self.stdout.flush()
+
+    def _load_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if data.get("model") != EMBEDDING_MODEL:
+            return set()
+        return set(data.get("done", []))
+
+    def _save_checkpoint(self, path, done):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"model": EMBEDDING_MODEL, "done": sorted(done)}, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,86 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+import numpy as np
+from django.db import migrations, models
+
+
+def json_embedding_to_vector(value):
+    """
+    The float32 vector for a stored JSON embedding, or None if it isn't a non-empty
+    flat list of finite numbers (undecodable JSON arrives here as the raw string).
+    """
+    if not isinstance(value, list):
+        return None
+    try:
+        vector = np.asarray(value, dtype='<f4')
+    except (TypeError, ValueError):
+        return None
+    if vector.ndim != 1 or vector.size == 0 or not np.isfinite(vector).all():
+        return None
+    return vector
+
+
+def json_to_binary(apps, schema_editor):
+    # Unusable embeddings are dropped (left NULL) rather than aborting the migration;
+    # with no embedding_model those articles are re-embedded by `manage.py embed_kb`.
+    KnowledgeBase = apps.get_model('knowledge', 'KnowledgeBase')
+    skipped = 0
+    for article in KnowledgeBase.objects.exclude(embedding__isnull=True).only('id', 'embedding').iterator():
+        vector = json_embedding_to_vector(article.embedding)
+        if vector is None:
+            skipped += 1
+            continue
+        KnowledgeBase.objects.filter(pk=article.pk).update(
+            embedding_bin=vector.tobytes(),
+            embedding_dim=vector.size,
+            embedding_model='models/embedding-001',
+        )
+    if skipped:
+        print(f"\n⚠️ Dropped {skipped} unusable JSON embedding(s); re-embed them with `manage.py embed_kb`")
+
+
+def binary_to_json(apps, schema_editor):
+    KnowledgeBase = apps.get_model('knowledge', 'KnowledgeBase')
+    for article in KnowledgeBase.objects.exclude(embedding_bin__isnull=True).only('id', 'embedding_bin').iterator():
+        vector = np.frombuffer(article.embedding_bin, dtype='<f4')
+        KnowledgeBase.objects.filter(pk=article.pk).update(embedding=vector.tolist())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0002_faq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebase',
+            name='embedding_bin',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='knowledgebase',
+            name='embedding_dim',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='knowledgebase',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(json_to_binary, binary_to_json),
+        migrations.RemoveField(
+            model_name='knowledgebase',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='knowledgebase',
+            old_name='embedding_bin',
+            new_name='embedding',
+        ),
+        migrations.AlterField(
+            model_name='knowledgebase',
+            name='embedding',
+            field=models.BinaryField(blank=True, help_text='Gemini AI Vector Embedding (float32 LE)', null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+import django.db.models.deletion
+import knowledge.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge', '0003_binary_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebase',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='KnowledgeChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(help_text='Order of the passage within the article')),
+                ('text', models.TextField()),
+                ('token_count', models.PositiveIntegerField(default=0)),
+                ('embedding', models.BinaryField(blank=True, help_text='Gemini AI Vector Embedding (float32 LE)', null=True)),
+                ('embedding_dim', models.PositiveIntegerField(blank=True, null=True)),
+                ('embedding_model', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='knowledge.knowledgebase')),
+            ],
+            options={
+                'ordering': ['article', 'position'],
+                'constraints': [models.UniqueConstraint(fields=('article', 'position'), name='unique_chunk_position')],
+            },
+            bases=(knowledge.models.EmbeddingMixin, models.Model),
+        ),
+    ]
@@ -1,8 +1,40 @@
 from django.db import models
 from django.conf import settings
-import json
+import numpy as np
 
-class KnowledgeBase(models.Model):
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def decode_embedding(data):
+    """Wrap stored embedding bytes in a float32 array without copying."""
+    if not data:
+        return None
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPE)
+
+class EmbeddingMixin:
+    """get/set helpers for models with embedding, embedding_dim and embedding_model fields."""
+
+    def set_embedding(self, vector, model=""):
+        """
+        Store a vector (NumPy array or list of floats); None clears it.
+        float32 arrays are written as-is, anything else is converted once.
+        """
+        if vector is None:
+            self.embedding = None
+            self.embedding_dim = None
+            self.embedding_model = ""
+            return
+        array = np.ascontiguousarray(vector, dtype=EMBEDDING_DTYPE).ravel()
+        self.embedding = array.tobytes()
+        self.embedding_dim = array.size
+        self.embedding_model = model
+
+    def get_embedding(self):
+        """Return the vector as a read-only float32 array view over the stored bytes, or None."""
+        return decode_embedding(self.embedding)
+
+
+class KnowledgeBase(EmbeddingMixin, models.Model):
     """
     Knowledge Base Article with AI Embeddings for Semantic Search.
     """
@@ -11,8 +43,12 @@ class KnowledgeBase(models.Model):
     rag_data = models.TextField(blank=True, null=True, help_text="Optimized content for AI context (optional)")
     tags = models.CharField(max_length=255, blank=True)
     
-    # Store vector embedding as a list of floats (JSON)
-    embedding = models.JSONField(blank=True, null=True, help_text="Gemini AI Vector Embedding")
+    # Store vector embedding as raw little-endian float32 bytes (4 bytes per dimension)
+    embedding = models.BinaryField(blank=True, null=True, help_text="Gemini AI Vector Embedding (float32 LE)")
+    embedding_dim = models.PositiveIntegerField(blank=True, null=True)
+    embedding_model = models.CharField(max_length=100, blank=True, default="")
+    # sha256 of the title/content/rag_data the stored embedding and chunks were generated from
+    content_hash = models.CharField(max_length=64, blank=True, default="")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -23,12 +59,33 @@ class KnowledgeBase(models.Model):
 
     def __str__(self):
         return self.title
-    
-    def set_embedding(self, vector):
-        self.embedding = vector
 
-    def get_embedding(self):
-        return self.embedding
+
+class KnowledgeChunk(EmbeddingMixin, models.Model):
+    """
+    Overlapping passage of a KnowledgeBase article with its own embedding,
+    so RAG can send the best passages instead of whole articles.
+    """
+    article = models.ForeignKey(KnowledgeBase, on_delete=models.CASCADE, related_name='chunks')
+    position = models.PositiveIntegerField(help_text="Order of the passage within the article")
+    text = models.TextField()
+    token_count = models.PositiveIntegerField(default=0)
+
+    embedding = models.BinaryField(blank=True, null=True, help_text="Gemini AI Vector Embedding (float32 LE)")
+    embedding_dim = models.PositiveIntegerField(blank=True, null=True)
+    embedding_model = models.CharField(max_length=100, blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['article', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'position'], name='unique_chunk_position'),
+        ]
+
+    def __str__(self):
+        return f"{self.article_id} #{self.position}"
 
 
 class CannedResponse(models.Model):
@@ -0,0 +1,84 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FAQ, CannedResponse, KnowledgeBase, KnowledgeChunk
+from .vector_index import vector_index, chunk_index
+from .bm25 import bm25_index
+from .answer_cache import answer_cache
+from .faq_index import faq_index
+
+KEYWORD_FIELDS = {"title", "content", "tags", "is_active"}
+ANSWER_FIELDS = {"title", "content", "rag_data", "is_active"}
+
+
+@receiver(post_save, sender=KnowledgeBase)
+def update_vector_index(sender, instance, **kwargs):
+    """Keep the in-memory vector index in step with article edits."""
+    if not instance.is_active:
+        vector_index.remove(instance.pk)
+        for chunk_id in instance.chunks.values_list("pk", flat=True):
+            chunk_index.remove(chunk_id)
+        return
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "embedding" not in update_fields and "is_active" not in update_fields:
+        return
+    if "embedding" in instance.get_deferred_fields():
+        # Saved without loading the vector, so the stored one is unchanged.
+        # Only a (re)activated article that isn't indexed yet needs a reload.
+        if instance.pk not in vector_index:
+            vector_index.invalidate()
+        return
+    vector_index.upsert(instance.pk, instance.get_embedding())
+
+
+@receiver(post_save, sender=KnowledgeBase)
+def update_keyword_index(sender, instance, **kwargs):
+    """Keep the BM25 index in step with article text edits."""
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not KEYWORD_FIELDS & set(update_fields):
+        return
+    if instance.is_active:
+        bm25_index.upsert(instance.pk, instance.title, instance.content, instance.tags)
+    else:
+        bm25_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=KnowledgeBase)
+def invalidate_cached_answers(sender, instance, created, **kwargs):
+    """Chat answers built on an edited article are stale; a new article may answer unsourced ones."""
+    if created:
+        answer_cache.invalidate_unsourced()
+        return
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or ANSWER_FIELDS & set(update_fields):
+        answer_cache.invalidate_article(instance.pk)
+
+
+@receiver(post_delete, sender=KnowledgeBase)
+def remove_from_vector_index(sender, instance, **kwargs):
+    vector_index.remove(instance.pk)
+    bm25_index.remove(instance.pk)
+    answer_cache.invalidate_article(instance.pk)
+
+
+@receiver(post_save, sender=KnowledgeChunk)
+def update_chunk_index(sender, instance, **kwargs):
+    """Passages of inactive articles are never served, so keep them out of the index."""
+    if not instance.article.is_active:
+        chunk_index.remove(instance.pk)
+        return
+    chunk_index.upsert(instance.pk, instance.get_embedding())
+
+
+@receiver(post_delete, sender=KnowledgeChunk)
+def remove_from_chunk_index(sender, instance, **kwargs):
+    chunk_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+@receiver(post_save, sender=CannedResponse)
+@receiver(post_delete, sender=CannedResponse)
+def rebuild_faq_index(sender, instance, **kwargs):
+    """The chatbot answers from FAQs and canned responses directly; rebuild its index after edits."""
+    faq_index.schedule_rebuild()
@@ -0,0 +1,25 @@
+from backend.background import run_in_background
+
+from .models import KnowledgeBase
+from .utils import embed_article, needs_embedding
+
+
+def embed_article_task(article_id):
+    """Background job: (re)embed one article and its passages if its text changed."""
+    article = KnowledgeBase.objects.filter(pk=article_id, is_active=True).first()
+    if article is None:
+        return
+    if embed_article(article):
+        print(f"✅ Embeddings generated for article: {article.title} ({article.chunks.count()} passages)")
+    elif needs_embedding(article):
+        print(f"⚠️ Failed to generate embedding for: {article.title}")
+
+
+def schedule_article_embedding(article):
+    """
+    Queue re-embedding after the article is saved, unless the stored content
+    hash shows title/content are unchanged. Keyword search sees the new text
+    immediately; vector search catches up when the job lands.
+    """
+    if needs_embedding(article):
+        run_in_background(embed_article_task, article.pk, key=f"kb-embed:{article.pk}")
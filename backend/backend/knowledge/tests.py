@@ -1,3 +1,527 @@
-from django.test import TestCase
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.cache import LocalLRUCache
+
+from .ann import IVFIndex
+from .answer_cache import SemanticAnswerCache
+from .bm25 import BM25Index, bm25_index, reciprocal_rank_fusion
+from .chunking import estimate_tokens, split_passages
+from .context import build_context
+from .embedding_cache import QueryEmbeddingCache
+from .faq_index import FAQIndex
+from .models import EMBEDDING_DTYPE, FAQ, CannedResponse, KnowledgeBase
+from .utils import embed_article, retrieve_passages, semantic_search, store_article_embeddings
+from .vector_index import VectorIndex, chunk_index
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class VectorIndexTests(TestCase):
+    DIM = 8
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.vectors = {}
+        for i in range(30):
+            self.add_article(f"Article {i}", self.rng.normal(size=self.DIM))
+        # No ANN path setting, so every search is the exact scan
+        self.index = VectorIndex(lambda: KnowledgeBase.objects.filter(is_active=True), "NO_ANN_INDEX_PATH")
+
+    def add_article(self, title, vector):
+        article = KnowledgeBase(title=title, content="...")
+        article.set_embedding(vector, model="test")
+        article.save()
+        self.vectors[article.pk] = unit(vector)
+        return article
+
+    def brute_force(self, query, top_k):
+        ids = list(self.vectors)
+        scores = np.array([self.vectors[i] @ unit(query) for i in ids])
+        return [ids[i] for i in np.argsort(-scores)[:top_k]]
+
+    def test_top_k_matches_brute_force(self):
+        for _ in range(5):
+            query = self.rng.normal(size=self.DIM)
+            results = self.index.search(query, top_k=5)
+            self.assertEqual([row_id for row_id, _ in results], self.brute_force(query, 5))
+            scores = [score for _, score in results]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(len(self.index), 30)
+
+    def test_upsert_and_remove(self):
+        query = self.rng.normal(size=self.DIM)
+        self.index.search(query)   # build
+        target = next(iter(self.vectors))
+
+        self.index.upsert(target, query * 3)   # same direction as the query
+        (best_id, best_score), *_ = self.index.search(query)
+        self.assertEqual(best_id, target)
+        self.assertAlmostEqual(best_score, 1.0, places=5)
+
+        self.index.upsert(10_000, query)       # a new row
+        self.assertIn(10_000, self.index)
+        self.assertEqual(len(self.index), 31)
+
+        self.index.remove(target)
+        self.index.remove(10_000)
+        self.assertNotIn(target, [row_id for row_id, _ in self.index.search(query, top_k=30)])
+        self.assertNotIn(target, self.index)
+        self.assertEqual(len(self.index), 29)
+
+    def test_rebuild_after_invalidate(self):
+        query = self.rng.normal(size=self.DIM)
+        self.index.search(query)
+        # Written without signals (as another worker would), so the built index doesn't see it
+        article = KnowledgeBase.objects.create(title="Elsewhere", content="...")
+        KnowledgeBase.objects.filter(pk=article.pk).update(
+            embedding=query.astype(EMBEDDING_DTYPE).tobytes(), embedding_dim=self.DIM)
+        self.assertNotIn(article.pk, self.index)
+
+        self.index.invalidate()
+        self.assertEqual(self.index.search(query, top_k=1)[0][0], article.pk)
+        self.assertIn(article.pk, self.index)
+
+
+def unit_rows(rng, n, dim):
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class IVFIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+        self.vectors = unit_rows(self.rng, 2000, 16)
+        self.ids = np.arange(100, 2100, dtype=np.int64)
+        self.index = IVFIndex.build(self.ids, self.vectors, n_lists=32)
+
+    def test_save_and_mmap_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.index.save(path)
+            loaded = IVFIndex.load(path)
+            self.assertIsInstance(loaded.vectors, np.memmap)
+            self.assertEqual((len(loaded), loaded.dim, loaded.n_lists), (2000, 16, 32))
+            self.assertAlmostEqual(loaded.built_at, self.index.built_at)
+            query = self.vectors[7]
+            for original, reloaded in zip(self.index.search(query, 10, 4), loaded.search(query, 10, 4)):
+                np.testing.assert_array_equal(original, reloaded)
+
+    def test_recall_against_exact_search(self):
+        queries = unit_rows(self.rng, 50, 16)
+        hits = 0
+        for query in queries:
+            exact = set(self.ids[np.argsort(-(self.vectors @ query))[:10]].tolist())
+            approximate, scores = self.index.search(query, top_k=10, n_probe=8)
+            hits += len(exact & set(approximate.tolist()))
+            self.assertTrue(np.all(np.diff(scores) <= 0))
+        self.assertGreaterEqual(hits / (10 * len(queries)), 0.8)
+
+        # Probing every list is an exact search
+        query = queries[0]
+        approximate, _ = self.index.search(query, top_k=10, n_probe=32)
+        self.assertEqual(approximate.tolist(), self.ids[np.argsort(-(self.vectors @ query))[:10]].tolist())
+
+
+class VectorIndexANNTests(TestCase):
+    """VectorIndex over a persisted IVF snapshot plus the articles changed since."""
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.articles = []
+        for vector in unit_rows(rng, 40, 8):
+            article = KnowledgeBase(title="Article", content="...")
+            article.set_embedding(vector, model="test")
+            article.save()
+            self.articles.append(article)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        ids = [a.pk for a in self.articles]
+        IVFIndex.build(ids, np.vstack([a.get_embedding() for a in self.articles]), n_lists=4).save(self.tmp.name)
+        time.sleep(0.01)   # later saves have updated_at after the snapshot's built_at
+
+    def index(self):
+        with override_settings(TEST_ANN_PATH=self.tmp.name, KB_ANN_MIN_SIZE=1, KB_ANN_NPROBE=4):
+            index = VectorIndex(lambda: KnowledgeBase.objects.filter(is_active=True), "TEST_ANN_PATH")
+            index.build()
+        return index
+
+    def search_ids(self, index, query, top_k=40):
+        with override_settings(KB_ANN_NPROBE=4):
+            return [row_id for row_id, _ in index.search(query, top_k=top_k)]
+
+    def test_edited_and_deleted_articles_are_not_served_from_the_snapshot(self):
+        edited, deleted, new_vector = self.articles[0], self.articles[1], self.articles[2].get_embedding()
+        edited.set_embedding(-new_vector, model="test")   # opposite direction to what the snapshot holds
+        edited.save()
+        deleted.delete()
+
+        index = self.index()
+        self.assertEqual(len(index), 39)
+        self.assertIn(edited.pk, index)
+        self.assertNotIn(deleted.pk, index)
+        ids = self.search_ids(index, new_vector)
+        self.assertEqual(len(ids), len(set(ids)))           # the stale snapshot copy is dropped
+        self.assertNotIn(deleted.pk, ids)
+        self.assertEqual(ids[-1], edited.pk)                # scored on its new vector
+        self.assertEqual(self.search_ids(index, -new_vector, top_k=1), [edited.pk])
+
+    def test_upsert_and_remove_exclude_snapshot_rows(self):
+        index = self.index()
+        target, query = self.articles[3].pk, self.articles[4].get_embedding()
+        index.upsert(target, query)
+        self.assertEqual(self.search_ids(index, query).count(target), 1)   # in-memory copy only
+        self.assertEqual(set(self.search_ids(index, query, top_k=2)), {target, self.articles[4].pk})
+
+        index.remove(target)
+        self.assertNotIn(target, self.search_ids(index, query))
+        self.assertNotIn(target, index)
+        self.assertEqual(len(index), 39)
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = QueryEmbeddingCache(LocalLRUCache(max_size=10, ttl=60))
+        self.calls = []
+
+    def compute(self, vector=(0.25, 0.5)):
+        def compute():
+            self.calls.append(vector)
+            return None if vector is None else list(vector)
+        return compute
+
+    def test_miss_then_hit(self):
+        first = self.cache.get_or_compute("reset my password", "model-a", self.compute())
+        second = self.cache.get_or_compute("reset my password", "model-a", self.compute((9.0, 9.0)))
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(first.dtype, np.float32)
+        self.assertEqual(second.tolist(), [0.25, 0.5])
+
+    def test_key_ignores_case_and_whitespace(self):
+        self.assertEqual(QueryEmbeddingCache.make_key("  Reset   my\nPassword ", "model-a"),
+                         QueryEmbeddingCache.make_key("reset my password", "model-a"))
+        self.cache.get_or_compute("Reset my password", "model-a", self.compute())
+        self.cache.get_or_compute("  reset MY password  ", "model-a", self.compute())
+        self.assertEqual(len(self.calls), 1)
+
+    def test_key_includes_the_model(self):
+        self.assertNotEqual(QueryEmbeddingCache.make_key("vpn", "model-a"), QueryEmbeddingCache.make_key("vpn", "model-b"))
+        self.cache.get_or_compute("vpn", "model-a", self.compute())
+        vector = self.cache.get_or_compute("vpn", "model-b", self.compute((1.0, 0.0)))
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(vector.tolist(), [1.0, 0.0])
+
+    def test_failed_compute_is_not_cached(self):
+        self.assertIsNone(self.cache.get_or_compute("vpn", "model-a", self.compute(None)))
+        self.assertEqual(self.cache.get_or_compute("vpn", "model-a", self.compute()).tolist(), [0.25, 0.5])
+        self.assertEqual(len(self.calls), 2)
+
+
+class HybridSearchTests(TestCase):
+    def setUp(self):
+        self.vpn = KnowledgeBase.objects.create(title="VPN setup", content="Install the client and sign in.",
+                                                tags="network,remote")
+        self.wifi = KnowledgeBase.objects.create(title="Office Wi-Fi", content="Join the guest network. "
+                                                 "For remote access use the VPN instead.")
+        self.printer = KnowledgeBase.objects.create(title="Printer jams", content="Open tray 2 and clear the paper.")
+        self.index = BM25Index()
+
+    def ranked(self, query):
+        return [article_id for article_id, _ in self.index.search(query, top_k=10)]
+
+    def test_bm25_ranking(self):
+        # Both mention VPN; the title (and tag) match outweighs a mention in the body
+        self.assertEqual(self.ranked("how do I set up the VPN"), [self.vpn.pk, self.wifi.pk])
+        self.assertEqual(self.ranked("paper jam tray"), [self.printer.pk])
+        self.assertEqual(self.ranked("how do I"), [])   # stopwords only
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([1, 2, 3], [3, 1, 4], k=60)
+        self.assertEqual([article_id for article_id, _ in fused], [1, 3, 2, 4])
+        self.assertAlmostEqual(dict(fused)[1], 1 / 61 + 1 / 62)
+
+    def test_semantic_search_fuses_vector_and_keyword_rankings(self):
+        vector_hits = [(self.printer.pk, 0.9), (self.wifi.pk, 0.8), (self.vpn.pk, 0.1)]
+        keyword_hits = [(self.vpn.pk, 7.5), (self.wifi.pk, 3.0)]
+        with mock.patch("knowledge.utils.generate_query_embedding", return_value=np.ones(4, dtype=np.float32)), \
+                mock.patch("knowledge.utils.vector_index.search", return_value=vector_hits), \
+                mock.patch("knowledge.utils.bm25_index.search", return_value=keyword_hits):
+            results = semantic_search("vpn", top_k=3)
+        # printer tops the vector ranking but has no keyword match, so both articles found by both rankers beat it
+        self.assertEqual([a.pk for a in results], [self.vpn.pk, self.wifi.pk, self.printer.pk])
+        self.assertAlmostEqual(results[0].score, 1 / 63 + 1 / 61)
+        self.assertEqual((results[1].similarity, results[1].bm25_score), (0.8, 3.0))
+        self.assertIsNone(results[2].bm25_score)
+
+    @override_settings(KB_VECTOR_INDEX_REFRESH_SECONDS=60)
+    def test_rebuilds_after_refresh_interval(self):
+        self.assertEqual(self.ranked("printer"), [self.printer.pk])
+        # Another worker's edit: no signal reaches this process's index
+        KnowledgeBase.objects.filter(pk=self.vpn.pk).update(title="Printer drivers")
+        self.assertEqual(self.ranked("printer"), [self.printer.pk])
+        later = time.monotonic() + 61
+        with mock.patch("knowledge.bm25.time.monotonic", return_value=later):
+            self.assertEqual(set(self.ranked("printer")), {self.printer.pk, self.vpn.pk})
+
+
+class ChunkingTests(SimpleTestCase):
+    # 25 sentences of 10 estimated tokens each (39-40 characters)
+    SENTENCES = [f"Step {i:02d} of the VPN setup guide is here." for i in range(25)]
+
+    def test_passages_respect_size_and_overlap(self):
+        passages = split_passages(" ".join(self.SENTENCES), max_tokens=60, overlap_tokens=25)
+        self.assertGreater(len(passages), 1)
+        for passage in passages:
+            self.assertLessEqual(estimate_tokens(passage), 60)
+        for previous, passage in zip(passages, passages[1:]):
+            # The next passage starts with the previous one's trailing sentences (~25 tokens)
+            carried = [s for s in self.SENTENCES if s in previous and s in passage]
+            self.assertEqual(len(carried), 2)
+            self.assertTrue(passage.startswith(carried[0]))
+        self.assertTrue(passages[0].startswith(self.SENTENCES[0]))
+        self.assertTrue(passages[-1].endswith(self.SENTENCES[-1]))
+        for sentence in self.SENTENCES:
+            self.assertTrue(any(sentence in passage for passage in passages), sentence)
+
+    def test_paragraph_breaks_and_long_runs(self):
+        self.assertEqual(split_passages("Intro\n\n  First   item\n\nSecond item", max_tokens=200),
+                         ["Intro First item Second item"])
+        run_on = " ".join(["word"] * 100)   # no sentence ends at all
+        passages = split_passages(run_on, max_tokens=20, overlap_tokens=0)
+        self.assertEqual(" ".join(passages).split(), ["word"] * 100)
+        self.assertTrue(all(estimate_tokens(p) <= 20 for p in passages))
+
+
+@override_settings(KB_CHUNK_TOKENS=30, KB_CHUNK_OVERLAP_TOKENS=10)
+class ArticleChunkTests(TestCase):
+    def setUp(self):
+        chunk_index.invalidate()
+        bm25_index.invalidate()
+        self.article = KnowledgeBase.objects.create(
+            title="VPN setup",
+            content="Install the VPN client from the portal. Sign in with your work account. "
+                    "Choose the nearest gateway. Contact IT if the connection drops.",
+        )
+        self.other = KnowledgeBase.objects.create(title="Printer jams", content="Open tray 2 and clear the paper.")
+
+    def embed(self, article):
+        def generate_embeddings(texts, title=None):
+            self.embedded.append(texts)
+            return [[float(len(text)), 1.0, float(i)] for i, text in enumerate(texts)]
+        self.embedded = []
+        with mock.patch("knowledge.utils.generate_embeddings", generate_embeddings):
+            return embed_article(article)
+
+    def test_article_is_chunked_and_rechunked_on_edit(self):
+        self.assertTrue(self.embed(self.article))
+        first = list(self.article.chunks.values_list("position", "text"))
+        self.assertGreater(len(first), 1)
+        self.assertEqual([position for position, _ in first], list(range(len(first))))
+        self.assertEqual(len(self.embedded[0]), len(first) + 1)   # the whole article, then each passage
+
+        self.assertFalse(self.embed(self.article))                # unchanged text: nothing to do
+        self.assertEqual(self.embedded, [])
+
+        self.article.content = "Restart the VPN client. Then sign in again."
+        self.article.save()
+        self.assertTrue(self.embed(self.article))
+        self.assertEqual(list(self.article.chunks.values_list("text", flat=True)),
+                         ["Restart the VPN client. Then sign in again."])
+
+    def test_passages_map_back_to_their_article(self):
+        self.embed(self.article)
+        self.embed(self.other)
+        target = self.article.chunks.get(position=1)
+        passages = retrieve_passages("gateway", top_k=3, query_vec=target.get_embedding())
+        self.assertEqual(passages[0].pk, target.pk)
+        self.assertEqual(passages[0].article, self.article)
+        self.assertAlmostEqual(passages[0].score, 1.0, places=5)
+
+        # Without a query vector the BM25-ranked articles' stored chunks are used
+        passages = retrieve_passages("printer paper", query_vec=None)
+        self.assertEqual({p.article.pk for p in passages}, {self.other.pk})
+        self.assertEqual([p.text for p in passages], ["Open tray 2 and clear the paper."])
+
+    def test_inactive_articles_passages_leave_the_index(self):
+        self.embed(self.article)
+        chunk_index.search([1.0, 1.0, 0.0])   # build the index
+        chunk_ids = list(self.article.chunks.values_list("pk", flat=True))
+        self.assertTrue(all(chunk_id in chunk_index for chunk_id in chunk_ids))
+
+        self.other.is_active = False
+        self.other.save()
+        self.embed(self.other)
+        self.assertTrue(self.other.chunks.exists())
+        self.assertFalse(any(chunk_id in chunk_index for chunk_id in self.other.chunks.values_list("pk", flat=True)))
+
+        self.article.is_active = False
+        self.article.save()
+        self.assertFalse(any(chunk_id in chunk_index for chunk_id in chunk_ids))
+
+
+class StoreArticleEmbeddingsTests(TestCase):
+    def test_bumps_updated_at(self):
+        article = KnowledgeBase.objects.create(title="VPN", content="Install the client.")
+        old = timezone.now() - timedelta(days=1)
+        KnowledgeBase.objects.filter(pk=article.pk).update(updated_at=old)
+        article.refresh_from_db()
+
+        store_article_embeddings(article, ["Install the client."], [[1.0, 0.0], [0.0, 1.0]])
+        article.refresh_from_db()
+        # Newer than any ANN snapshot taken before the re-embed, so that copy is treated as stale
+        self.assertGreater(article.updated_at, old + timedelta(hours=23))
+        self.assertEqual(article.get_embedding().tolist(), [1.0, 0.0])
+        self.assertEqual(article.chunks.count(), 1)
+
+
+class BinaryEmbeddingMigrationTests(TransactionTestCase):
+    """knowledge.0003 converts JSON embeddings to float32 bytes."""
+    before = [("knowledge", "0002_faq")]
+    after = [("knowledge", "0003_binary_embedding")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_converts_json_and_skips_unusable_rows(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        OldArticle = executor.loader.project_state(self.before).apps.get_model("knowledge", "KnowledgeBase")
+        embeddings = {
+            "good": [0.5, -1.25, 2.0],
+            "empty": [],
+            "text": "not a vector",
+            "object": {"values": [1, 2]},
+            "ragged": [[1.0, 2.0], [3.0]],
+            "words": ["a", "b"],
+        }
+        ids = {name: OldArticle.objects.create(title=name, content="...", embedding=value).pk
+               for name, value in embeddings.items()}
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        Article = executor.loader.project_state(self.after).apps.get_model("knowledge", "KnowledgeBase")
+
+        good = Article.objects.get(pk=ids.pop("good"))
+        self.assertEqual(good.embedding_dim, 3)
+        self.assertEqual(np.frombuffer(good.embedding, dtype=EMBEDDING_DTYPE).tolist(), [0.5, -1.25, 2.0])
+        for name, pk in ids.items():
+            article = Article.objects.get(pk=pk)
+            self.assertIsNone(article.embedding, name)
+            self.assertEqual(article.embedding_model, "", name)
+
+
+class SemanticAnswerCacheTests(TestCase):
+    def setUp(self):
+        self.article = KnowledgeBase.objects.create(title="VPN setup", content="Install the client...")
+        self.cache = SemanticAnswerCache(max_size=2, ttl=60, threshold=0.9)
+        self.cache.set([1.0, 0.0, 0.0], {"response": "Install the client"}, [self.article])
+
+    def test_similar_question_hits(self):
+        self.assertEqual(self.cache.get([0.98, 0.1, 0.0]), {"response": "Install the client"})
+        self.assertIsNone(self.cache.get([0.0, 1.0, 0.0]))
+
+    def test_article_edit_invalidates(self):
+        self.cache.invalidate_article(self.article.pk)
+        self.assertIsNone(self.cache.get([1.0, 0.0, 0.0]))
+
+    def test_article_edited_elsewhere_is_detected(self):
+        # e.g. saved by another worker process, so no signal reached this cache
+        KnowledgeBase.objects.filter(pk=self.article.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertIsNone(self.cache.get([1.0, 0.0, 0.0]))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set([0.0, 1.0, 0.0], {"response": "b"}, [])
+        self.cache.get([1.0, 0.0, 0.0])
+        self.cache.set([0.0, 0.0, 1.0], {"response": "c"}, [])
+        self.assertIsNone(self.cache.get([0.0, 1.0, 0.0]))
+        self.assertEqual(self.cache.get([0.0, 0.0, 1.0]), {"response": "c"})
+
+
+class BuildContextTests(SimpleTestCase):
+    def passage(self, article, position, text):
+        return SimpleNamespace(article=article, position=position, text=text)
+
+    def setUp(self):
+        self.vpn = SimpleNamespace(id=1, title="VPN setup")
+        self.mail = SimpleNamespace(id=2, title="Mail")
+
+    def test_overlap_is_deduplicated_and_grouped_by_article(self):
+        context, used, tokens = build_context([
+            self.passage(self.vpn, 1, "Open the client. Sign in with SSO. Pick the nearest gateway."),
+            self.passage(self.mail, 0, "Outlook needs a restart after a password change."),
+            self.passage(self.vpn, 0, "Install the client from the portal. Open the client. Sign in with SSO."),
+        ], token_budget=500, min_novelty=0.3)
+        self.assertEqual(context.count("Open the client."), 1)
+        self.assertEqual(context.count("Title: VPN setup"), 1)
+        # Passages in article order, the better-ranked article first
+        self.assertLess(context.index("Install the client"), context.index("Pick the nearest gateway"))
+        self.assertLess(context.index("VPN setup"), context.index("Mail"))
+        self.assertEqual([p.position for p in used], [0, 1, 0])
+        self.assertEqual(tokens, estimate_tokens(context))
+
+    def test_mostly_repeated_passage_is_skipped(self):
+        _, used, _ = build_context([
+            self.passage(self.vpn, 0, "Open the client. Sign in with SSO. Pick the nearest gateway."),
+            self.passage(self.mail, 0, "Open the client. Sign in with SSO. Done."),
+        ], token_budget=500, min_novelty=0.5)
+        self.assertEqual(len(used), 1)
+
+    def test_stays_within_budget(self):
+        passages = [self.passage(self.vpn, i, f"Step {i} of the long guide goes here. " * 10) for i in range(20)]
+        context, used, tokens = build_context(passages, token_budget=300)
+        self.assertLessEqual(tokens, 300)
+        self.assertTrue(0 < len(used) < 20)
+
+
+class FAQIndexTests(TestCase):
+    def setUp(self):
+        self.faq = FAQ.objects.create(question="How do I reset my password?", answer="Use the portal.")
+        FAQ.objects.create(question="Where is the cafeteria?", answer="Ground floor.", is_active=False)
+        CannedResponse.objects.create(title="VPN not connecting", response_text="Restart the VPN client.",
+                                      search_tags="vpn")
+        self.index = FAQIndex(threshold=0.9)
+
+    def rebuild(self, vectors):
+        with mock.patch("knowledge.utils.generate_query_embedding", side_effect=lambda q: vectors.get(q)):
+            self.index.rebuild()
+
+    def test_normalized_text_matches(self):
+        self.rebuild({})
+        self.assertEqual(self.index.match_text("how do I reset my password"), ("faq_exact", self.faq.id, "Use the portal."))
+        self.assertEqual(self.index.match_text("VPN not connecting!")[0], "canned_response")
+        self.assertIsNone(self.index.match_text("Where is the cafeteria?"))   # inactive
+
+    def test_similar_question_matches(self):
+        self.rebuild({"How do I reset my password?": [1.0, 0.0, 0.0]})
+        self.assertEqual(self.index.match_vector([0.95, 0.2, 0.0])[0], "faq_similar")
+        self.assertIsNone(self.index.match_vector([0.5, 0.8, 0.0]))
+
+
+class KnowledgeSearchThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(KB_SEARCH_THROTTLE_ANON_PER_MINUTE=1, KB_SEARCH_THROTTLE_ANON_BURST=1)
+    def test_anonymous_search_is_throttled(self):
+        client = APIClient()
+        with mock.patch("knowledge.utils.semantic_search", return_value=[]):
+            first = client.get("/api/knowledge-base/search/", {"q": "vpn"})
+            second = client.get("/api/knowledge-base/search/", {"q": "vpn"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+        self.assertIn("Retry-After", second)
@@ -1,28 +1,28 @@
-import google.generativeai as genai
-import os
 from django.conf import settings
-from django.db import models
-from django.db.models import Q
+from django.db import transaction
 
-import numpy as np
-from .models import KnowledgeBase
+from .models import KnowledgeBase, KnowledgeChunk
+from .chunking import content_hash, estimate_tokens, split_passages
+from .vector_index import vector_index, chunk_index
+from .embedding_cache import query_embedding_cache
+from .bm25 import bm25_index, reciprocal_rank_fusion
+from backend.gemini import gemini
+
+EMBEDDING_MODEL = "models/embedding-001"
+EMBED_BATCH_SIZE = 100  # Gemini's limit on texts per batch embed request
 
 def generate_embedding(text):
     """
     Generates a vector embedding for the given text using Google Gemini.
     Returns: list of floats or None if it fails.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    if not gemini.available:
         print("⚠️ No GEMINI_API_KEY found for embeddings.")
         return None
 
     try:
-        genai.configure(api_key=api_key)
-        
-        # Use embedding-001 model
-        result = genai.embed_content(
-            model="models/embedding-001",
+        result = gemini.embed_content(
+            model=EMBEDDING_MODEL,
             content=text,
             task_type="retrieval_document",
             title="Knowledge Base Article" 
@@ -32,69 +32,197 @@ def generate_embedding(text):
         print(f"❌ Embedding Error: {e}")
         return None
 
-def generate_query_embedding(text):
+def generate_embeddings(texts, title="Knowledge Base Article"):
     """
-    Generates embedding optimized for a search query.
+    Embeds several documents with batched Gemini calls (EMBED_BATCH_SIZE texts per request).
+    Returns: list of vectors in input order, or None if any batch fails.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key: return None
-    
+    if not gemini.available:
+        print("⚠️ No GEMINI_API_KEY found for embeddings.")
+        return None
+
+    vectors = []
     try:
-        genai.configure(api_key=api_key)
-        result = genai.embed_content(
-            model="models/embedding-001",
-            content=text,
-            task_type="retrieval_query"
-        )
-        return result['embedding']
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            result = gemini.embed_content(
+                operation="embed_batch",
+                timeout=settings.GEMINI_BATCH_TIMEOUT_SECONDS,
+                model=EMBEDDING_MODEL,
+                content=texts[start:start + EMBED_BATCH_SIZE],
+                task_type="retrieval_document",
+                title=title
+            )
+            vectors.extend(result['embedding'])
     except Exception as e:
-        print(f"❌ Query Embedding Error: {e}")
+        print(f"❌ Embedding Error: {e}")
         return None
+    return vectors
+
+def rag_text(article):
+    """The text RAG passages come from: the article's rag_data if filled in, else its content."""
+    return article.rag_data if article.rag_data and article.rag_data.strip() else article.content
+
+def article_content_hash(article):
+    return content_hash(article.title, article.content, article.rag_data or "")
+
+def needs_embedding(article):
+    """True if the article's title/content/rag_data or the embedding model changed since it was last embedded."""
+    return (article.content_hash != article_content_hash(article)
+            or article.embedding_model != EMBEDDING_MODEL)
+
+def article_embedding_texts(article):
+    """
+    The passages an article is split into (from rag_text()), and the texts to embed
+    for it: the whole article first, then each passage (all prefixed with the title).
+    """
+    passages = split_passages(
+        rag_text(article),
+        max_tokens=getattr(settings, "KB_CHUNK_TOKENS", 200),
+        overlap_tokens=getattr(settings, "KB_CHUNK_OVERLAP_TOKENS", 40),
+    )
+    texts = [f"{article.title}\n\n{article.content}"] + [f"{article.title}\n\n{p}" for p in passages]
+    return passages, texts
+
+def store_article_embeddings(article, passages, vectors):
+    """Save the article vector and replace its chunks; `vectors` aligns with article_embedding_texts()."""
+    with transaction.atomic():
+        article.set_embedding(vectors[0], model=EMBEDDING_MODEL)
+        article.content_hash = article_content_hash(article)
+        # updated_at too: VectorIndex treats rows updated after the ANN snapshot as stale
+        article.save(update_fields=["embedding", "embedding_dim", "embedding_model", "content_hash", "updated_at"])
+        article.chunks.all().delete()
+        for position, (passage, vector) in enumerate(zip(passages, vectors[1:])):
+            chunk = KnowledgeChunk(article=article, position=position, text=passage,
+                                   token_count=estimate_tokens(passage))
+            chunk.set_embedding(vector, model=EMBEDDING_MODEL)
+            chunk.save()
+
+def embed_article(article, force=False):
+    """
+    Regenerate an article's embedding and its passage chunks (one batched call).
+    Skipped when the stored content hash shows title/content and the embedding model are unchanged.
+    Returns True if new embeddings were stored.
+    """
+    if not force and not needs_embedding(article):
+        return False
+
+    passages, texts = article_embedding_texts(article)
+    vectors = generate_embeddings(texts, title=article.title)
+    if vectors is None:
+        return False
+    store_article_embeddings(article, passages, vectors)
+    return True
+
+def generate_query_embedding(text):
+    """
+    Generates embedding optimized for a search query.
+    Repeated queries are served from the query embedding cache.
+    Returns: float32 NumPy array or None if it fails.
+    """
+    if not gemini.available: return None
+
+    def embed():
+        try:
+            result = gemini.embed_content(
+                operation="embed_query",
+                model=EMBEDDING_MODEL,
+                content=text,
+                task_type="retrieval_query"
+            )
+            return result['embedding']
+        except Exception as e:
+            print(f"❌ Query Embedding Error: {e}")
+            return None
+
+    return query_embedding_cache.get_or_compute(text, EMBEDDING_MODEL, embed)
+
+def fetch_ranked(hits, **scores):
+    """
+    Load the articles for ranked [(id, score), ...] hits, preserving order.
+    Extra keyword arguments map attribute names to {id: value} dicts set on each article.
+    """
+    articles = KnowledgeBase.objects.defer("embedding").in_bulk([article_id for article_id, _ in hits])
+    results = []
+    for article_id, score in hits:
+        article = articles.get(article_id)
+        if article is None or not article.is_active:
+            continue  # Deleted/deactivated by another worker since the index was built
+        article.score = score
+        for name, values in scores.items():
+            setattr(article, name, values.get(article_id))
+        results.append(article)
+    return results
+
+def keyword_search(query, top_k=5):
+    """BM25-ranked keyword search over title, tags and content; no remote calls."""
+    hits = bm25_index.search(query, top_k=top_k)
+    return fetch_ranked(hits, bm25_score=dict(hits))
 
 def semantic_search(query, top_k=5):
     """
-    Performs semantic search on KnowledgeBase articles using Cosine Similarity.
+    Hybrid search: BM25 keyword ranking fused with embedding cosine similarity
+    by reciprocal-rank fusion. Falls back to BM25 alone when no query embedding is available.
+    Only the final top_k rows are read from the DB. Each returned article carries
+    `score` (fused), `similarity` (cosine, if it was a vector hit) and `bm25_score`.
     """
     query_vec = generate_query_embedding(query)
-    if not query_vec:
-        # Fallback to simple database search
-        return KnowledgeBase.objects.filter(is_active=True).filter(
-            Q(title__icontains=query) | Q(content__icontains=query)
-        )[:top_k]
-
-    # Vector Search
-    articles = KnowledgeBase.objects.filter(is_active=True).exclude(embedding__isnull=True)
-    if not articles.exists():
-        # Fallback to keyword search if no articles have embeddings
-        return KnowledgeBase.objects.filter(is_active=True).filter(
-            Q(title__icontains=query) | Q(content__icontains=query)
-        )[:top_k]
-
-    scored_results = []
-    q_vec = np.array(query_vec)
-    
-    for article in articles:
-        try:
-            a_vec = np.array(article.embedding)
-            if not a_vec.any(): continue # Skip empty/zero embeddings
-
-            # Cosine Similarity: (A . B) / (||A|| * ||B||)
-            dot_product = np.dot(q_vec, a_vec)
-            norm_q = np.linalg.norm(q_vec)
-            norm_a = np.linalg.norm(a_vec)
-            
-            similarity = dot_product / (norm_q * norm_a)
-            scored_results.append((similarity, article))
-        except:
-            continue
-            
-    # Sort by similarity (highest first)
-    scored_results.sort(key=lambda x: x[0], reverse=True)
-    
-    if not scored_results:
-        # Final fallback if vector search yielded nothing
-        return KnowledgeBase.objects.filter(is_active=True).filter(
-            Q(title__icontains=query) | Q(content__icontains=query)
-        )[:top_k]
-
-    return [item[1] for item in scored_results[:top_k]]
+    if query_vec is None:
+        return keyword_search(query, top_k)
+
+    # Fuse deeper candidate lists than we return so either ranker can promote an article.
+    depth = max(top_k * 4, 20)
+    vector_hits = vector_index.search(query_vec, top_k=depth)
+    keyword_hits = bm25_index.search(query, top_k=depth)
+    if not vector_hits:
+        # No articles have (compatible) embeddings yet
+        return keyword_search(query, top_k)
+
+    fused = reciprocal_rank_fusion(
+        [article_id for article_id, _ in vector_hits],
+        [article_id for article_id, _ in keyword_hits],
+        k=getattr(settings, "KB_RRF_K", 60),
+    )
+    return fetch_ranked(fused[:top_k], similarity=dict(vector_hits), bm25_score=dict(keyword_hits))
+
+_EMBED_QUERY = object()
+
+def retrieve_passages(query, top_k=20, query_vec=_EMBED_QUERY):
+    """
+    Best-matching article passages for RAG, best first; knowledge.context.build_context
+    packs them into the prompt's token budget. Returns KnowledgeChunk objects with
+    `.article` loaded and a `score`. Without a query embedding, passages come from the
+    BM25-ranked articles; articles that have no stored chunks yet are split on the fly.
+    Pass query_vec if the caller already embedded the query (None if that failed).
+    """
+    candidates = []
+    if query_vec is _EMBED_QUERY:
+        query_vec = generate_query_embedding(query)
+    if query_vec is not None:
+        hits = chunk_index.search(query_vec, top_k=top_k)
+        chunks = (
+            KnowledgeChunk.objects.select_related("article")
+            .defer("embedding", "article__embedding")
+            .in_bulk([chunk_id for chunk_id, _ in hits])
+        )
+        for chunk_id, score in hits:
+            chunk = chunks.get(chunk_id)
+            if chunk is not None and chunk.article.is_active:
+                chunk.score = score
+                candidates.append(chunk)
+
+    if not candidates:
+        articles = keyword_search(query, top_k=5)
+        stored = {}
+        for chunk in KnowledgeChunk.objects.filter(article__in=articles).defer("embedding"):
+            stored.setdefault(chunk.article_id, []).append(chunk)
+        for article in articles:
+            chunks = stored.get(article.id) or [
+                KnowledgeChunk(article=article, position=i, text=p, token_count=estimate_tokens(p))
+                for i, p in enumerate(split_passages(rag_text(article)))
+            ]
+            for chunk in chunks:
+                chunk.article = article
+                chunk.score = article.score
+                candidates.append(chunk)
+
+    return candidates
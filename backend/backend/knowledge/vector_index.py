@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .ann import IVFIndex
+
+
+class VectorIndex:
+    """
+    Process-level cosine-similarity index over KnowledgeBase embeddings.
+
+    Rows are L2-normalised float32 vectors, so scoring a query is one
+    matrix-vector product followed by argpartition for the top-k.
+    The index is built lazily on first search, kept current by the
+    KnowledgeBase save/delete signals, and fully rebuilt every
+    KB_VECTOR_INDEX_REFRESH_SECONDS to pick up writes made by other workers.
+
+    When a persisted IVF index (see `manage.py build_kb_ann`) with at least
+    KB_ANN_MIN_SIZE vectors exists, it is memory-mapped and searched
+    approximately; only articles added or edited since it was built are
+    held in memory and scanned exactly. Smaller knowledge bases always use
+    the exact scan.
+
+    `queryset` returns the rows to index (any model with embedding,
+    embedding_dim and updated_at); `ann_path_setting` names the setting
+    holding that model's IVF index directory.
+    """
+
+    def __init__(self, queryset, ann_path_setting="KB_ANN_INDEX_PATH"):
+        self._queryset = queryset
+        self._ann_path_setting = ann_path_setting
+        self._lock = threading.RLock()
+        self._matrix = None          # (capacity, dim) float32, first _size rows live
+        self._ids = None             # (capacity,) int64
+        self._positions = {}         # row id -> matrix row
+        self._size = 0
+        self._dim = None
+        self._built_at = None
+        self._ann = None             # IVFIndex or None
+        self._ann_ids = frozenset()  # ids in the ANN index, read once when it loads
+        self._ann_excluded = set()   # ANN ids whose vector is stale or deleted
+
+    # ----- building -----
+
+    def _reset(self, dim, capacity):
+        self._dim = dim
+        self._matrix = np.zeros((max(capacity, 16), dim), dtype=np.float32)
+        self._ids = np.zeros(max(capacity, 16), dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+
+    def build(self):
+        """(Re)load every indexed row that has an embedding."""
+        queryset = self._queryset().filter(embedding_dim__gt=0).exclude(embedding__isnull=True)
+        ann = load_ann_index(getattr(settings, self._ann_path_setting, None))
+        ann_ids, excluded = frozenset(), set()
+        if ann is not None:
+            # Only rows the ANN snapshot doesn't cover (new or edited since) go in memory.
+            ann_ids = frozenset(ann.ids.tolist())
+            active = dict(queryset.values_list("id", "updated_at"))
+            delta = {
+                row_id for row_id, updated_at in active.items()
+                if row_id not in ann_ids or updated_at.timestamp() > ann.built_at
+            }
+            excluded = (delta & ann_ids) | (ann_ids - active.keys())
+            queryset = queryset.filter(id__in=delta)
+
+        rows = list(queryset.values_list("id", "embedding", "embedding_dim"))
+
+        with self._lock:
+            self._ann = ann
+            self._ann_ids = ann_ids
+            self._ann_excluded = excluded
+            self._load_rows(rows, ann.dim if ann is not None else None)
+            self._built_at = time.monotonic()
+
+    def _load_rows(self, rows, dim=None):
+        ids, matrix, dim = embeddings_to_matrix(rows, dim)
+        if len(ids) == 0:
+            self._matrix, self._ids, self._positions = None, None, {}
+            self._size, self._dim = 0, dim
+            return
+        self._reset(dim, len(ids))
+        self._matrix[:len(ids)] = matrix
+        self._ids[:len(ids)] = ids
+        self._positions = {int(row_id): row for row, row_id in enumerate(ids)}
+        self._size = len(ids)
+
+    def _ensure_fresh(self):
+        refresh = getattr(settings, "KB_VECTOR_INDEX_REFRESH_SECONDS", 300)
+        if self._built_at is None or time.monotonic() - self._built_at > refresh:
+            self.build()
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    # ----- incremental updates -----
+
+    def _append(self, row_id, vector):
+        if self._ids is None:
+            self._reset(len(vector), 16)
+        if self._size == len(self._ids):
+            capacity = len(self._ids) * 2
+            matrix = np.zeros((capacity, self._dim), dtype=np.float32)
+            matrix[:self._size] = self._matrix[:self._size]
+            ids = np.zeros(capacity, dtype=np.int64)
+            ids[:self._size] = self._ids[:self._size]
+            self._matrix, self._ids = matrix, ids
+        self._matrix[self._size] = vector
+        self._ids[self._size] = row_id
+        self._positions[row_id] = self._size
+        self._size += 1
+
+    def upsert(self, row_id, embedding):
+        """Insert or replace one row's vector (array-like); None removes it."""
+        vector = _normalize(embedding)
+        with self._lock:
+            if self._built_at is None:
+                return  # Not loaded yet; the first search will build from the DB.
+            if vector is None:
+                self.remove(row_id)
+                return
+            if self._dim is None:
+                self._dim = len(vector)
+            if len(vector) != self._dim:
+                self.remove(row_id)
+                return
+            if row_id in self._ann_ids:
+                self._ann_excluded.add(row_id)
+            row = self._positions.get(row_id)
+            if row is None:
+                self._append(row_id, vector)
+            else:
+                self._matrix[row] = vector
+
+    def remove(self, row_id):
+        with self._lock:
+            if row_id in self._ann_ids:
+                self._ann_excluded.add(row_id)
+            row = self._positions.pop(row_id, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the hole so live rows stay contiguous.
+                moved_id = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._positions[moved_id] = row
+            self._size = last
+
+    # ----- querying -----
+
+    def search(self, query_embedding, top_k=5):
+        """Return [(id, cosine_similarity), ...] best first."""
+        self._ensure_fresh()
+        query = _normalize(query_embedding)
+        with self._lock:
+            if query is None or len(query) != self._dim:
+                return []
+            ann, excluded = self._ann, frozenset(self._ann_excluded)
+            if self._size:
+                scores = self._matrix[:self._size] @ query
+                ids = self._ids[:self._size].copy()
+            else:
+                scores = np.empty(0, dtype=np.float32)
+                ids = np.empty(0, dtype=np.int64)
+
+        if ann is not None:
+            n_probe = getattr(settings, "KB_ANN_NPROBE", 8)
+            # Over-fetch so dropping stale/deleted ids still leaves top_k candidates.
+            ann_ids, ann_scores = ann.search(query, top_k + len(excluded), n_probe)
+            if excluded:
+                keep = ~np.isin(ann_ids, np.fromiter(excluded, dtype=np.int64, count=len(excluded)))
+                ann_ids, ann_scores = ann_ids[keep], ann_scores[keep]
+            ids = np.concatenate([ids, ann_ids])
+            scores = np.concatenate([scores, ann_scores])
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def __contains__(self, row_id):
+        with self._lock:
+            return row_id in self._positions or (row_id in self._ann_ids and row_id not in self._ann_excluded)
+
+    def __len__(self):
+        with self._lock:
+            return self._size + len(self._ann_ids) - len(self._ann_excluded)
+
+
+def embeddings_to_matrix(rows, dim=None):
+    """
+    Turn (id, embedding bytes, embedding_dim) rows into (ids, unit-length matrix, dim).
+    Rows of another dimension (i.e. another embedding model) or zero length are dropped;
+    without an explicit dim the most common one wins.
+    """
+    from .models import EMBEDDING_DTYPE
+
+    if rows and dim is None:
+        dims, counts = np.unique([d for _, _, d in rows], return_counts=True)
+        dim = int(dims[np.argmax(counts)])
+    rows = [(i, bytes(blob)) for i, blob, d in rows if d == dim and len(blob) == dim * 4]
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, dim or 0), dtype=np.float32), dim
+
+    # One contiguous buffer -> (n, dim) matrix, normalised in a single pass.
+    matrix = np.frombuffer(b"".join(blob for _, blob in rows), dtype=EMBEDDING_DTYPE)
+    matrix = matrix.reshape(len(rows), dim).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1)
+    usable = np.isfinite(norms) & (norms > 0)
+    matrix = matrix[usable] / norms[usable, None]
+    ids = np.array([i for i, _ in rows], dtype=np.int64)[usable]
+    return ids, matrix, dim
+
+
+def load_ann_index(path):
+    """The IVF index persisted at `path` if it exists and is large enough to beat an exact scan."""
+    if not path or not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    try:
+        ann = IVFIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Could not load ANN index from {path}: {e}")
+        return None
+    if len(ann) < getattr(settings, "KB_ANN_MIN_SIZE", 5000):
+        return None
+    return ann
+
+
+def _normalize(embedding):
+    """Return a unit-length float32 copy of the embedding, or None if unusable."""
+    if embedding is None:
+        return None
+    try:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+    except (TypeError, ValueError):
+        return None
+    if vector.size == 0:
+        return None
+    norm = np.linalg.norm(vector)
+    if not np.isfinite(norm) or norm == 0:
+        return None
+    return vector / norm
+
+
+def _active_articles():
+    from .models import KnowledgeBase
+    return KnowledgeBase.objects.filter(is_active=True)
+
+
+def _active_chunks():
+    from .models import KnowledgeChunk
+    return KnowledgeChunk.objects.filter(article__is_active=True)
+
+
+vector_index = VectorIndex(_active_articles, "KB_ANN_INDEX_PATH")
+chunk_index = VectorIndex(_active_chunks, "KB_CHUNK_ANN_INDEX_PATH")
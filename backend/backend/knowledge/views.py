@@ -1,10 +1,15 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from backend.throttling import TokenBucketThrottle
 from .models import KnowledgeBase, CannedResponse, FAQ
 from .serializers import KnowledgeBaseSerializer, CannedResponseSerializer, FAQSerializer
-from .utils import generate_embedding, generate_query_embedding
-import numpy as np
+from .tasks import schedule_article_embedding
+
+class KnowledgeSearchThrottle(TokenBucketThrottle):
+    """Per-user / per-IP token buckets for the public semantic search (KB_SEARCH_THROTTLE_*)."""
+    scope = "kb_search"
+    setting_prefix = "KB_SEARCH_THROTTLE"
 
 class FAQViewSet(viewsets.ModelViewSet):
     """
@@ -25,7 +30,8 @@ class KnowledgeBaseViewSet(viewsets.ModelViewSet):
     CRUD for knowledge base articles.
     Public can read, authenticated users can create/edit.
     """
-    queryset = KnowledgeBase.objects.filter(is_active=True)
+    # The serializer never exposes the vector, so don't load it
+    queryset = KnowledgeBase.objects.filter(is_active=True).defer("embedding")
     serializer_class = KnowledgeBaseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -35,24 +41,19 @@ class KnowledgeBaseViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
     def perform_create(self, serializer):
-        # Auto-generate embedding on create
+        # Embeddings are generated by a background job so the response doesn't wait on Gemini
         instance = serializer.save(created_by=self.request.user)
-        
-        # Combine title and content for embedding
-        full_text = f"{instance.title}\n\n{instance.content}"
-        embedding = generate_embedding(full_text)
-        
-        if embedding:
-            instance.set_embedding(embedding)
-            instance.save()
-            print(f"✅ Embedding generated for article: {instance.title}")
-        else:
-            print(f"⚠️ Failed to generate embedding for: {instance.title}")
+        schedule_article_embedding(instance)
 
-    @action(detail=False, methods=['get'])
+    def perform_update(self, serializer):
+        # Re-embed only if title/content changed (checked against the stored content hash)
+        instance = serializer.save()
+        schedule_article_embedding(instance)
+
+    @action(detail=False, methods=['get'], throttle_classes=[KnowledgeSearchThrottle])
     def search(self, request):
         """
-        Semantic search endpoint.
+        Semantic search endpoint. Public, so throttled per user / IP (429 when over the rate).
         """
         query = request.query_params.get('q', None)
         if not query:
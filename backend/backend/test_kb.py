@@ -32,7 +32,8 @@ def run_test():
         print(f"   Generating embedding for: {title}...")
         emb = generate_embedding(content)
         if emb:
-            kb = KnowledgeBase.objects.create(title=title, content=content, embedding=emb)
+            kb = KnowledgeBase(title=title, content=content)
+            kb.set_embedding(emb)
             kb.save()
         else:
             print(f"   ⚠️ Skipping {title} due to embedding failure.")
@@ -49,19 +50,20 @@ def run_test():
         print(f"\nQUERY: '{q}'")
         q_vec = generate_query_embedding(q)
         time.sleep(10) # RATELIMIT BACKOFF
-        if not q_vec:
+        if q_vec is None:
             print("❌ Failed to embed query")
             continue
             
         all_articles = KnowledgeBase.objects.filter(title__startswith="Test:")
         scores = []
         for a in all_articles:
-            if not a.embedding: continue
+            a_vec = a.get_embedding()
+            if a_vec is None: continue
             
             # cosine sim
-            dp = np.dot(q_vec, a.embedding)
+            dp = np.dot(q_vec, a_vec)
             nq = np.linalg.norm(q_vec)
-            na = np.linalg.norm(a.embedding)
+            na = np.linalg.norm(a_vec)
             sim = dp / (nq * na)
             scores.append((sim, a.title))
             
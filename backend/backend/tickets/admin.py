@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Ticket, SLATime, CommentThread, Comment
+from .models import Ticket, SLATime, CommentThread, Comment, ChatSession
 
 
 @admin.register(SLATime)
@@ -22,3 +22,9 @@ class TicketAdmin(admin.ModelAdmin):
     list_display = ("id", "subject", "queue", "priority_id", "status", "created_user", "assigned_user", "creation_time")
     list_filter = ("queue", "priority_id", "status")
     search_fields = ("subject", "description")
+
+
+@admin.register(ChatSession)
+class ChatSessionAdmin(admin.ModelAdmin):
+    list_display = ("session_id", "turn_count", "created_at", "updated_at")
+    search_fields = ("session_id",)
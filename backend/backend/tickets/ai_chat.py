@@ -1,88 +1,256 @@
+import hashlib
 import re
-import os
-import google.generativeai as genai
+from backend import metrics
+from backend.gemini import gemini
+from backend.singleflight import SingleFlight
+from backend.streaming import run_in_thread
 from django.db.models import Q
 from knowledge.models import KnowledgeBase
 
-def get_ai_chat_response(user_message, chat_history=[]):
-    """
-    Generates a conversational response using RAG + Google Gemini.
-    """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return {
-            "response": "I'm sorry, my brain connection is missing (API Key not found). I can't think right now!",
-            "show_ticket_option": True
-        }
-
-    try:
-        # 1. RAG: Search Knowledge Base for context
-        from knowledge.utils import semantic_search
-        context_docs = semantic_search(user_message, top_k=5)
-        
-        # Limit total context to top 5 most relevant-looking docs
-        context_text = ""
-        for doc in context_docs:
-            context_text += f"---\nTitle: {doc.title}\nContent: {doc.content}\n---\n"
-
-        # 2. Configure Gemini
-        genai.configure(api_key=api_key)
-        
-        # Find model
-        model_name = 'gemini-pro'
-        try:
-            for m in genai.list_models():
-                if 'generateContent' in m.supported_generation_methods and 'gemini' in m.name:
-                    model_name = m.name
-                    break
-        except: pass
-        
-        model = genai.GenerativeModel(model_name)
-
-        # 3. Construct Prompt
-        system_prompt = """
+SYSTEM_PROMPT = """
         You are 'SmartDesk', a helpful, professional, and friendly IT Service Desk AI.
         Your goal is to help employees resolve their issues using the provided KNOWLEDGE BASE articles.
-        
+
         INSTRUCTIONS:
         1. Answer the user's question using ONLY the provided Context.
         2. If the Context contains the answer, explain it clearly step-by-step.
         3. If the Context DOES NOT contain the answer, politely say you don't have that information and suggest they create a ticket.
         4. Be concise but conversational. Do not mention "context" or "articles" directly, just give the info.
         5. If the user just says "hi" or "hello", greet them warmly and ask how to help.
-        
+
         CONTEXT FROM KNOWLEDGE BASE:
         {context}
         """
 
-        full_prompt = f"{system_prompt.replace('{context}', context_text)}\n\nUser Question: {user_message}"
-
-        # 4. Generate
-        response = model.generate_content(full_prompt)
-        ai_text = response.text.strip()
-        
-        # 5. Determine if we should show "Create Ticket" button
-        # If AI suggests creating a ticket or says it doesn't know, show the button.
-        low_confidence_phrases = [
-            "create a ticket", "submit a ticket", "don't have information", 
-            "contact support", "don't know", "unable to help"
-        ]
-        
-        show_ticket = any(phrase in ai_text.lower() for phrase in low_confidence_phrases)
-
-        # If RAG found nothing and it wasn't a greeting, default to showing ticket option
-        if not context_text and len(user_message.split()) > 2 and "hello" not in user_message.lower():
-            show_ticket = True
+# If AI suggests creating a ticket or says it doesn't know, show the button.
+LOW_CONFIDENCE_PHRASES = [
+    "create a ticket", "submit a ticket", "don't have information",
+    "contact support", "don't know", "unable to help"
+]
 
-        return {
-            "response": ai_text,
-            "show_ticket_option": show_ticket,
-            "ticket_context": user_message # Pass original query for ticket creation
-        }
+NO_API_KEY_RESPONSE = {
+    "response": "I'm sorry, my brain connection is missing (API Key not found). I can't think right now!",
+    "show_ticket_option": True,
+    "answered_by": "unavailable"
+}
+
+# Identical prompts in flight at once (e.g. many users asking the same new question) share one Gemini call
+llm_flight = SingleFlight("chat.llm")
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+def faq_answer(user_message, entry):
+    """Chat result for a FAQ / canned response match from knowledge.faq_index."""
+    answered_by, _, answer = entry
+    return {
+        "response": answer,
+        "show_ticket_option": False,
+        "ticket_context": user_message,
+        "sources": [],
+        "context_tokens": 0,
+        "answered_by": answered_by
+    }
+
+def unavailable_response(user_message):
+    """Without Gemini only questions matching a FAQ or canned response word for word can be answered."""
+    from knowledge.faq_index import faq_index
+    entry = faq_index.match_text(user_message)
+    return faq_answer(user_message, entry) if entry is not None else dict(NO_API_KEY_RESPONSE)
+
+def open_conversation(session_id):
+    """The chat session (a new one if session_id is missing or unknown) and its history for the prompt."""
+    from .chat_sessions import chat_sessions
+    conversation = chat_sessions.open(session_id)
+    return conversation, chat_sessions.prompt_history(conversation)
+
+def remember_exchange(conversation, user_message, answer, result):
+    """Add the exchange to the chat session and tell the client its session id."""
+    from .chat_sessions import chat_sessions
+    chat_sessions.record(conversation, user_message, answer)
+    result["session_id"] = conversation.session_id
+    return result
+
+def lookup_cached_answer(user_message, use_cache=True):
+    """
+    Answers that need no LLM call: a FAQ / canned response with the same normalized
+    text (checked before embedding), then a FAQ with a similar question embedding,
+    then the semantic answer cache (unless use_cache is False, e.g. for follow-ups
+    whose answer depends on the conversation).
+    Returns (query_vec, answer or None); query_vec is None if embedding failed or wasn't needed.
+    """
+    from knowledge.answer_cache import answer_cache
+    from knowledge.faq_index import faq_index
+    from knowledge.utils import generate_query_embedding
+    entry = faq_index.match_text(user_message)
+    if entry is not None:
+        return None, faq_answer(user_message, entry)
+
+    query_vec = generate_query_embedding(user_message)
+    entry = faq_index.match_vector(query_vec)
+    if entry is not None:
+        return query_vec, faq_answer(user_message, entry)
+
+    cached = answer_cache.get(query_vec) if use_cache else None
+    if cached is not None:
+        cached["ticket_context"] = user_message
+        cached["context_tokens"] = 0   # no prompt was sent for this answer
+        cached["answered_by"] = "answer_cache"
+    return query_vec, cached
+
+def cache_answer(query_vec, result, passages):
+    from knowledge.answer_cache import answer_cache
+    answer_cache.set(query_vec, result, [passage.article for passage in passages])
+
+def build_chat_prompt(user_message, query_vec, history=""):
+    """
+    RAG step: retrieve the best KB passages and pack them, deduplicated, into the
+    context token budget (KB_RAG_TOKEN_BUDGET); `history` is the conversation so far.
+    Returns (prompt, passages used, estimated context tokens).
+    """
+    from knowledge.context import build_context
+    from knowledge.utils import retrieve_passages
+    context_text, passages, context_tokens = build_context(retrieve_passages(user_message, query_vec=query_vec))
+    metrics.incr("chat.context.builds")
+    metrics.incr("chat.context.tokens", context_tokens)
+
+    full_prompt = SYSTEM_PROMPT.replace('{context}', context_text)
+    if history:
+        full_prompt += f"\n\nCONVERSATION SO FAR:\n{history}"
+    full_prompt += f"\n\nUser Question: {user_message}"
+    return full_prompt, passages, context_tokens
+
+def chat_sources(passages):
+    """The KB articles behind an answer, in ranking order: [{"id", "title"}, ...]."""
+    sources, seen = [], set()
+    for passage in passages:
+        if passage.article.id not in seen:
+            seen.add(passage.article.id)
+            sources.append({"id": passage.article.id, "title": passage.article.title})
+    return sources
+
+def finish_chat_response(user_message, ai_text, passages, context_tokens):
+    """Wrap a generated answer with the "Create Ticket" decision, its sources and context size."""
+    show_ticket = any(phrase in ai_text.lower() for phrase in LOW_CONFIDENCE_PHRASES)
+
+    # If RAG found nothing and it wasn't a greeting, default to showing ticket option
+    if not context_tokens and len(user_message.split()) > 2 and "hello" not in user_message.lower():
+        show_ticket = True
+
+    return {
+        "response": ai_text,
+        "show_ticket_option": show_ticket,
+        "ticket_context": user_message, # Pass original query for ticket creation
+        "sources": chat_sources(passages),
+        "context_tokens": context_tokens,
+        "answered_by": "llm"
+    }
+
+async def aget_ai_chat_response(user_message, session_id=None):
+    """
+    Generates a conversational response using RAG + Google Gemini.
+    session_id continues a server-side chat session; the result carries the
+    session id to send with the next message. Session and retrieval work runs on
+    an executor thread and the Gemini call is awaited, so no thread sits waiting
+    on the LLM; sync callers wrap it in asgiref's async_to_sync.
+    """
+    if not gemini.available:
+        return await run_in_thread(unavailable_response, user_message)
+
+    conversation, passages = None, []
+    try:
+        conversation, history = await run_in_thread(open_conversation, session_id)
+        query_vec, cached = await run_in_thread(lookup_cached_answer, user_message, not history)
+        if cached is not None:
+            return await run_in_thread(remember_exchange, conversation, user_message, cached["response"], cached)
+
+        full_prompt, passages, context_tokens = await run_in_thread(build_chat_prompt, user_message, query_vec, history)
+        response = await llm_flight.ado(prompt_key(full_prompt),
+                                        lambda: gemini.generate_content_async(full_prompt, operation="chat"))
+        result = finish_chat_response(user_message, response.text.strip(), passages, context_tokens)
+        if not history:
+            cache_answer(query_vec, result, passages)
+        return await run_in_thread(remember_exchange, conversation, user_message, result["response"], result)
+
+    except Exception as e:
+        print(f"❌ AI Chat Error: {e}")
+        result = fallback_chat_response(user_message, passages)
+        if conversation is not None:
+            result["session_id"] = conversation.session_id
+        return result
+
+def stream_ai_chat_response(user_message, session_id=None):
+    """
+    Streaming variant of aget_ai_chat_response. Yields ("token", text) pieces of the
+    answer as Gemini generates them, then one ("done", result) with the same keys
+    as aget_ai_chat_response except "response" (show_ticket_option, sources, session_id, ...).
+    """
+    if not gemini.available:
+        result = unavailable_response(user_message)
+        yield "token", result.pop("response")
+        yield "done", result
+        return
+
+    conversation, passages, pieces = None, [], []
+    try:
+        conversation, history = open_conversation(session_id)
+        query_vec, result = lookup_cached_answer(user_message, use_cache=not history)
+        if result is None:
+            full_prompt, passages, context_tokens = build_chat_prompt(user_message, query_vec, history)
+            for text in gemini.stream_content(full_prompt, operation="chat_stream"):
+                pieces.append(text)
+                yield "token", text
+            result = finish_chat_response(user_message, "".join(pieces).strip(), passages, context_tokens)
+            if not history:
+                cache_answer(query_vec, result, passages)
+        remember_exchange(conversation, user_message, result["response"], result)
 
     except Exception as e:
         print(f"❌ AI Chat Error: {e}")
+        if pieces:
+            # Part of the answer is already on screen; just offer a ticket
+            result = {"show_ticket_option": True, "ticket_context": user_message,
+                      "sources": chat_sources(passages), "answered_by": "llm"}
+        else:
+            result = fallback_chat_response(user_message, passages)
+        if conversation is not None:
+            result["session_id"] = conversation.session_id
+
+    if "response" in result:
+        text = result.pop("response")
+        if not pieces:
+            yield "token", text
+    yield "done", result
+
+def fallback_chat_response(user_message, passages, max_articles=3):
+    """
+    Answer without the LLM (Gemini failed, timed out or its circuit is open):
+    point the user at the best-matching KB articles, if any were retrieved.
+    """
+    if not passages:
         return {
             "response": "I'm having trouble connecting to the AI service right now. Please try again or create a ticket.",
-            "show_ticket_option": True
+            "show_ticket_option": True,
+            "answered_by": "fallback"
         }
+
+    lines, seen = [], set()
+    for passage in passages:
+        if passage.article.id in seen:
+            continue
+        seen.add(passage.article.id)
+        snippet = " ".join(passage.text.split())
+        if len(snippet) > 200:
+            snippet = snippet[:200].rsplit(" ", 1)[0] + "..."
+        lines.append(f"• {passage.article.title}: {snippet}")
+        if len(lines) == max_articles:
+            break
+
+    return {
+        "response": "I can't reach the AI assistant right now, but these knowledge base articles may help:\n\n"
+                    + "\n".join(lines),
+        "show_ticket_option": True,
+        "ticket_context": user_message,
+        "sources": chat_sources(passages),
+        "answered_by": "fallback"
+    }
@@ -1,78 +1,94 @@
 # tickets/ai_classifier.py - UPGRADED TO GEMINI AI WITH FALLBACK
-import os
+import hashlib
 import json
-import re
-import google.generativeai as genai
 from django.conf import settings
+from backend.gemini import gemini
+from .classification_cache import classification_cache
+from .keyword_matcher import KeywordMatcher
+from .local_classifier import classify_ticket_local
+
+# ===== RULE-BASED KEYWORDS =====
+
+# HR Keywords - Weighted by importance
+HR_PRIMARY = ['payroll', 'salary', 'wage', 'leave', 'vacation', 'resignation', 
+              'benefits', 'insurance', 'onboarding', 'hiring']
+HR_SECONDARY = ['employee', 'hr', 'holiday', 'pto', 'sick', 'attendance', 
+                'performance', 'appraisal', 'contract', 'policy']
+
+# IT Keywords - Weighted by importance
+IT_PRIMARY = ['laptop', 'computer', 'desktop', 'windows', 'mac', 'software', 
+              'network', 'wifi', 'email', 'password', 'login', 'printer', 
+              'server', 'system', 'crash', 'boot', 'screen']
+IT_SECONDARY = ['keyboard', 'mouse', 'monitor', 'app', 'application', 'internet',
+                'vpn', 'update', 'install', 'error', 'bug', 'virus', 'slow',
+                'freeze', 'hang', 'outlook', 'teams', 'zoom']
+
+# Facilities Keywords - Weighted by importance
+FAC_PRIMARY = ['toilet', 'bathroom', 'restroom', 'washroom', 'ac', 'air conditioning',
+               'plumbing', 'leak', 'water', 'sink', 'faucet', 'hvac', 'heating',
+               'elevator', 'door', 'lock', 'cleaning', 'maintenance']
+FAC_SECONDARY = ['office', 'desk', 'chair', 'furniture', 'room', 'conference',
+                 'meeting room', 'kitchen', 'pantry', 'light', 'lighting',
+                 'floor', 'ceiling', 'wall', 'building', 'parking']
+
+# Strong phrase detection (overrides scores)
+STRONG_PHRASES = {
+    'HR': ['vacation request', 'sick leave', 'salary issue', 'payroll problem',
+           'leave approval', 'resignation letter', 'offer letter'],
+    'IT': ['laptop not working', 'computer crash', 'email down', 'password reset',
+           'wifi down', 'internet down', 'printer jam', 'screen broken',
+           'windows not booting', 'blue screen', 'system error'],
+    'Facilities': ['toilet broken', 'sink broken', 'ac not working', 
+                   'air conditioning broken', 'bathroom issue', 'water leak',
+                   'door broken', 'lock broken', 'light not working']
+}
+
+# High priority indicators
+HIGH_URGENT = ['urgent', 'emergency', 'critical', 'asap', 'immediate', 'now']
+HIGH_BLOCKING = ['down', 'not working', 'broken', 'crashed', 'dead', 'stopped',
+                 'cant', 'cannot', 'unable', 'blocked', 'stuck']
+HIGH_IMPACT = ['meeting', 'presentation', 'client', 'deadline', 'today']
+HIGH_SAFETY = ['leak', 'flooding', 'fire', 'smoke', 'danger', 'unsafe']
+
+# Low priority indicators
+LOW_INDICATORS = ['question', 'query', 'wondering', 'curious', 'info', 
+                  'information', 'request', 'could you', 'can you',
+                  'when convenient', 'no rush', 'whenever', 'minor']
+
+NEGATION_PHRASES = ['not urgent', 'no rush', 'no hurry', 'low priority']
+
+# Every keyword above, matched in a single pass over the ticket text
+KEYWORD_MATCHER = KeywordMatcher(
+    HR_PRIMARY + HR_SECONDARY + IT_PRIMARY + IT_SECONDARY + FAC_PRIMARY + FAC_SECONDARY
+    + [phrase for phrases in STRONG_PHRASES.values() for phrase in phrases]
+    + HIGH_URGENT + HIGH_BLOCKING + HIGH_IMPACT + HIGH_SAFETY + LOW_INDICATORS + NEGATION_PHRASES
+)
 
 def classify_ticket_rule_based(subject, description):
     """
     Fallback rule-based classifier.
+    Keywords match whole words (plus plural/past/-ing forms), see KeywordMatcher.
     """
     
-    # Normalize text
-    text = f"{subject} {description}".lower()
-    text = re.sub(r'[^\w\s]', ' ', text)  # Remove punctuation
-    
-    # ===== ENHANCED QUEUE CLASSIFICATION =====
-    
-    # HR Keywords - Weighted by importance
-    hr_primary = ['payroll', 'salary', 'wage', 'leave', 'vacation', 'resignation', 
-                  'benefits', 'insurance', 'onboarding', 'hiring']
-    hr_secondary = ['employee', 'hr', 'holiday', 'pto', 'sick', 'attendance', 
-                    'performance', 'appraisal', 'contract', 'policy']
+    found = KEYWORD_MATCHER.find(f"{subject} {description}")
     
-    # IT Keywords - Weighted by importance
-    it_primary = ['laptop', 'computer', 'desktop', 'windows', 'mac', 'software', 
-                  'network', 'wifi', 'email', 'password', 'login', 'printer', 
-                  'server', 'system', 'crash', 'boot', 'screen']
-    it_secondary = ['keyboard', 'mouse', 'monitor', 'app', 'application', 'internet',
-                    'vpn', 'update', 'install', 'error', 'bug', 'virus', 'slow',
-                    'freeze', 'hang', 'outlook', 'teams', 'zoom']
+    def count(keywords, weight=1):
+        return sum(weight for kw in keywords if kw in found)
     
-    # Facilities Keywords - Weighted by importance
-    fac_primary = ['toilet', 'bathroom', 'restroom', 'washroom', 'ac', 'air conditioning',
-                   'plumbing', 'leak', 'water', 'sink', 'faucet', 'hvac', 'heating',
-                   'elevator', 'door', 'lock', 'cleaning', 'maintenance']
-    fac_secondary = ['office', 'desk', 'chair', 'furniture', 'room', 'conference',
-                     'meeting room', 'kitchen', 'pantry', 'light', 'lighting',
-                     'floor', 'ceiling', 'wall', 'building', 'parking']
+    # ===== ENHANCED QUEUE CLASSIFICATION =====
     
     # Calculate weighted scores
-    hr_score = (
-        sum(3 for kw in hr_primary if kw in text) +
-        sum(1 for kw in hr_secondary if kw in text)
-    )
-    
-    it_score = (
-        sum(3 for kw in it_primary if kw in text) +
-        sum(1 for kw in it_secondary if kw in text)
-    )
-    
-    fac_score = (
-        sum(3 for kw in fac_primary if kw in text) +
-        sum(1 for kw in fac_secondary if kw in text)
-    )
-    
-    # Strong phrase detection (overrides scores)
-    strong_phrases = {
-        'HR': ['vacation request', 'sick leave', 'salary issue', 'payroll problem',
-               'leave approval', 'resignation letter', 'offer letter'],
-        'IT': ['laptop not working', 'computer crash', 'email down', 'password reset',
-               'wifi down', 'internet down', 'printer jam', 'screen broken',
-               'windows not booting', 'blue screen', 'system error'],
-        'Facilities': ['toilet broken', 'sink broken', 'ac not working', 
-                       'air conditioning broken', 'bathroom issue', 'water leak',
-                       'door broken', 'lock broken', 'light not working']
-    }
+    hr_score = count(HR_PRIMARY, 3) + count(HR_SECONDARY)
+    it_score = count(IT_PRIMARY, 3) + count(IT_SECONDARY)
+    fac_score = count(FAC_PRIMARY, 3) + count(FAC_SECONDARY)
     
     # Check for strong phrases
     queue = 4  # Default to Other
     confidence = "low"
     
-    for category, phrases in strong_phrases.items():
+    for category, phrases in STRONG_PHRASES.items():
         for phrase in phrases:
-            if phrase in text:
+            if phrase in found:
                 if category == 'HR':
                     queue = 1
                 elif category == 'IT':
@@ -108,30 +124,18 @@ def classify_ticket_rule_based(subject, description):
     
     # ===== ENHANCED PRIORITY CLASSIFICATION =====
     
-    # High priority indicators
-    high_urgent = ['urgent', 'emergency', 'critical', 'asap', 'immediate', 'now']
-    high_blocking = ['down', 'not working', 'broken', 'crashed', 'dead', 'stopped',
-                     'cant', 'cannot', 'unable', 'blocked', 'stuck']
-    high_impact = ['meeting', 'presentation', 'client', 'deadline', 'today']
-    high_safety = ['leak', 'flooding', 'fire', 'smoke', 'danger', 'unsafe']
-    
-    # Low priority indicators
-    low_indicators = ['question', 'query', 'wondering', 'curious', 'info', 
-                      'information', 'request', 'could you', 'can you',
-                      'when convenient', 'no rush', 'whenever', 'minor']
-    
     # Count matches
     high_count = (
-        sum(2 for kw in high_urgent if kw in text) +
-        sum(1 for kw in high_blocking if kw in text) +
-        sum(1 for kw in high_impact if kw in text) +
-        sum(3 for kw in high_safety if kw in text)  # Safety is critical
+        count(HIGH_URGENT, 2) +
+        count(HIGH_BLOCKING) +
+        count(HIGH_IMPACT) +
+        count(HIGH_SAFETY, 3)  # Safety is critical
     )
     
-    low_count = sum(1 for kw in low_indicators if kw in text)
+    low_count = count(LOW_INDICATORS)
     
     # Negation detection
-    has_negation = any(phrase in text for phrase in ['not urgent', 'no rush', 'no hurry', 'low priority'])
+    has_negation = count(NEGATION_PHRASES) > 0
     
     # Determine priority
     if has_negation:
@@ -140,7 +144,7 @@ def classify_ticket_rule_based(subject, description):
     elif high_count >= 3:
         priority = 1
         reasoning += " | High priority (critical/urgent)"
-    elif any(kw in text for kw in high_urgent) or any(kw in text for kw in high_safety):
+    elif count(HIGH_URGENT) or count(HIGH_SAFETY):
         priority = 1
         reasoning += " | High priority (urgent keywords)"
     elif low_count >= 2 and high_count == 0:
@@ -156,35 +160,9 @@ def classify_ticket_rule_based(subject, description):
         "reasoning": reasoning + " (Rules Fallback)"
     }
 
-def classify_ticket(subject, description):
-    """
-    Main classifier entry point. 
-    Tries Google Gemini first, falls back to rule-based system if it fails.
-    """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("⚠️ No GEMINI_API_KEY found. Using rule-based classifier.")
-        return classify_ticket_rule_based(subject, description)
+# ===== LLM CLASSIFICATION =====
 
-    try:
-        genai.configure(api_key=api_key)
-        
-        # Dynamically find a usable model
-        model_name = 'gemini-pro' # fallback
-        try:
-            for m in genai.list_models():
-                if 'generateContent' in m.supported_generation_methods and 'gemini' in m.name:
-                    model_name = m.name
-                    break
-        except:
-            pass
-            
-        print(f"DEBUG: Using Gemini Model: {model_name}")
-        model = genai.GenerativeModel(model_name)
-        
-        prompt = f"""
-        You are an intelligent service desk assistant. Classify the following ticket into a Queue and a Priority.
-        
+CLASSIFICATION_GUIDE = """
         Queues:
         1 = HR (Payroll, benefits, hiring, leave, policy)
         2 = IT (Hardware, software, network, access, bugs)
@@ -195,7 +173,11 @@ def classify_ticket(subject, description):
         1 = High (Urgent, blocking work, safety hazard, strict deadline)
         2 = Medium (Standard request, broken but not blocking entire work)
         3 = Low (Question, info request, minor cosmetic issue, "no rush")
+"""
 
+CLASSIFY_PROMPT = """
+        You are an intelligent service desk assistant. Classify the following ticket into a Queue and a Priority.
+        {guide}
         Ticket Subject: {subject}
         Ticket Description: {description}
 
@@ -207,25 +189,105 @@ def classify_ticket(subject, description):
         }}
         """
 
-        response = model.generate_content(prompt)
-        content = response.text
-        
-        # Clean up code blocks if Gemini adds them
-        if "```json" in content:
-            content = content.replace("```json", "").replace("```", "")
-        if "```" in content:
-            content = content.replace("```", "")
-            
-        data = json.loads(content)
-        
-        # Validate keys
-        if "queue" not in data or "priority" not in data:
-            raise ValueError("Invalid JSON structure")
+BATCH_CLASSIFY_PROMPT = """
+        You are an intelligent service desk assistant. Classify EACH of the following tickets into a Queue and a Priority.
+        {guide}
+        Tickets (JSON):
+        {tickets}
+
+        Respond STRICTLY with a JSON array containing one object per ticket, in any order:
+        [
+            {{"id": <ticket id from the list>, "queue": <int>, "priority": <int>, "reasoning": "<short explanation>"}}
+        ]
+        """
+
+# Bump when classification logic changes in a way the prompt hash doesn't capture;
+# cached LLM classifications from other versions are then ignored.
+CLASSIFIER_VERSION = 1
+PROMPT_HASH = hashlib.sha256(
+    (CLASSIFICATION_GUIDE + CLASSIFY_PROMPT + BATCH_CLASSIFY_PROMPT).encode("utf-8")
+).hexdigest()[:12]
+
+def classifier_version():
+    """Identifies what produced an LLM classification: code version, prompts and resolved model."""
+    return f"{CLASSIFIER_VERSION}:{PROMPT_HASH}:{gemini.resolve_model()}"
+
+def parse_llm_json(content):
+    """Parse a JSON reply, removing the code fences Gemini sometimes adds."""
+    if "```json" in content:
+        content = content.replace("```json", "").replace("```", "")
+    if "```" in content:
+        content = content.replace("```", "")
+    return json.loads(content)
+
+def validate_classification(data):
+    """Check a {"queue", "priority", "reasoning"} dict, coercing ids to int. Raises ValueError."""
+    if not isinstance(data, dict) or "queue" not in data or "priority" not in data:
+        raise ValueError("Invalid JSON structure")
+    try:
+        data["queue"], data["priority"] = int(data["queue"]), int(data["priority"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Non-integer classification: {data}")
+    if data["queue"] not in (1, 2, 3, 4) or data["priority"] not in (1, 2, 3):
+        raise ValueError(f"Out of range classification: {data}")
+    data.setdefault("reasoning", "")
+    return data
+
+def classify_ticket_llm(subject, description):
+    """
+    Classify with Google Gemini only.
+    Returns the {"queue", "priority", "reasoning"} dict, or None if Gemini is unavailable or fails.
+    """
+    if not gemini.available:
+        print("⚠️ No GEMINI_API_KEY found. Using rule-based classifier.")
+        return None
+
+    try:
+        # Identical tickets (after whitespace/case normalization) reuse an earlier answer
+        version = classifier_version()
+        cached = classification_cache.get(subject, description, version)
+        if cached is not None:
+            return cached
+
+        prompt = CLASSIFY_PROMPT.format(guide=CLASSIFICATION_GUIDE, subject=subject, description=description)
+
+        response = gemini.generate_content(prompt, operation="classify")
+        data = validate_classification(parse_llm_json(response.text))
+        classification_cache.set(subject, description, version, data)
             
         print(f"🤖 Gemini Classification: Queue {data['queue']}, Priority {data['priority']}")
         return data
 
     except Exception as e:
         print(f"❌ Gemini Error: {e}")
-        # print("Using rule-based fallback.")
-        return classify_ticket_rule_based(subject, description)
+        return None
+
+def classify_ticket_fast(subject, description):
+    """
+    Sub-millisecond classification: the trained local model if there is one,
+    otherwise the keyword rules. The result carries "source" ("local"/"rules")
+    and, for the local model, "confidence".
+    """
+    result = classify_ticket_local(subject, description)
+    if result is not None:
+        return dict(result, source="local")
+    return dict(classify_ticket_rule_based(subject, description), source="rules")
+
+def is_confident(result):
+    """True if a classify_ticket_fast result is good enough to skip the LLM."""
+    threshold = getattr(settings, "TICKET_LOCAL_MODEL_CONFIDENCE", 0.85)
+    return result.get("source") == "local" and result.get("confidence", 0) >= threshold
+
+def classify_ticket(subject, description):
+    """
+    Main classifier entry point. 
+    Uses the local model when it is confident, otherwise Google Gemini,
+    falling back to the local model / rule-based system if Gemini fails.
+    """
+    fast = classify_ticket_fast(subject, description)
+    if is_confident(fast):
+        return fast
+    result = classify_ticket_llm(subject, description)
+    if result is None:
+        return fast
+    return dict(result, source="llm")
@@ -0,0 +1,292 @@
+# tickets/benchmark.py - LABELED CORPUS, LLM STAND-INS AND METRICS FOR CLASSIFIER BENCHMARKS
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from backend.cache import LocalLRUCache
+from backend.gemini import GeminiClientManager, breaker, gemini
+from . import ai_classifier, bulk_classifier
+from .classification_cache import ClassificationCache
+
+# Bump when the generator changes so results are only compared on the same corpus
+CORPUS_VERSION = 1
+QUEUES = (1, 2, 3, 4)
+PRIORITIES = (1, 2, 3)
+
+# ----- synthetic corpus -----
+
+ITEMS = {
+    1: ["payslip", "leave balance", "maternity leave", "benefits enrollment", "tax form",
+        "expense reimbursement", "onboarding paperwork", "performance review", "health insurance",
+        "relocation allowance", "salary revision", "employment letter", "holiday calendar"],
+    2: ["laptop", "monitor", "VPN", "email", "printer", "password", "Outlook", "Wi-Fi", "keyboard",
+        "docking station", "software license", "shared drive", "Teams", "MFA token", "database"],
+    3: ["air conditioning", "office chair", "corridor light", "elevator", "parking gate", "desk",
+        "restroom", "water leak", "heating", "window blinds", "kitchen fridge", "meeting room door"],
+    4: ["team offsite", "cafeteria menu", "company event", "parking policy question", "newsletter",
+        "volunteering day", "office plants", "charity drive"],
+}
+PROBLEMS = {
+    1: ["is incorrect", "has not been processed", "is missing", "needs to be updated",
+        "shows the wrong amount", "was rejected without a reason"],
+    2: ["won't turn on", "keeps crashing", "is very slow", "cannot connect", "shows an error",
+        "is locked", "stopped syncing", "is not working"],
+    3: ["is broken", "is not working", "is making a loud noise", "needs repair", "is leaking",
+        "is stuck", "is flickering"],
+    4: ["has a suggestion", "has a general question", "needs some information", "has feedback"],
+}
+SUBJECTS = ["{Item} {problem}", "Issue with {item}", "{Item} problem", "Help: {item}", "{item}"]
+OPENERS = ["Hi team,", "Hello,", "", "Good morning,", "Hi,"]
+CONTEXT = [
+    "It started this morning.", "This has happened a few times this week.",
+    "I already tried the usual steps.", "A colleague has the same problem.",
+    "I'm on the third floor near the kitchen.", "Employee ID {n}.", "See ticket reference {n}.",
+    "", "",
+]
+URGENCY = {
+    1: ["This is urgent, the whole team is blocked.", "Critical: clients are waiting on us right now.",
+        "We cannot work at all until this is fixed, please treat as an emergency.",
+        "It is a safety hazard, someone could get hurt.", "Production is down, ASAP please."],
+    2: ["Please look into it when you can today.", "It is affecting my work a bit.", "", ""],
+    3: ["No rush, whenever you get a chance.", "Low priority, just a minor cosmetic thing.",
+        "Not urgent at all.", "Just a small request when convenient."],
+}
+
+
+def synthetic_tickets(size=5000, seed=0):
+    """
+    Deterministic labeled corpus: [(subject, description, queue, priority), ...].
+    Queue is set by the item, priority by the urgency sentence; wording, order,
+    casing and the odd typo vary so keyword rules and models are both exercised.
+    """
+    rng = random.Random(seed)
+    tickets = []
+    for _ in range(size):
+        queue = rng.choices(QUEUES, weights=(3, 5, 3, 1))[0]
+        priority = rng.choices(PRIORITIES, weights=(2, 5, 3))[0]
+        item, problem = rng.choice(ITEMS[queue]), rng.choice(PROBLEMS[queue])
+        subject = rng.choice(SUBJECTS).format(item=item, Item=item[0].upper() + item[1:], problem=problem)
+        sentences = [
+            rng.choice(OPENERS),
+            f"My {item} {problem}." if rng.random() < 0.7 else f"The {item} {problem}.",
+            rng.choice(CONTEXT).format(n=rng.randint(1000, 99999)),
+            rng.choice(URGENCY[priority]),
+        ]
+        if rng.random() < 0.3:
+            sentences[1:3] = sentences[2:0:-1]
+        description = " ".join(s for s in sentences if s)
+        if rng.random() < 0.1:
+            description = description.lower()
+        if rng.random() < 0.05:
+            i = rng.randrange(len(description))
+            description = description[:i] + description[i + 1:]
+        tickets.append((subject, description, queue, priority))
+    return tickets
+
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+_NUMBER = re.compile(r"\b\d{4,}\b")
+_URL = re.compile(r"https?://\S+")
+
+
+def anonymize(text):
+    """Strip e-mail addresses, URLs, phone numbers and long numbers (IDs, account numbers)."""
+    text = _EMAIL.sub("<email>", text or "")
+    text = _URL.sub("<url>", text)
+    text = _PHONE.sub("<phone>", text)
+    return _NUMBER.sub("<number>", text)
+
+
+def corpus_digest(tickets):
+    return hashlib.sha256(json.dumps(tickets, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+# ----- LLM stand-ins -----
+
+_SINGLE = re.compile(r"Ticket Subject: (.*?)\n\s*Ticket Description: (.*?)\n\s*Respond STRICTLY", re.S)
+_BATCH = re.compile(r"Tickets \(JSON\):\s*(\[.*\])\s*Respond STRICTLY", re.S)
+
+
+class OracleStandIn:
+    """
+    Local replacement for Gemini that answers from the corpus labels, after
+    `latency_ms`, mislabelling `error_rate` and failing `failure_rate` of calls.
+    It measures the LLM path's own overhead and fallbacks (prompting, parsing,
+    validation, caching, batching) rather than model quality.
+    """
+
+    model_name = "stand-in/oracle"
+
+    def __init__(self, tickets, latency_ms=0, error_rate=0.0, failure_rate=0.0, seed=0):
+        self.labels = {(s.strip(), d.strip()): (q, p) for s, d, q, p in tickets}
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _answer(self, subject, description):
+        queue, priority = self.labels.get((subject.strip(), description.strip()), (4, 2))
+        with self._lock:
+            wrong = self._rng.random() < self.error_rate
+        if wrong:
+            queue = QUEUES[(QUEUES.index(queue) + 1) % len(QUEUES)]
+        return {"queue": queue, "priority": priority, "reasoning": "stand-in"}
+
+    def __call__(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            failed = self._rng.random() < self.failure_rate
+        if failed:
+            raise RuntimeError("stand-in failure")
+        batch = _BATCH.search(prompt)
+        if batch:
+            items = json.loads(batch.group(1))
+            return json.dumps([dict(self._answer(i["subject"], i["description"]), id=i["id"]) for i in items])
+        subject, description = _SINGLE.search(prompt).groups()
+        return json.dumps(self._answer(subject, description))
+
+
+class ReplayStandIn:
+    """Answers prompts from a recording made with RecordingClient (JSONL of {"prompt", "text"})."""
+
+    model_name = "stand-in/replay"
+
+    def __init__(self, path):
+        self.responses = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.responses[record["prompt"]] = record["text"]
+        self.missing = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        text = self.responses.get(prompt_key(prompt))
+        if text is None:
+            with self._lock:
+                self.missing += 1
+            raise KeyError("no recorded response for prompt")
+        return text
+
+
+class RecordingClient:
+    """Calls the real Gemini API and appends every (prompt hash, response text) to `path`."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._real = gemini.generate_content
+
+    def __call__(self, prompt):
+        text = self._real(prompt, operation="benchmark_record").text
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"prompt": prompt_key(prompt), "text": text}) + "\n")
+        return text
+
+
+def prompt_key(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def llm_stand_in(answer):
+    """
+    Route the classifier's Gemini calls to `answer(prompt) -> text`, with a fresh
+    private classification cache and a closed circuit breaker. A RecordingClient
+    still talks to the real API; stand-ins make Gemini look configured.
+    """
+    cache = ClassificationCache(LocalLRUCache(100000), name="benchmark.classify.cache")
+
+    def generate_content(prompt, operation="generate", timeout=None, **kwargs):
+        return SimpleNamespace(text=answer(prompt))
+
+    patches = [
+        mock.patch.object(ai_classifier, "classification_cache", cache),
+        mock.patch.object(bulk_classifier, "classification_cache", cache),
+        mock.patch.object(gemini, "generate_content", generate_content),
+    ]
+    if not isinstance(answer, RecordingClient):
+        patches += [
+            mock.patch.object(GeminiClientManager, "available", new_callable=mock.PropertyMock, return_value=True),
+            mock.patch.object(gemini, "resolve_model", lambda capability="generate": answer.model_name),
+        ]
+    for patch in patches:
+        patch.start()
+    breaker.reset()
+    try:
+        yield cache
+    finally:
+        for patch in reversed(patches):
+            patch.stop()
+        breaker.reset()
+
+
+# ----- metrics -----
+
+def confusion_matrix(truth, predicted, labels):
+    """Rows are true labels, columns predicted labels, both in `labels` order."""
+    index = {label: i for i, label in enumerate(labels)}
+    matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    for t, p in zip(truth, predicted):
+        if t in index and p in index:
+            matrix[index[t], index[p]] += 1
+    return {"labels": list(labels), "matrix": matrix.tolist()}
+
+
+def summarize(tickets, results, latencies_ms, wall_seconds):
+    """Accuracy, confusion matrices, throughput and latency percentiles for one tier."""
+    pairs = [(t, r) for t, r in zip(tickets, results) if r is not None]
+    truth_q = [t[2] for t, _ in pairs]
+    truth_p = [t[3] for t, _ in pairs]
+    pred_q = [r["queue"] for _, r in pairs]
+    pred_p = [r["priority"] for _, r in pairs]
+    n = len(pairs)
+    summary = {
+        "n": len(tickets),
+        "answered": n,
+        "queue_accuracy": round(sum(a == b for a, b in zip(truth_q, pred_q)) / n, 4) if n else 0.0,
+        "priority_accuracy": round(sum(a == b for a, b in zip(truth_p, pred_p)) / n, 4) if n else 0.0,
+        "throughput_per_second": round(len(tickets) / wall_seconds, 1) if wall_seconds else None,
+        "queue_confusion": confusion_matrix(truth_q, pred_q, QUEUES),
+        "priority_confusion": confusion_matrix(truth_p, pred_p, PRIORITIES),
+    }
+    if latencies_ms:
+        summary["p50_ms"] = round(float(np.percentile(latencies_ms, 50)), 4)
+        summary["p99_ms"] = round(float(np.percentile(latencies_ms, 99)), 4)
+    sources = {}
+    for _, r in pairs:
+        if "source" in r:
+            sources[r["source"]] = sources.get(r["source"], 0) + 1
+    if sources:
+        summary["sources"] = sources
+    return summary
+
+
+def evaluate(classify, tickets):
+    """Run classify(subject, description) on each ticket; returns (summary, results)."""
+    results, latencies = [], []
+    started = time.perf_counter()
+    for subject, description, _, _ in tickets:
+        t0 = time.perf_counter()
+        results.append(classify(subject, description))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return summarize(tickets, results, latencies, time.perf_counter() - started), results
+
+
+def evaluate_bulk(tickets, **options):
+    """classify_tickets_bulk over all tickets at once; latency is per call, so only throughput is reported."""
+    started = time.perf_counter()
+    results = bulk_classifier.classify_tickets_bulk([(s, d) for s, d, _, _ in tickets], **options)
+    return summarize(tickets, results, None, time.perf_counter() - started), results
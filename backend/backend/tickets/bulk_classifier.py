@@ -0,0 +1,160 @@
+# tickets/bulk_classifier.py - MANY TICKETS PER GEMINI PROMPT
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from backend import metrics
+from backend.gemini import gemini
+from backend.ratelimit import TokenBucket
+from .ai_classifier import (
+    BATCH_CLASSIFY_PROMPT,
+    CLASSIFICATION_GUIDE,
+    classifier_version,
+    classify_ticket_fast,
+    is_confident,
+    parse_llm_json,
+    validate_classification,
+)
+from .classification_cache import classification_cache
+from .models import Ticket, SLATime
+
+STAGE_BY_SOURCE = {
+    "local": Ticket.CLASSIFIED_BY_LOCAL,
+    "llm": Ticket.CLASSIFIED_BY_LLM,
+    "rules": Ticket.CLASSIFIED_BY_RULES,
+}
+
+# Long descriptions add tokens without helping the model pick a queue
+MAX_DESCRIPTION_CHARS = 2000
+
+
+def build_batch_prompt(tickets):
+    """One prompt for several (subject, description) pairs, numbered from 0."""
+    payload = [
+        {"id": i, "subject": subject, "description": (description or "")[:MAX_DESCRIPTION_CHARS]}
+        for i, (subject, description) in enumerate(tickets)
+    ]
+    return BATCH_CLASSIFY_PROMPT.format(
+        guide=CLASSIFICATION_GUIDE,
+        tickets=json.dumps(payload, ensure_ascii=False),
+    )
+
+
+def parse_batch_response(content, size):
+    """
+    Map batch position -> validated classification for every well-formed item.
+    Items that are missing, duplicated or invalid are left out.
+    """
+    data = parse_llm_json(content)
+    if isinstance(data, dict):
+        data = data.get("tickets") or data.get("results") or []
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON array")
+
+    results = {}
+    for item in data:
+        try:
+            position = int(item["id"])
+            result = validate_classification({k: v for k, v in item.items() if k != "id"})
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= position < size and position not in results:
+            results[position] = result
+    return results
+
+
+def classify_batch_llm(tickets):
+    """
+    Classify one batch with a single Gemini call.
+    Returns {position: classification}; an empty dict if the call or the parse fails.
+    """
+    try:
+        response = gemini.generate_content(build_batch_prompt(tickets), operation="classify_batch",
+                                           timeout=settings.GEMINI_BATCH_TIMEOUT_SECONDS)
+        return parse_batch_response(response.text, len(tickets))
+    except Exception as e:
+        print(f"❌ Gemini batch error ({len(tickets)} tickets): {e}")
+        return {}
+
+
+def classify_tickets_bulk(tickets, batch_size=None, workers=None, requests_per_minute=None):
+    """
+    Classify many (subject, description) pairs, batch_size tickets per Gemini prompt,
+    with up to `workers` batches in flight under a requests-per-minute token bucket.
+    Tickets the local model is confident about never reach the LLM; any ticket
+    the LLM didn't classify falls back to classify_ticket_fast.
+
+    Returns a list aligned with `tickets` of {"queue", "priority", "reasoning", "source"},
+    where source is "local", "llm" or "rules".
+    """
+    tickets = list(tickets)
+    batch_size = batch_size or getattr(settings, "TICKET_CLASSIFY_BATCH_SIZE", 20)
+    workers = workers or getattr(settings, "TICKET_CLASSIFY_WORKERS", 4)
+    requests_per_minute = requests_per_minute or getattr(settings, "TICKET_CLASSIFY_REQUESTS_PER_MINUTE", 60)
+
+    fast = [classify_ticket_fast(subject, description) for subject, description in tickets]
+    llm_results = {}
+    if gemini.available and tickets:
+        # Confident local predictions and tickets seen before skip the prompt
+        version = classifier_version()
+        todo = []
+        for i, (subject, description) in enumerate(tickets):
+            if is_confident(fast[i]):
+                continue
+            cached = classification_cache.get(subject, description, version)
+            if cached is not None:
+                llm_results[i] = cached
+            else:
+                todo.append(i)
+
+        bucket = TokenBucket.per_minute(requests_per_minute, burst=workers)
+        starts = range(0, len(todo), batch_size)
+
+        def run(start):
+            bucket.acquire()
+            return start, classify_batch_llm([tickets[i] for i in todo[start:start + batch_size]])
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start, batch in pool.map(run, starts):
+                for position, result in batch.items():
+                    i = todo[start + position]
+                    llm_results[i] = result
+                    classification_cache.set(*tickets[i], version, result)
+
+    results = []
+    for i in range(len(tickets)):
+        result = llm_results.get(i)
+        if result is None:
+            result = fast[i]
+        else:
+            result["source"] = "llm"
+        metrics.incr(f"classify.bulk.{result['source']}")
+        results.append(result)
+    return results
+
+
+def reclassify_tickets(tickets, **options):
+    """
+    Bulk-classify Ticket objects and save queue, priority, sla_time and stage.
+    Tickets an agent classified by hand are skipped. Rows with the same outcome
+    are written with one UPDATE. Returns [(ticket, classification), ...].
+    """
+    tickets = [t for t in tickets if t.classification_stage != Ticket.CLASSIFIED_BY_AGENT]
+    results = classify_tickets_bulk([(t.subject, t.description) for t in tickets], **options)
+
+    sla_by_priority = {sla.priority_id: sla for sla in SLATime.objects.all()}
+    groups = {}
+    for ticket, result in zip(tickets, results):
+        stage = STAGE_BY_SOURCE[result["source"]]
+        groups.setdefault((result["queue"], result["priority"], stage), []).append(ticket.pk)
+    for (queue, priority, stage), ids in groups.items():
+        # Re-checked in the UPDATE in case an agent re-queued a ticket meanwhile
+        Ticket.objects.filter(pk__in=ids).exclude(classification_stage=Ticket.CLASSIFIED_BY_AGENT).update(
+            queue=queue,
+            priority_id=priority,
+            sla_time=sla_by_priority.get(priority),
+            classification_stage=stage,
+            classification_provisional=False,
+        )
+    return list(zip(tickets, results))
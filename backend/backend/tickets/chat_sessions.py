@@ -0,0 +1,244 @@
+# tickets/chat_sessions.py - SERVER-SIDE CHATBOT CONVERSATIONS WITH ROLLING SUMMARIES
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from backend import metrics
+from backend.background import run_in_background
+from backend.gemini import gemini
+from knowledge.chunking import estimate_tokens
+from .models import ChatSession
+
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+ROLES = {"user": "User", "assistant": "Assistant"}
+
+SUMMARY_PROMPT = """
+        You maintain the running summary of a chat between an employee and 'SmartDesk', an IT Service Desk AI.
+        Merge the new messages into the current summary. Keep what is needed to continue the conversation:
+        the user's problem, systems/devices involved, steps already suggested or tried and their outcome,
+        and anything still open. Write at most {words} words, in plain sentences. Return ONLY the summary.
+
+        CURRENT SUMMARY:
+        {summary}
+
+        NEW MESSAGES:
+        {messages}
+        """
+
+
+class Conversation:
+    """One chat session as held in memory (see ChatSessionStore)."""
+
+    def __init__(self, session_id, summary="", turns=(), turn_count=0):
+        self.session_id = session_id
+        self.summary = summary
+        self.turns = list(turns)        # [{"role", "text"}, ...] not yet folded into the summary
+        self.turn_count = turn_count    # all messages ever
+        self.summarizing = False
+        self.dirty = False              # changed since it was last written to the DB
+        self.last_used = time.monotonic()
+
+
+class ChatSessionStore:
+    """
+    Chatbot conversations keyed by session id, so clients send only the new message.
+
+    The most recently used `max_sessions` conversations are kept in memory (LRU)
+    and served from there without a query. A conversation is written to the
+    ChatSession table by a background job only when it is evicted, and open()
+    goes to the table only on a miss, so it can continue on another worker once
+    evicted here. save() never overwrites a row another worker has moved further
+    on. Conversations still in memory when a worker restarts are lost.
+
+    The prompt gets recent messages verbatim (each clipped to `turn_tokens`)
+    plus a rolling summary of everything older (at most `summary_tokens`).
+    Once `summary_batch` messages beyond the last `recent_turns` have built up,
+    they are folded into the summary by one background Gemini call (an extract
+    of the user's questions if Gemini is unavailable). The history therefore
+    costs at most ~summary_tokens + (recent_turns + summary_batch) * turn_tokens
+    prompt tokens however long the chat runs.
+    """
+
+    def __init__(self, max_sessions=1000, recent_turns=6, summary_batch=4, summary_tokens=250,
+                 turn_tokens=150, ttl=86400, name="chat.sessions"):
+        self.max_sessions = max_sessions
+        self.recent_turns = recent_turns
+        self.summary_batch = summary_batch
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()   # session_id -> Conversation
+
+    def open(self, session_id=None):
+        """The conversation for session_id; a new one if it is missing, unknown or idle for over `ttl` seconds."""
+        if not session_id or not SESSION_ID_RE.match(session_id):
+            return self._new()
+
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is not None:
+                if time.monotonic() - conversation.last_used > self.ttl:
+                    del self._sessions[session_id]
+                    conversation = None
+                else:
+                    conversation.last_used = time.monotonic()
+                    self._sessions.move_to_end(session_id)
+        if conversation is not None:
+            metrics.incr(f"{self.name}.hit")
+            return conversation
+
+        row = ChatSession.objects.filter(
+            session_id=session_id, updated_at__gte=timezone.now() - timedelta(seconds=self.ttl)
+        ).first()
+        if row is None:
+            return self._new()
+        metrics.incr(f"{self.name}.loaded")
+        conversation = Conversation(row.session_id, row.summary, row.turns, row.turn_count)
+        with self._lock:
+            evicted = self._remember(conversation)
+        self._save_evicted(evicted)
+        return conversation
+
+    def prompt_history(self, conversation):
+        """The conversation so far for the chat prompt ("" for a new one)."""
+        with self._lock:
+            summary = conversation.summary
+            turns = conversation.turns[-(self.recent_turns + self.summary_batch):]
+        lines = [f"Summary of earlier messages: {clip(summary, self.summary_tokens)}"] if summary else []
+        lines += [f"{ROLES[turn['role']]}: {clip(turn['text'], self.turn_tokens)}" for turn in turns]
+        return "\n".join(lines)
+
+    def record(self, conversation, user_message, answer):
+        """Append one exchange and, if enough messages aged out, fold them into the summary."""
+        with self._lock:
+            conversation.turns += [{"role": "user", "text": user_message}, {"role": "assistant", "text": answer}]
+            conversation.turn_count += 2
+            conversation.dirty = True
+            conversation.last_used = time.monotonic()
+            fold = (len(conversation.turns) >= self.recent_turns + self.summary_batch
+                    and not conversation.summarizing)
+            if fold:
+                conversation.summarizing = True
+            evicted = self._remember(conversation)
+        if fold:
+            run_in_background(self.summarize, conversation, key=f"chat-session:{conversation.session_id}:summary")
+        self._save_evicted(evicted)
+
+    def summarize(self, conversation):
+        """Fold the messages before the recent window into the rolling summary."""
+        with self._lock:
+            summary = conversation.summary
+            folded = conversation.turns[:-self.recent_turns]
+        try:
+            if folded:
+                summary = self._summarize(summary, folded)
+                metrics.incr(f"{self.name}.summarized")
+                with self._lock:
+                    conversation.summary = summary
+                    # Only summarize() removes turns, and record() only appends, so this is what was folded
+                    conversation.turns = conversation.turns[len(folded):]
+                    conversation.dirty = True
+        finally:
+            with self._lock:
+                conversation.summarizing = False
+                evicted = self._sessions.get(conversation.session_id) is not conversation
+        if evicted:
+            self.save(conversation)   # evicted mid-call, so its eviction save missed the new summary
+
+    def save(self, conversation):
+        """Write the conversation to the DB unless a newer version (from another worker) is already there."""
+        with self._lock:
+            values = {"summary": conversation.summary, "turns": list(conversation.turns),
+                      "turn_count": conversation.turn_count}
+            conversation.dirty = False
+        updated = ChatSession.objects.filter(
+            session_id=conversation.session_id, turn_count__lte=values["turn_count"]
+        ).update(updated_at=timezone.now(), **values)
+        if not updated:
+            ChatSession.objects.get_or_create(session_id=conversation.session_id, defaults=values)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    # ----- internals -----
+
+    def _new(self):
+        metrics.incr(f"{self.name}.new")
+        conversation = Conversation(uuid.uuid4().hex)
+        with self._lock:
+            evicted = self._remember(conversation)
+        self._save_evicted(evicted)
+        return conversation
+
+    def _remember(self, conversation):
+        """Make conversation the most recently used; returns the conversations evicted for it."""
+        # Caller holds the lock
+        self._sessions[conversation.session_id] = conversation
+        self._sessions.move_to_end(conversation.session_id)
+        evicted = []
+        while len(self._sessions) > self.max_sessions:
+            evicted.append(self._sessions.popitem(last=False)[1])
+        return evicted
+
+    def _save_evicted(self, evicted):
+        for conversation in evicted:
+            if conversation.dirty:
+                metrics.incr(f"{self.name}.evicted")
+                run_in_background(self.save, conversation, key=f"chat-session:{conversation.session_id}")
+
+    def _summarize(self, summary, turns):
+        messages = "\n".join(f"{ROLES[turn['role']]}: {clip(turn['text'], self.turn_tokens)}" for turn in turns)
+        if gemini.available:
+            try:
+                response = gemini.generate_content(
+                    SUMMARY_PROMPT.format(words=self.summary_tokens * 3 // 4, summary=summary or "(none)",
+                                          messages=messages),
+                    operation="chat_summary",
+                )
+                text = " ".join(response.text.split())
+                if text:
+                    return clip(text, self.summary_tokens)
+            except Exception as e:
+                print(f"⚠️ Chat summary failed, keeping an extract instead: {e}")
+        # No LLM: keep the user's questions, dropping the oldest once over budget
+        extract = " ".join([summary] + [f"User asked: {clip(turn['text'], 40)}" for turn in turns
+                                        if turn["role"] == "user"])
+        return clip(extract.strip(), self.summary_tokens, keep_end=True)
+
+
+def clip(text, max_tokens, keep_end=False):
+    """Cut text to ~max_tokens estimated tokens on a word boundary, keeping its start (or end)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max_tokens * 4 - 3
+    if keep_end:
+        return "..." + text[-limit:].split(" ", 1)[-1]
+    return text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def build_chat_sessions():
+    store = ChatSessionStore(
+        max_sessions=getattr(settings, "CHAT_SESSION_CACHE_SIZE", 1000),
+        recent_turns=getattr(settings, "CHAT_SESSION_RECENT_TURNS", 6),
+        summary_batch=getattr(settings, "CHAT_SESSION_SUMMARY_BATCH", 4),
+        summary_tokens=getattr(settings, "CHAT_SESSION_SUMMARY_TOKENS", 250),
+        turn_tokens=getattr(settings, "CHAT_SESSION_TURN_TOKENS", 150),
+        ttl=getattr(settings, "CHAT_SESSION_TTL", 86400),
+    )
+    metrics.register_gauge("chat.sessions.size", store.__len__)
+    return store
+
+
+chat_sessions = build_chat_sessions()
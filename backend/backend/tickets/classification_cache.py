@@ -0,0 +1,70 @@
+# tickets/classification_cache.py - REUSE LLM CLASSIFICATIONS OF IDENTICAL TICKETS
+import hashlib
+import threading
+
+from django.conf import settings
+
+from backend import metrics
+from backend.cache import DjangoCacheBackend, LocalLRUCache, normalize_words
+
+
+class ClassificationCache:
+    """
+    Caches LLM classifications keyed on a hash of the classifier version and the
+    normalized subject + description (case, spacing and punctuation ignored), so
+    repeated tickets ("password reset", duplicates filed twice) skip Gemini. The version (see
+    ai_classifier.classifier_version) is part of the key: changing the prompt,
+    CLASSIFIER_VERSION or the resolved model makes older entries unreachable,
+    and they age out through the TTL / LRU bound.
+    """
+
+    def __init__(self, backend, name="classify.cache"):
+        self.backend = backend
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(subject, description, version):
+        text = f"{version}\0{normalize_words(subject)}\0{normalize_words(description)}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, subject, description, version):
+        """A copy of the cached classification, or None."""
+        cached = self.backend.get(self.make_key(subject, description, version))
+        with self._lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.incr(f"{self.name}.{'miss' if cached is None else 'hit'}")
+        return dict(cached) if cached is not None else None
+
+    def set(self, subject, description, version, result):
+        value = {k: result[k] for k in ("queue", "priority", "reasoning") if k in result}
+        self.backend.set(self.make_key(subject, description, version), value)
+
+    def hit_rate(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return round(self.hits / total, 4) if total else None
+
+    def clear(self):
+        self.backend.clear()
+
+
+def build_classification_cache():
+    ttl = getattr(settings, "TICKET_CLASSIFY_CACHE_TTL", 604800)
+    if getattr(settings, "TICKET_CLASSIFY_CACHE_BACKEND", "local") == "django":
+        backend = DjangoCacheBackend(getattr(settings, "TICKET_CLASSIFY_CACHE_ALIAS", "default"), ttl,
+                                     prefix="classify:")
+    else:
+        backend = LocalLRUCache(getattr(settings, "TICKET_CLASSIFY_CACHE_SIZE", 10000), ttl)
+        metrics.register_gauge("classify.cache.size", backend.__len__)
+    cache = ClassificationCache(backend)
+    metrics.register_gauge("classify.cache.hit_rate", cache.hit_rate)
+    return cache
+
+
+classification_cache = build_classification_cache()
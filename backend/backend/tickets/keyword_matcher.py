@@ -0,0 +1,90 @@
+# tickets/keyword_matcher.py - SINGLE-PASS KEYWORD MATCHING FOR THE RULE-BASED CLASSIFIER
+import re
+
+# Endings accepted after a keyword ("crash" also matches "crashes", "crashed", "crashing").
+# Every form is the keyword plus a suffix, so anything matched here contained the keyword.
+SUFFIXES = ("s", "es", "d", "ed", "ing", "er", "ers")
+
+# "jam" -> "jammed", "jamming"
+_DOUBLING = re.compile(r"[^aeiou][aeiou][bdgklmnprt]$")
+_SEPARATOR = re.compile(r"\W+")
+
+
+def word_forms(keyword):
+    """The surface forms a keyword matches: itself and its inflected last word."""
+    forms = {keyword}
+    forms.update(keyword + suffix for suffix in SUFFIXES)
+    if _DOUBLING.search(keyword):
+        forms.update((keyword + keyword[-1] + "ed", keyword + keyword[-1] + "ing"))
+    return forms
+
+
+def _trie_pattern(words):
+    """
+    A regex matching any of `words`, factored into a trie so each position
+    costs one branch per character instead of one attempt per word. Spaces
+    in phrases match any run of non-word characters.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [
+            (r"\W+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Greedy optional tail: the longest form wins, shorter ones are implied below.
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    Finds which of a fixed set of keywords and phrases occur in a text, in
+    one regex pass.
+
+    Keywords match whole words only, so "ac" no longer fires inside
+    "access" or "hr" inside "three", while plural/past/-ing forms still
+    count. At each word start the compiled trie takes the longest form;
+    keywords that are word-prefixes of it ("meeting" in "meeting room") are
+    precomputed, so overlapping keywords are all reported as a plain
+    substring scan would.
+    """
+
+    def __init__(self, keywords):
+        keywords = {" ".join(k.lower().split()) for k in keywords}
+        form_to_keywords = {}
+        for keyword in keywords:
+            for form in word_forms(keyword):
+                form_to_keywords.setdefault(form, set()).add(keyword)
+
+        self._implied = {}
+        for form in form_to_keywords:
+            words = form.split(" ")
+            found = set()
+            for end in range(1, len(words) + 1):
+                found |= form_to_keywords.get(" ".join(words[:end]), set())
+            self._implied[form] = frozenset(found)
+
+        self.keywords = frozenset(keywords)
+        self._pattern = re.compile(r"\b(?=(" + _trie_pattern(form_to_keywords) + r")\b)")
+
+    def find(self, text):
+        """Set of keywords present in `text`."""
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            form = match.group(1)
+            implied = self._implied.get(form)
+            if implied is None:
+                # A phrase matched across punctuation or repeated whitespace.
+                implied = self._implied[_SEPARATOR.sub(" ", form)]
+            found |= implied
+        return found
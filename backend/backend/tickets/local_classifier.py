@@ -0,0 +1,244 @@
+# tickets/local_classifier.py - LOCAL HASHED TF-IDF + LINEAR TICKET CLASSIFIER (NUMPY ONLY)
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+TOKEN_RE = re.compile(r"\w+")
+QUEUE_CLASSES = (1, 2, 3, 4)
+PRIORITY_CLASSES = (1, 2, 3)
+QUEUE_LABELS = {1: "HR", 2: "IT", 3: "Facilities", 4: "Other"}
+
+
+class HashingTfidfVectorizer:
+    """
+    Word unigrams + bigrams hashed (crc32, stable across processes) into
+    `n_features` buckets, weighted by sublinear tf * idf and L2-normalised.
+    Documents are returned as sparse (indices, values) pairs; there is no
+    vocabulary to store, only the idf vector.
+    """
+
+    def __init__(self, n_features=2 ** 18, idf=None):
+        self.n_features = n_features
+        self.idf = idf
+
+    def features(self, text):
+        tokens = TOKEN_RE.findall((text or "").lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return [zlib.crc32(g.encode("utf-8")) % self.n_features for g in grams]
+
+    def _counts(self, text):
+        indices, counts = np.unique(np.asarray(self.features(text), dtype=np.int64), return_counts=True)
+        return indices, counts
+
+    def fit(self, texts):
+        df = np.zeros(self.n_features, dtype=np.float64)
+        for text in texts:
+            indices, _ = self._counts(text)
+            df[indices] += 1
+        n = len(texts)
+        self.idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        return self
+
+    def transform_one(self, text):
+        indices, counts = self._counts(text)
+        values = (1 + np.log(counts)).astype(np.float32) * self.idf[indices]
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            values /= norm
+        return indices, values
+
+    def transform(self, texts):
+        """CSR arrays (indptr, indices, values) for many documents."""
+        indptr, all_indices, all_values = [0], [], []
+        for text in texts:
+            indices, values = self.transform_one(text)
+            all_indices.append(indices)
+            all_values.append(values)
+            indptr.append(indptr[-1] + len(indices))
+        return (
+            np.asarray(indptr, dtype=np.int64),
+            np.concatenate(all_indices) if all_indices else np.empty(0, dtype=np.int64),
+            np.concatenate(all_values) if all_values else np.empty(0, dtype=np.float32),
+        )
+
+
+class SoftmaxClassifier:
+    """Multinomial logistic regression over sparse rows, trained with mini-batch AdaGrad."""
+
+    def __init__(self, classes, weights=None, bias=None):
+        self.classes = np.asarray(classes, dtype=np.int64)
+        self.weights = weights   # (n_features, n_classes) float32
+        self.bias = bias         # (n_classes,) float32
+
+    def _logits(self, indptr, indices, values):
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        logits = np.zeros((len(indptr) - 1, len(self.classes)), dtype=np.float32)
+        np.add.at(logits, rows, values[:, None] * self.weights[indices])
+        return logits + self.bias, rows
+
+    def fit(self, X, y, n_features, epochs=30, batch_size=256, learning_rate=0.5, l2=1e-6, seed=0):
+        indptr, indices, values = X
+        n = len(indptr) - 1
+        targets = np.searchsorted(self.classes, np.asarray(y))
+        self.weights = np.zeros((n_features, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+        grad_sq_w = np.full_like(self.weights, 1e-8)
+        grad_sq_b = np.full_like(self.bias, 1e-8)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(n)
+            for start in range(0, n, batch_size):
+                batch = order[start:start + batch_size]
+                b_indptr, b_indices, b_values = _take_rows(indptr, indices, values, batch)
+                logits, rows = self._logits(b_indptr, b_indices, b_values)
+                probs = _softmax(logits)
+                probs[np.arange(len(batch)), targets[batch]] -= 1
+                probs /= len(batch)
+
+                touched, inverse = np.unique(b_indices, return_inverse=True)
+                grad_w = np.zeros((len(touched), len(self.classes)), dtype=np.float32)
+                np.add.at(grad_w, inverse, b_values[:, None] * probs[rows])
+                grad_w += l2 * self.weights[touched]
+                grad_b = probs.sum(axis=0)
+
+                grad_sq_w[touched] += grad_w ** 2
+                grad_sq_b += grad_b ** 2
+                self.weights[touched] -= learning_rate * grad_w / np.sqrt(grad_sq_w[touched])
+                self.bias -= learning_rate * grad_b / np.sqrt(grad_sq_b)
+        return self
+
+    def predict_proba_one(self, indices, values):
+        logits = values @ self.weights[indices] + self.bias
+        return _softmax(logits[None, :])[0]
+
+    def predict_proba(self, X):
+        logits, _ = self._logits(*X)
+        return _softmax(logits)
+
+
+class LocalTicketClassifier:
+    """Queue and priority heads over one shared vectorizer."""
+
+    def __init__(self, vectorizer, queue_model, priority_model, meta=None):
+        self.vectorizer = vectorizer
+        self.queue_model = queue_model
+        self.priority_model = priority_model
+        self.meta = meta or {}
+
+    @staticmethod
+    def text(subject, description):
+        # Subject words count twice: it is usually the best summary of the issue
+        return f"{subject} {subject} {description}"
+
+    @classmethod
+    def train(cls, tickets, n_features=2 ** 18, **fit_options):
+        """Fit on [(subject, description, queue, priority_id), ...]."""
+        texts = [cls.text(s, d) for s, d, _, _ in tickets]
+        vectorizer = HashingTfidfVectorizer(n_features).fit(texts)
+        X = vectorizer.transform(texts)
+        queue_model = SoftmaxClassifier(QUEUE_CLASSES).fit(X, [t[2] for t in tickets], n_features, **fit_options)
+        priority_model = SoftmaxClassifier(PRIORITY_CLASSES).fit(X, [t[3] for t in tickets], n_features, **fit_options)
+        return cls(vectorizer, queue_model, priority_model, {"trained_on": len(tickets), "n_features": n_features})
+
+    def predict(self, subject, description):
+        """
+        {"queue", "priority", "confidence", "reasoning"}; confidence is the lower
+        of the two heads' top-class probabilities.
+        """
+        indices, values = self.vectorizer.transform_one(self.text(subject, description))
+        queue_probs = self.queue_model.predict_proba_one(indices, values)
+        priority_probs = self.priority_model.predict_proba_one(indices, values)
+        queue = int(self.queue_model.classes[queue_probs.argmax()])
+        priority = int(self.priority_model.classes[priority_probs.argmax()])
+        queue_conf, priority_conf = float(queue_probs.max()), float(priority_probs.max())
+        return {
+            "queue": queue,
+            "priority": priority,
+            "confidence": round(min(queue_conf, priority_conf), 4),
+            "reasoning": f"{QUEUE_LABELS[queue]} - local model (queue {queue_conf:.2f}, priority {priority_conf:.2f})",
+        }
+
+    # ----- persistence -----
+
+    def save(self, path):
+        """Write the model as one .npz file (no pickle), replacing any previous one atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            idf=self.vectorizer.idf,
+            queue_weights=self.queue_model.weights, queue_bias=self.queue_model.bias,
+            queue_classes=self.queue_model.classes,
+            priority_weights=self.priority_model.weights, priority_bias=self.priority_model.bias,
+            priority_classes=self.priority_model.classes,
+            meta=np.frombuffer(json.dumps(self.meta).encode("utf-8"), dtype=np.uint8),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            idf = data["idf"]
+            return cls(
+                HashingTfidfVectorizer(len(idf), idf),
+                SoftmaxClassifier(data["queue_classes"], data["queue_weights"], data["queue_bias"]),
+                SoftmaxClassifier(data["priority_classes"], data["priority_weights"], data["priority_bias"]),
+                json.loads(data["meta"].tobytes().decode("utf-8")),
+            )
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _take_rows(indptr, indices, values, rows):
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    picks = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)]) if len(rows) else np.empty(0, np.int64)
+    return np.concatenate([[0], np.cumsum(lengths)]), indices[picks], values[picks]
+
+
+# ----- process-wide model -----
+
+_loaded = {"model": None, "mtime": None}
+_load_lock = threading.Lock()
+
+
+def get_local_classifier():
+    """
+    The model at TICKET_LOCAL_MODEL_PATH, reloaded when the file changes
+    (e.g. after `manage.py train_ticket_classifier`), or None if there is none.
+    """
+    path = getattr(settings, "TICKET_LOCAL_MODEL_PATH", None)
+    try:
+        mtime = os.path.getmtime(path) if path else None
+    except OSError:
+        mtime = None
+    if mtime is None:
+        return None
+    if mtime != _loaded["mtime"]:
+        with _load_lock:
+            if mtime != _loaded["mtime"]:
+                try:
+                    _loaded["model"] = LocalTicketClassifier.load(path)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ Could not load local ticket classifier from {path}: {e}")
+                    _loaded["model"] = None
+                _loaded["mtime"] = mtime
+    return _loaded["model"]
+
+
+def classify_ticket_local(subject, description):
+    """Local model prediction (see LocalTicketClassifier.predict), or None if no model is trained."""
+    model = get_local_classifier()
+    if model is None:
+        return None
+    return model.predict(subject, description)
@@ -0,0 +1,157 @@
+import json
+import platform
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import benchmark
+from tickets.ai_classifier import classify_ticket, classify_ticket_llm, classify_ticket_rule_based
+from tickets.local_classifier import get_local_classifier
+from tickets.models import Ticket
+
+TIERS = ("rules", "local", "llm", "llm_bulk", "pipeline")
+# Metrics where a decrease is a regression (latencies are compared the other way round)
+HIGHER_IS_BETTER = ("queue_accuracy", "priority_accuracy", "throughput_per_second")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the ticket classifiers on a labeled corpus of synthetic (and optionally "
+        "anonymized real) tickets: per-tier accuracy, queue/priority confusion matrices, "
+        "throughput and p50/p99 latency, as JSON. The LLM is replaced by a local stand-in "
+        "or by responses recorded from Gemini with --record."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=5000, help="Synthetic tickets in the corpus")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--include-db", type=int, default=0,
+                            help="Also add up to N anonymized, finally-classified tickets from the database")
+        parser.add_argument("--tiers", default=",".join(TIERS), help=f"Comma-separated subset of {TIERS}")
+        parser.add_argument("--llm-latency-ms", type=float, default=0,
+                            help="Simulated Gemini latency of the local stand-in")
+        parser.add_argument("--llm-error-rate", type=float, default=0.0,
+                            help="Share of stand-in answers with a wrong queue")
+        parser.add_argument("--llm-failure-rate", type=float, default=0.0,
+                            help="Share of stand-in calls that raise")
+        parser.add_argument("--llm-limit", type=int, default=None,
+                            help="Only send the first N tickets through the LLM tiers")
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument("--record", metavar="PATH", help="Call the real Gemini API and record responses")
+        group.add_argument("--replay", metavar="PATH", help="Answer LLM prompts from a recording")
+        parser.add_argument("--label", default="", help="Free-form tag stored with the results (e.g. a release)")
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+        parser.add_argument("--baseline", help="Earlier results file; fail if this run regresses against it")
+        parser.add_argument("--tolerance", type=float, default=0.02,
+                            help="Allowed relative regression per metric when comparing with --baseline")
+
+    def handle(self, *args, **options):
+        tiers = [t.strip() for t in options["tiers"].split(",") if t.strip()]
+        unknown = set(tiers) - set(TIERS)
+        if unknown:
+            raise CommandError(f"Unknown tiers: {', '.join(sorted(unknown))}")
+
+        tickets = benchmark.synthetic_tickets(options["size"], options["seed"])
+        if options["include_db"]:
+            rows = (
+                Ticket.objects.filter(classification_provisional=False, priority_id__isnull=False)
+                .order_by("-id")
+                .values_list("subject", "description", "queue", "priority_id")[:options["include_db"]]
+            )
+            tickets += [(benchmark.anonymize(s), benchmark.anonymize(d), q, p) for s, d, q, p in rows]
+        llm_tickets = tickets[:options["llm_limit"]] if options["llm_limit"] else tickets
+
+        if options["record"]:
+            answer = benchmark.RecordingClient(options["record"])
+        elif options["replay"]:
+            answer = benchmark.ReplayStandIn(options["replay"])
+        else:
+            answer = benchmark.OracleStandIn(
+                tickets,
+                latency_ms=options["llm_latency_ms"],
+                error_rate=options["llm_error_rate"],
+                failure_rate=options["llm_failure_rate"],
+                seed=options["seed"],
+            )
+
+        results = {
+            "label": options["label"],
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "corpus": {
+                "version": benchmark.CORPUS_VERSION,
+                "size": len(tickets),
+                "synthetic": options["size"],
+                "seed": options["seed"],
+                "digest": benchmark.corpus_digest(tickets),
+            },
+            "llm": {"mode": type(answer).__name__, "latency_ms": options["llm_latency_ms"],
+                    "error_rate": options["llm_error_rate"], "failure_rate": options["llm_failure_rate"],
+                    "tickets": len(llm_tickets)},
+            "tiers": {},
+        }
+        for tier in tiers:
+            self.stderr.write(f"🔄 {tier}...")
+            summary = self.run_tier(tier, tickets, llm_tickets, answer)
+            if summary is not None:
+                results["tiers"][tier] = summary
+        if isinstance(answer, benchmark.ReplayStandIn):
+            results["llm"]["missing_recordings"] = answer.missing
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+            self.stderr.write(f"✅ Results written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as f:
+                regressions = compare(json.load(f), results, options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+            self.stderr.write("✅ No regressions against baseline")
+
+    def run_tier(self, tier, tickets, llm_tickets, answer):
+        if tier == "rules":
+            return benchmark.evaluate(classify_ticket_rule_based, tickets)[0]
+        if tier == "local":
+            model = get_local_classifier()
+            if model is None:
+                self.stderr.write("⚠️ No local model trained (manage.py train_ticket_classifier); skipping")
+                return None
+            return benchmark.evaluate(model.predict, tickets)[0]
+        with benchmark.llm_stand_in(answer) as cache:
+            if tier == "llm":
+                summary = benchmark.evaluate(classify_ticket_llm, llm_tickets)[0]
+            elif tier == "llm_bulk":
+                # The API quota only applies to real calls; a stand-in would just measure the limiter
+                rpm = None if isinstance(answer, benchmark.RecordingClient) else 10 ** 9
+                summary = benchmark.evaluate_bulk(llm_tickets, requests_per_minute=rpm)[0]
+            else:
+                # What a new ticket actually gets: local model if confident, else LLM, else fallback
+                summary = benchmark.evaluate(classify_ticket, llm_tickets)[0]
+            summary["cache_hit_rate"] = cache.hit_rate()
+        return summary
+
+
+def compare(baseline, current, tolerance):
+    """Human-readable list of metrics that got worse than `baseline` by more than `tolerance`."""
+    if baseline.get("corpus", {}).get("digest") != current["corpus"]["digest"]:
+        return ["corpus differs from the baseline's; rerun the baseline with the same --size/--seed"]
+    regressions = []
+    for tier, summary in current["tiers"].items():
+        before = baseline.get("tiers", {}).get(tier)
+        if not before:
+            continue
+        for metric in HIGHER_IS_BETTER + ("p50_ms", "p99_ms"):
+            old, new = before.get(metric), summary.get(metric)
+            if old is None or new is None:
+                continue
+            worse = new < old * (1 - tolerance) if metric in HIGHER_IS_BETTER else new > old * (1 + tolerance)
+            if worse:
+                regressions.append(f"{tier}.{metric}: {old} -> {new}")
+    return regressions
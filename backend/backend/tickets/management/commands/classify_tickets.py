@@ -0,0 +1,73 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from tickets.bulk_classifier import reclassify_tickets
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = (
+        "Classify tickets with batched Gemini prompts, skipping tickets the local model is "
+        "confident about and falling back to the local model / rule-based classifier per ticket. By default only tickets without a final LLM or agent "
+        "classification are processed; agent classifications are never overwritten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="Re-classify every ticket not classified by an agent")
+        parser.add_argument("--open", action="store_true", help="Only open tickets")
+        parser.add_argument("--batch-size", type=int, default=settings.TICKET_CLASSIFY_BATCH_SIZE,
+                            help="Tickets per Gemini prompt")
+        parser.add_argument("--workers", type=int, default=settings.TICKET_CLASSIFY_WORKERS,
+                            help="Concurrent Gemini requests")
+        parser.add_argument("--rpm", type=int, default=settings.TICKET_CLASSIFY_REQUESTS_PER_MINUTE,
+                            help="Gemini requests per minute allowed by the API quota")
+        parser.add_argument("--chunk", type=int, default=500, help="Tickets loaded and saved per round")
+
+    def handle(self, *args, **options):
+        tickets = Ticket.objects.exclude(classification_stage=Ticket.CLASSIFIED_BY_AGENT)
+        if not options["all"]:
+            tickets = tickets.filter(
+                Q(classification_stage__isnull=True)
+                | Q(classification_stage=Ticket.CLASSIFIED_BY_RULES)
+                | Q(classification_provisional=True)
+            )
+        if options["open"]:
+            tickets = tickets.filter(status=Ticket.STATUS_OPEN)
+        ids = list(tickets.order_by("id").values_list("id", flat=True))
+        if not ids:
+            self.stdout.write(self.style.SUCCESS("✅ No tickets to classify."))
+            return
+
+        self.stdout.write(
+            f"🔄 {len(ids)} tickets to classify ({options['batch_size']} per prompt, "
+            f"{options['workers']} workers, {options['rpm']} req/min)"
+        )
+        sources, changed = Counter(), 0
+        started = time.monotonic()
+        for start in range(0, len(ids), options["chunk"]):
+            chunk = list(
+                Ticket.objects.filter(pk__in=ids[start:start + options["chunk"]])
+                .only("id", "subject", "description", "queue", "priority_id", "classification_stage")
+            )
+            for ticket, result in reclassify_tickets(
+                chunk,
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                requests_per_minute=options["rpm"],
+            ):
+                sources[result["source"]] += 1
+                changed += (ticket.queue, ticket.priority_id) != (result["queue"], result["priority"])
+            done = min(start + options["chunk"], len(ids))
+            rate = done / max(time.monotonic() - started, 1e-9) * 60
+            self.stdout.write(f"   {done}/{len(ids)} tickets | {rate:.1f} tickets/min")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Done! {sources['llm']} classified by Gemini, {sources['local']} by the local model, "
+            f"{sources['rules']} by rules fallback, "
+            f"{changed} changed queue or priority."
+        ))
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.gemini import GeminiClientManager, breaker, gemini
+from tickets import views
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test: fire N concurrent /api/chat/ requests at the ASGI application (in-process) "
+        "against a local slow-LLM stand-in, and compare /api/tickets/ latency with and "
+        "without the chats in flight. Reports p50/p99 ticket latency, chat outcomes "
+        "(answered / busy) and chat latency, as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chats", type=int, default=200, help="Concurrent chat requests")
+        parser.add_argument("--llm-latency-ms", type=float, default=3000,
+                            help="How long the stand-in LLM takes to answer each chat")
+        parser.add_argument("--ticket-requests", type=int, default=50,
+                            help="Sequential /api/tickets/ requests per phase")
+        parser.add_argument("--user", help="Username for the ticket requests (default: first active user)")
+        parser.add_argument("--max-latency-ratio", type=float, default=None,
+                            help="Fail if ticket p99 under load exceeds the baseline p99 by this factor")
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=options["user"]).first() if options["user"] else users.order_by("pk").first()
+        if user is None:
+            raise CommandError("No such active user; pass --user with an existing username")
+
+        client = ASGIClient(get_asgi_application())
+        token = str(AccessToken.for_user(user))
+        with slow_llm_stand_in(options["llm_latency_ms"] / 1000) as llm:
+            results = asyncio.run(self.run(client, token, llm, options))
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+            self.stderr.write(f"✅ Results written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if not results["chats_in_flight_throughout"]:
+            self.stderr.write("⚠️ Chats finished before the ticket requests did; raise --llm-latency-ms")
+        ratio = options["max_latency_ratio"]
+        if ratio and results["tickets_under_load"]["p99_ms"] > results["tickets_baseline"]["p99_ms"] * ratio:
+            raise CommandError(f"Ticket p99 latency under chat load is more than {ratio}x the baseline")
+
+    async def run(self, client, token, llm, options):
+        auth = [(b"authorization", f"Bearer {token}".encode())]
+
+        async def ticket_latencies():
+            latencies = []
+            for _ in range(options["ticket_requests"]):
+                started = time.perf_counter()
+                status, _ = await client.request("GET", "/api/tickets/", headers=auth)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    raise CommandError(f"/api/tickets/ returned {status}")
+            return latencies
+
+        async def chat(i):
+            body = json.dumps({"message": f"My laptop won't connect to the VPN (load test {i})"}).encode()
+            started = time.perf_counter()
+            status, _ = await client.request("POST", "/api/chat/", body=body,
+                                             headers=[(b"content-type", b"application/json")])
+            return status, (time.perf_counter() - started) * 1000
+
+        await ticket_latencies()  # warm up (DB connection, URL resolver, JWT)
+        baseline = await ticket_latencies()
+
+        self.stderr.write(f"🔄 {options['chats']} chats in flight...")
+        chats = [asyncio.create_task(chat(i)) for i in range(options["chats"])]
+        # Let the admitted chats get through retrieval to the (slow) LLM call
+        target = min(options["chats"], views.chat_limiter.limit)
+        deadline = time.monotonic() + 10
+        while llm.waiting < target and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        waiting_on_llm = llm.waiting
+        under_load = await ticket_latencies()
+        in_flight_throughout = llm.waiting == waiting_on_llm
+        outcomes = await asyncio.gather(*chats)
+
+        statuses = {}
+        for status, _ in outcomes:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        answered = [ms for status, ms in outcomes if status == 200]
+        busy = [ms for status, ms in outcomes if status == 503]
+        return {
+            "chats": options["chats"],
+            "llm_latency_ms": options["llm_latency_ms"],
+            "chat_max_concurrency": views.chat_limiter.limit,
+            "chats_waiting_on_llm": waiting_on_llm,
+            "chats_in_flight_throughout": in_flight_throughout,
+            "chat_statuses": statuses,
+            "chat_answered": latency_summary(answered),
+            "chat_busy": latency_summary(busy),
+            "tickets_baseline": latency_summary(baseline),
+            "tickets_under_load": latency_summary(under_load),
+        }
+
+
+def latency_summary(latencies_ms):
+    if not latencies_ms:
+        return {"n": 0}
+    return {
+        "n": len(latencies_ms),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2),
+    }
+
+
+@contextmanager
+def slow_llm_stand_in(latency):
+    """
+    Make Gemini look configured and answer every chat after `latency` seconds
+    without calling the API; yields a state whose `waiting` counts chats waiting on it. Query embedding is switched off, so each chat misses
+    the answer cache and does keyword retrieval against the real database. Chat throttling is
+    switched off too, as every load test chat comes from the same client.
+    """
+    llm = SimpleNamespace(waiting=0)
+
+    async def generate_content_async(prompt, operation="generate", timeout=None, **kwargs):
+        llm.waiting += 1
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            llm.waiting -= 1
+        return SimpleNamespace(text="Try reconnecting to the VPN after restarting the client.")
+
+    patches = [
+        mock.patch.object(GeminiClientManager, "available", new_callable=mock.PropertyMock, return_value=True),
+        mock.patch.object(gemini, "generate_content_async", generate_content_async),
+        mock.patch("knowledge.utils.generate_query_embedding", lambda text: None),
+        mock.patch.object(views.ChatThrottle, "allow_request", lambda self, request, view: True),
+    ]
+    for patch in patches:
+        patch.start()
+    breaker.reset()
+    try:
+        yield llm
+    finally:
+        for patch in reversed(patches):
+            patch.stop()
+        breaker.reset()
+
+
+class ASGIClient:
+    """Minimal in-process HTTP client for an ASGI application (no server or sockets involved)."""
+
+    def __init__(self, app):
+        self.app = app
+        hosts = [h.lstrip(".") for h in settings.ALLOWED_HOSTS if "*" not in h]
+        self.host = (hosts[0] if hosts else "localhost").encode()
+
+    async def request(self, method, path, body=b"", headers=()):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "",
+            "headers": [(b"host", self.host), *headers],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # the client never disconnects
+
+        response = {"status": None, "body": []}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return response["status"], b"".join(response["body"])
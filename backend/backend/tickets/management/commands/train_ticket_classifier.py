@@ -0,0 +1,127 @@
+import json
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.gemini import gemini
+from tickets.ai_classifier import classify_ticket_llm, classify_ticket_rule_based
+from tickets.local_classifier import LocalTicketClassifier
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = (
+        "Train the local hashed TF-IDF + linear ticket classifier on labelled tickets and save it "
+        "to TICKET_LOCAL_MODEL_PATH. By default it learns from agent-corrected and LLM-confirmed "
+        "labels only. A held-out split is used to compare accuracy and latency of "
+        "the local model, the rule-based classifier and (with --llm-sample) Gemini."
+    )
+
+    def add_arguments(self, parser):
+        labels = parser.add_mutually_exclusive_group()
+        labels.add_argument("--agent-only", action="store_true",
+                            help="Only learn from tickets an agent classified by hand")
+        labels.add_argument("--include-first-pass", action="store_true",
+                            help="Also learn from labels set by the keyword rules or the local model itself")
+        parser.add_argument("--test-fraction", type=float, default=0.2,
+                            help="Share of tickets held out for the comparison report (0 to skip)")
+        parser.add_argument("--features", type=int, default=18, help="Hash space size as a power of two")
+        parser.add_argument("--epochs", type=int, default=20)
+        parser.add_argument("--learning-rate", type=float, default=0.5)
+        parser.add_argument("--min-tickets", type=int, default=50)
+        parser.add_argument("--llm-sample", type=int, default=0,
+                            help="Also classify this many held-out tickets with Gemini for the report")
+        parser.add_argument("--output", default=settings.TICKET_LOCAL_MODEL_PATH)
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        # Provisional labels are a first guess still waiting for the LLM, not ground truth
+        tickets = Ticket.objects.filter(classification_provisional=False, priority_id__isnull=False)
+        if options["agent_only"]:
+            tickets = tickets.filter(classification_stage=Ticket.CLASSIFIED_BY_AGENT)
+        elif not options["include_first_pass"]:
+            # Rules/local labels would teach the model its own (or the keyword rules') mistakes
+            # and make the held-out comparison flatter them
+            tickets = tickets.filter(classification_stage__in=[Ticket.CLASSIFIED_BY_AGENT, Ticket.CLASSIFIED_BY_LLM])
+        rows = list(tickets.values_list("subject", "description", "queue", "priority_id"))
+        if len(rows) < options["min_tickets"]:
+            raise CommandError(f"Only {len(rows)} labelled tickets; need at least {options['min_tickets']}.")
+
+        random.Random(0).shuffle(rows)
+        n_test = int(len(rows) * options["test_fraction"])
+        train, test = rows[n_test:], rows[:n_test]
+        fit_options = {"n_features": 2 ** options["features"], "epochs": options["epochs"],
+                       "learning_rate": options["learning_rate"]}
+
+        report = {"tickets": len(rows), "train": len(train), "test": len(test)}
+        if test:
+            started = time.perf_counter()
+            model = LocalTicketClassifier.train(train, **fit_options)
+            report["train_seconds"] = round(time.perf_counter() - started, 2)
+            report["tiers"] = self.compare(model, test, options["llm_sample"])
+
+        # The saved model learns from every labelled ticket, held-out ones included
+        started = time.perf_counter()
+        model = LocalTicketClassifier.train(rows, **fit_options)
+        model.save(options["output"])
+        report["final_train_seconds"] = round(time.perf_counter() - started, 2)
+        report["output"] = options["output"]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"📊 {report['train']} training / {report['test']} held-out tickets")
+        for name, tier in report.get("tiers", {}).items():
+            line = (f"   {name:<6} n={tier['n']:<5} queue {tier['queue_accuracy']:.1%}  "
+                    f"priority {tier['priority_accuracy']:.1%}  "
+                    f"p50 {tier['p50_ms']:.3f} ms  p99 {tier['p99_ms']:.3f} ms")
+            if "escalation_rate" in tier:
+                line += (f"  | {tier['escalation_rate']:.1%} below confidence "
+                         f"{tier['confidence_threshold']}, queue {tier['confident_queue_accuracy']:.1%} above it")
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Saved model trained on {report['tickets']} tickets to {report['output']}"
+        ))
+
+    def compare(self, model, test, llm_sample):
+        """Accuracy and per-ticket latency of each classification tier on held-out tickets."""
+        threshold = settings.TICKET_LOCAL_MODEL_CONFIDENCE
+        tiers = {
+            "local": _evaluate(model.predict, test),
+            "rules": _evaluate(classify_ticket_rule_based, test),
+        }
+        confident = [p for p in tiers["local"].pop("predictions") if p[0]["confidence"] >= threshold]
+        tiers["local"].update(
+            confidence_threshold=threshold,
+            escalation_rate=round(1 - len(confident) / len(test), 4),
+            confident_queue_accuracy=round(
+                sum(p["queue"] == q for p, q, _ in confident) / len(confident), 4) if confident else 0.0,
+        )
+        tiers["rules"].pop("predictions")
+        if llm_sample and gemini.available:
+            llm = _evaluate(classify_ticket_llm, test[:llm_sample])
+            llm.pop("predictions")
+            tiers["llm"] = llm
+        return tiers
+
+
+def _evaluate(classify, tickets):
+    predictions, latencies = [], []
+    for subject, description, queue, priority in tickets:
+        started = time.perf_counter()
+        result = classify(subject, description)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if result is not None:
+            predictions.append((result, queue, priority))
+    n = len(predictions)
+    return {
+        "n": n,
+        "queue_accuracy": round(sum(p["queue"] == q for p, q, _ in predictions) / n, 4) if n else 0.0,
+        "priority_accuracy": round(sum(p["priority"] == pr for p, _, pr in predictions) / n, 4) if n else 0.0,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4) if latencies else 0.0,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4) if latencies else 0.0,
+        "predictions": predictions,
+    }
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_ticket_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='classification_stage',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'rules'), (2, 'llm'), (3, 'agent')], null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='classification_provisional',
+            field=models.BooleanField(default=False),
+        ),
+    ]
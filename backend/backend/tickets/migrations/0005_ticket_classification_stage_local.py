@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_ticket_classification_stage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='classification_stage',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'rules'), (2, 'llm'), (3, 'agent'), (4, 'local')], null=True),
+        ),
+    ]
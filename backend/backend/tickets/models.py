@@ -92,6 +92,23 @@ class Comment(models.Model):
         return f"Comment by {self.user_id} on thread {self.thread_id}"
 
 
+class ChatSession(models.Model):
+    """
+    Server-side chatbot conversation (see tickets/chat_sessions.py): the most
+    recent messages verbatim plus a rolling summary of the older ones.
+    """
+    session_id = models.CharField(max_length=32, unique=True)
+    summary = models.TextField(blank=True, default="")
+    # [{"role": "user" | "assistant", "text": "..."}, ...] not yet folded into the summary
+    turns = models.JSONField(default=list, blank=True)
+    turn_count = models.PositiveIntegerField(default=0)  # all messages ever, summarized or not
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Chat session {self.session_id}"
+
+
 class Ticket(models.Model):
     """Main ticket model"""
     QUEUE_HR = 1
@@ -124,6 +141,18 @@ class Ticket(models.Model):
         (STATUS_CLOSED, "closed"),
     )
 
+    CLASSIFIED_BY_RULES = 1
+    CLASSIFIED_BY_LLM = 2
+    CLASSIFIED_BY_AGENT = 3
+    CLASSIFIED_BY_LOCAL = 4
+
+    CLASSIFICATION_STAGE_CHOICES = (
+        (CLASSIFIED_BY_RULES, "rules"),
+        (CLASSIFIED_BY_LLM, "llm"),
+        (CLASSIFIED_BY_AGENT, "agent"),
+        (CLASSIFIED_BY_LOCAL, "local"),
+    )
+
     subject = models.CharField(max_length=255)
     description = models.TextField()
     queue = models.PositiveSmallIntegerField(choices=QUEUE_CHOICES)
@@ -152,6 +181,27 @@ class Ticket(models.Model):
         blank=True,
         related_name="tickets",
     )
+    # Tickets are saved with the local model's (or rule-based) classification and,
+    # unless the local model was confident, refined by the LLM in the background;
+    # provisional stays True until that finishes.
+    classification_stage = models.PositiveSmallIntegerField(
+        choices=CLASSIFICATION_STAGE_CHOICES,
+        null=True,
+        blank=True,
+    )
+    classification_provisional = models.BooleanField(default=False)
+
+    class Meta:
+        # Keyset pagination walks (creation_time, id); the filtered variants
+        # lead with the filter column so they use the same range scan.
+        indexes = [
+            models.Index(fields=["creation_time", "id"], name="ticket_created_idx"),
+            models.Index(fields=["status", "creation_time", "id"], name="ticket_status_created_idx"),
+            models.Index(fields=["queue", "creation_time", "id"], name="ticket_queue_created_idx"),
+            models.Index(fields=["priority_id", "creation_time", "id"], name="ticket_priority_created_idx"),
+            models.Index(fields=["assigned_user", "creation_time", "id"], name="ticket_assigned_created_idx"),
+            models.Index(fields=["created_user", "creation_time", "id"], name="ticket_creator_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.id} - {self.subject}"
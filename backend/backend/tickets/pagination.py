@@ -0,0 +1,121 @@
+# tickets/pagination.py - KEYSET (CURSOR) PAGINATION FOR TICKET LISTS
+import base64
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TicketCursorPagination(BasePagination):
+    """
+    Keyset pagination ordered newest-first on (creation_time, id).
+
+    The cursor encodes the (creation_time, id) of the row at the page edge,
+    so every page is a bounded range scan on the (creation_time, id) index
+    instead of an OFFSET that grows with page depth. `id` breaks ties between
+    tickets created in the same instant, which keeps the ordering stable.
+    """
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    ordering = ("-creation_time", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            direction, position = "next", None
+        else:
+            direction, position = cursor
+
+        if direction == "next":
+            if position is not None:
+                created, pk = position
+                queryset = queryset.filter(
+                    Q(creation_time__lt=created) | Q(creation_time=created, id__lt=pk)
+                )
+            rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            self.page = rows[:self.page_size]
+            self.has_next = has_more
+            self.has_previous = position is not None
+        else:
+            created, pk = position
+            queryset = queryset.filter(
+                Q(creation_time__gt=created) | Q(creation_time=created, id__gt=pk)
+            )
+            rows = list(queryset.order_by("creation_time", "id")[:self.page_size + 1])
+            has_more = len(rows) > self.page_size
+            self.page = list(reversed(rows[:self.page_size]))
+            self.has_next = True
+            self.has_previous = has_more
+
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor("next", self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor("previous", self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    # ----- cursor encoding -----
+
+    def encode_cursor(self, direction, ticket):
+        token = f"{direction[0]}|{ticket.creation_time.isoformat()}|{ticket.pk}"
+        encoded = base64.urlsafe_b64encode(token.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            token = base64.urlsafe_b64decode(parse.unquote(encoded).encode("ascii")).decode("ascii")
+            flag, created, pk = token.split("|")
+            created = parse_datetime(created)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if flag not in ("n", "p") or created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return ("next" if flag == "n" else "previous"), (created, pk)
@@ -40,6 +40,7 @@ class TicketSerializer(serializers.ModelSerializer):
     priority_label = serializers.SerializerMethodField()
     status_label = serializers.SerializerMethodField()
     thread_id = serializers.SerializerMethodField()
+    classification_stage_label = serializers.SerializerMethodField()
     
     
     # Allow AI/Backend to populate these (frontend won't send them)
@@ -52,9 +53,11 @@ class TicketSerializer(serializers.ModelSerializer):
             'id', 'subject', 'description', 'queue', 'priority_id', 
             'creation_time', 'status', 'created_user', 'created_user_name', 
             'assigned_user', 'sla_time', 'queue_label', 'priority_label', 
-            'status_label', 'thread_id'
+            'status_label', 'thread_id', 'classification_stage',
+            'classification_stage_label', 'classification_provisional'
         ]
-        read_only_fields = ["id", "creation_time", "created_user", "created_user_name"]
+        read_only_fields = ["id", "creation_time", "created_user", "created_user_name",
+                            "classification_stage", "classification_provisional"]
 
     def get_created_user_name(self, obj):
         return obj.created_user.username if obj.created_user else "User"
@@ -67,9 +70,12 @@ class TicketSerializer(serializers.ModelSerializer):
 
     def get_status_label(self, obj):
         return obj.get_status_display()
+
+    def get_classification_stage_label(self, obj):
+        return obj.get_classification_stage_display()
     
     def get_thread_id(self, obj):
-        """Return the CommentThread id for this ticket"""
+        """Return the CommentThread id for this ticket (select_related by the viewset)"""
         if hasattr(obj, 'thread'):
             return obj.thread.id
         return None
@@ -100,6 +106,12 @@ class TicketSerializer(serializers.ModelSerializer):
                 except User.DoesNotExist:
                     instance.assigned_user = None
         
+        # A manual re-queue/re-prioritise is final and wins over a pending LLM refinement
+        if any(field in validated_data and validated_data[field] != getattr(instance, field)
+               for field in ("queue", "priority_id")):
+            instance.classification_stage = Ticket.CLASSIFIED_BY_AGENT
+            instance.classification_provisional = False
+
         # Update all other fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -125,7 +137,7 @@ class CommentSerializer(serializers.ModelSerializer):
 class CommentThreadSerializer(serializers.ModelSerializer):
     """Serializer for comment threads with nested comments"""
     comments = CommentSerializer(many=True, read_only=True)
-    ticket_id = serializers.ReadOnlyField(source="ticket.id")
+    ticket_id = serializers.ReadOnlyField()
 
     class Meta:
         model = CommentThread
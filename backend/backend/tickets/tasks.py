@@ -0,0 +1,39 @@
+from backend.background import run_in_background
+
+from .ai_classifier import classify_ticket_llm
+from .models import Ticket, SLATime
+
+
+def refine_classification_task(ticket_id):
+    """
+    Background job: re-classify a provisionally classified ticket with the LLM.
+    If the LLM fails the first-pass result stands and is marked final. The
+    update is conditional on the ticket still being provisional, so an agent
+    who re-queued it in the meantime is not overridden.
+    """
+    ticket = Ticket.objects.filter(pk=ticket_id, classification_provisional=True).first()
+    if ticket is None:
+        return
+
+    result = classify_ticket_llm(ticket.subject, ticket.description)
+    if result is None:
+        Ticket.objects.filter(pk=ticket_id, classification_provisional=True).update(
+            classification_provisional=False,
+        )
+        print(f"⚠️ Ticket #{ticket_id}: LLM refinement failed, keeping first-pass classification")
+        return
+
+    updated = Ticket.objects.filter(pk=ticket_id, classification_provisional=True).update(
+        queue=result["queue"],
+        priority_id=result["priority"],
+        sla_time=SLATime.objects.filter(priority_id=result["priority"]).first(),
+        classification_stage=Ticket.CLASSIFIED_BY_LLM,
+        classification_provisional=False,
+    )
+    if updated:
+        print(f"🤖 Ticket #{ticket_id} refined by LLM: Queue {result['queue']} | Priority {result['priority']}")
+        print(f"   Reasoning: {result.get('reasoning', '')}")
+
+
+def schedule_classification_refinement(ticket):
+    run_in_background(refine_classification_task, ticket.pk, key=f"ticket-classify:{ticket.pk}")
@@ -1,6 +1,23 @@
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+
+from django.conf import settings
+from django.db.models import Count, Prefetch
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from backend import metrics
+from backend.gemini import gemini
+from backend.ratelimit import ConcurrencyLimiter
+from backend.streaming import iterate_in_thread, run_in_thread, sse_event
+from backend.throttling import TokenBucketThrottle
 
 from .models import Ticket, SLATime, CommentThread, Comment #, KnowledgeBase, CannedResponse
 from .serializers import (
@@ -11,7 +28,10 @@ from .serializers import (
     # KnowledgeBaseSerializer,
     # CannedResponseSerializer,
 )
-from .ai_classifier import classify_ticket  # NEW: Import auto-classifier
+from .ai_classifier import classify_ticket_fast, is_confident  # NEW: Import auto-classifier
+from .bulk_classifier import STAGE_BY_SOURCE, classify_tickets_bulk, reclassify_tickets
+from .tasks import schedule_classification_refinement
+from .pagination import TicketCursorPagination
 from .email_service import (
     send_ticket_created_notification,
     send_ticket_assigned_notification,
@@ -22,13 +42,31 @@ from .email_service import (
 
 from .analytics import calculate_sla_compliance, calculate_fcr_rate, get_workload_stats
 
+
+def comment_queryset():
+    """Comments with the author joined, as CommentSerializer reads user.id/username."""
+    return Comment.objects.select_related("user")
+
+
+def comment_thread_queryset():
+    """Threads with their comments (and authors) prefetched in one extra query."""
+    return CommentThread.objects.prefetch_related(
+        Prefetch("comments", queryset=comment_queryset())
+    )
+
+
 class TicketViewSet(viewsets.ModelViewSet):
     """
     List/create/update tickets.
     Users see only their tickets, agents/admins see all.
+    Lists are cursor-paginated newest-first and accept
+    ?status=, ?queue=, ?priority_id= and ?assigned_user= filters;
+    /counts/ gives totals for the same tickets and filters.
     """
     serializer_class = TicketSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TicketCursorPagination
+    filter_fields = ("status", "queue", "priority_id", "assigned_user")
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
 
     @action(detail=False, methods=['get'])
@@ -48,22 +86,96 @@ class TicketViewSet(viewsets.ModelViewSet):
         }
         return Response(data)
 
+    @action(detail=False, methods=['get'])
+    def counts(self, request):
+        """
+        Ticket totals for the dashboards: {"total", "by_status", "by_queue", "by_priority"}.
+        Scoped and filtered like the list, so the numbers match what paging through
+        it would show without the client downloading every row.
+        """
+        queryset = self.get_queryset().order_by()
+        data = {"total": queryset.count()}
+        for field, name in (("status", "by_status"), ("queue", "by_queue"), ("priority_id", "by_priority")):
+            data[name] = {row[field]: row["n"] for row in queryset.values(field).annotate(n=Count("id"))}
+        return Response(data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-classify')
+    def bulk_classify(self, request):
+        """
+        Classify many tickets with batched Gemini prompts (rule-based fallback per ticket).
+        POST {"ticket_ids": [...]} re-classifies and saves existing tickets;
+        POST {"tickets": [{"subject": ..., "description": ...}]} only returns classifications.
+        The work runs within the request, so at most TICKET_CLASSIFY_API_MAX tickets
+        (one prompt by default) are accepted; use `manage.py classify_tickets` for backlogs.
+        """
+        if request.user.role not in [1, 3] and not request.user.is_staff:
+            return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
+
+        limit = settings.TICKET_CLASSIFY_API_MAX
+        ticket_ids = request.data.get("ticket_ids")
+        items = request.data.get("tickets")
+        if ticket_ids is not None:
+            if not isinstance(ticket_ids, list) or not all(isinstance(i, int) for i in ticket_ids):
+                raise ValidationError({"ticket_ids": "Must be a list of ticket ids."})
+            if len(ticket_ids) > limit:
+                raise ValidationError({"ticket_ids": self.bulk_limit_message(limit)})
+            tickets = Ticket.objects.filter(pk__in=ticket_ids).only(
+                "id", "subject", "description", "classification_stage"
+            )
+            results = [
+                {"id": ticket.id, **result}
+                for ticket, result in reclassify_tickets(tickets)
+            ]
+            return Response({"results": results})
+
+        if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+            raise ValidationError({"tickets": "Provide ticket_ids or a list of {subject, description}."})
+        if len(items) > limit:
+            raise ValidationError({"tickets": self.bulk_limit_message(limit)})
+        pairs = [(str(i.get("subject", "")), str(i.get("description", ""))) for i in items]
+        return Response({"results": classify_tickets_bulk(pairs)})
+
+    @staticmethod
+    def bulk_limit_message(limit):
+        return f"At most {limit} tickets per request; run `manage.py classify_tickets` for more."
+
     def get_queryset(self):
         user = self.request.user
-        if user.role == user.ROLE_AGENT or user.role == user.ROLE_ADMIN or user.is_staff:
-            return Ticket.objects.all()
-        return Ticket.objects.filter(created_user=user)
+        # created_user and thread are read by TicketSerializer for every row
+        queryset = Ticket.objects.select_related("created_user", "thread")
+        if not (user.role == user.ROLE_AGENT or user.role == user.ROLE_ADMIN or user.is_staff):
+            queryset = queryset.filter(created_user=user)
+
+        # Equality filters; each one leads a (field, creation_time, id) index
+        # so the filtered list is still a keyset range scan.
+        if self.action in ("list", "counts"):
+            for field in self.filter_fields:
+                value = self.request.query_params.get(field)
+                if value is None or value == "":
+                    continue
+                if field == "assigned_user" and value.lower() in ("none", "null"):
+                    queryset = queryset.filter(assigned_user__isnull=True)
+                    continue
+                try:
+                    queryset = queryset.filter(**{field: int(value)})
+                except ValueError:
+                    raise ValidationError({field: "Must be an integer."})
+        return queryset
 
     def perform_create(self, serializer):
         """
         Create ticket with SMART auto-classification.
-        Automatically determines queue and priority based on content.
+        The ticket is saved straight away with the local model's (or rule-based)
+        classification; unless the local model was confident, and when Gemini is
+        configured, a background job refines queue/priority and clears
+        classification_provisional.
         """
         subject = self.request.data.get("subject", "")
         description = self.request.data.get("description", "")
         
-        # 🤖 SMART AUTO-CLASSIFICATION
-        ai_result = classify_ticket(subject, description)
+        # 🤖 SMART AUTO-CLASSIFICATION (fast first pass)
+        ai_result = classify_ticket_fast(subject, description)
+        refine = gemini.available and not is_confident(ai_result)
         
         # Use auto-classification results
         queue = ai_result["queue"]
@@ -77,7 +189,11 @@ class TicketViewSet(viewsets.ModelViewSet):
             queue=queue,
             priority_id=priority_id,
             sla_time=sla,
+            classification_stage=STAGE_BY_SOURCE[ai_result["source"]],
+            classification_provisional=refine,
         )
+        if refine:
+            schedule_classification_refinement(ticket)
 
         # Ensure each ticket has a thread
         CommentThread.objects.get_or_create(ticket=ticket)
@@ -86,7 +202,7 @@ class TicketViewSet(viewsets.ModelViewSet):
         print(f"✅ Ticket #{ticket.id} auto-classified:")
         print(f"   Subject: {subject[:50]}...")
         print(f"   Queue: {queue} | Priority: {priority_id}")
-        print(f"   Reasoning: {ai_result['reasoning']}")
+        print(f"   Reasoning: {ai_result['reasoning']}{' (LLM refinement queued)' if refine else ''}")
         
         # 📧 Send email notification to user
         try:
@@ -181,7 +297,7 @@ class CommentThreadViewSet(viewsets.ModelViewSet):
     ViewSet for comment threads.
     Used at /api/comment-threads/<id>/
     """
-    queryset = CommentThread.objects.all()
+    queryset = comment_thread_queryset()
     serializer_class = CommentThreadSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -191,7 +307,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     ViewSet for individual comments.
     Used at /api/comments/
     """
-    queryset = Comment.objects.all()
+    queryset = comment_queryset()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -236,7 +352,7 @@ class CommentThreadDetailView(generics.RetrieveAPIView):
     Returns a ticket's full comment thread (for chat view) by thread id.
     (Kept for backward compatibility: /api/threads/<id>/)
     """
-    queryset = CommentThread.objects.all()
+    queryset = comment_thread_queryset()
     serializer_class = CommentThreadSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -270,29 +386,156 @@ def ticket_thread_view(request, pk):
         )
 
     try:
-        thread = CommentThread.objects.get(ticket=ticket)
+        thread = comment_thread_queryset().get(ticket=ticket)
     except CommentThread.DoesNotExist:
         return Response(
             {"detail": "Thread not found."},
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    serializer = CommentThreadSerializer(thread)
     serializer = CommentThreadSerializer(thread)
     return Response(serializer.data)
 
-from .ai_chat import get_ai_chat_response
+from .ai_chat import aget_ai_chat_response, stream_ai_chat_response
+
+# Chats in flight per process (/api/chat/ and /api/chat/stream/ together);
+# beyond the cap requests get an immediate "busy" reply instead of queueing
+chat_limiter = ConcurrencyLimiter(settings.CHAT_MAX_CONCURRENCY)
+metrics.register_gauge("chat.in_flight", lambda: chat_limiter.in_flight)
+
+# Each stream holds one of these threads until Gemini's (synchronous) stream ends;
+# the limiter keeps streams from ever queueing for a thread
+chat_stream_limiter = ConcurrencyLimiter(settings.CHAT_STREAM_MAX_CONCURRENCY)
+chat_stream_executor = ThreadPoolExecutor(max_workers=settings.CHAT_STREAM_MAX_CONCURRENCY,
+                                          thread_name_prefix="chat-stream")
+metrics.register_gauge("chat.stream.in_flight", lambda: chat_stream_limiter.in_flight)
 
-@api_view(["POST"])
-@permission_classes([permissions.AllowAny]) # Allow public for landing page chat
-def chat_with_ai(request):
+class ChatThrottle(TokenBucketThrottle):
+    """Per-user / per-IP token buckets shared by /api/chat/ and /api/chat/stream/ (CHAT_THROTTLE_*)."""
+    scope = "chat"
+    setting_prefix = "CHAT_THROTTLE"
+
+def read_chat_request(request):
+    """(message, session_id) from a JSON or form-encoded chat request; "" / None if missing."""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+    else:
+        data = request.POST
+    message, session_id = data.get("message", ""), data.get("session_id")
+    return (message if isinstance(message, str) else "",
+            session_id if isinstance(session_id, str) else None)
+
+def count_answer(result):
+    """Which path answered (faq_exact, faq_similar, canned_response, answer_cache, llm, fallback, ...)."""
+    metrics.incr(f"chat.answered_by.{result.get('answered_by', 'unknown')}")
+
+def chat_busy_reply():
+    metrics.incr("chat.busy")
+    return {
+        "response": "I'm helping a lot of people right now. Please try again in a few seconds, or create a ticket.",
+        "show_ticket_option": True,
+        "busy": True,
+    }
+
+def chat_busy_response():
+    response = JsonResponse(chat_busy_reply(), status=503)
+    response["Retry-After"] = "5"
+    return response
+
+async def chat_throttled_response(request):
+    """A 429 "slow down" reply if this client is over its chat rate, else None."""
+    throttle = ChatThrottle()
+    if await run_in_thread(throttle.allow_request, request, None):
+        return None
+    response = JsonResponse({
+        "response": "You're sending messages faster than I can answer. Please wait a few seconds and try again.",
+        "show_ticket_option": False,
+        "busy": True,
+        "throttled": True,
+    }, status=429)
+    response["Retry-After"] = str(max(1, math.ceil(throttle.wait())))
+    return response
+
+@csrf_exempt
+@require_POST
+async def chat_with_ai(request):
     """
     Endpoint for the AI Chatbot.
-    POST body: { "message": "..." }
+    POST body: { "message": "...", "session_id": "..." (optional, from the previous answer) }
+    Public (landing page chat). Async: under ASGI (backend/asgi.py) waiting on
+    Gemini holds no worker thread, so chats don't starve the ticket APIs.
+    Returns 503 with a "busy" reply when CHAT_MAX_CONCURRENCY chats are in flight,
+    and 429 (also a "busy" reply) when the caller is over its CHAT_THROTTLE_* rate.
+    "answered_by" in the result says which path answered (faq_exact, faq_similar,
+    canned_response, answer_cache, llm, fallback, unavailable); counted in metrics.
     """
-    message = request.data.get("message", "")
+    throttled = await chat_throttled_response(request)
+    if throttled is not None:
+        return throttled
+    message, session_id = read_chat_request(request)
     if not message:
-        return Response({"error": "Message required"}, status=400)
-    
-    result = get_ai_chat_response(message)
-    return Response(result)
+        return JsonResponse({"error": "Message required"}, status=400)
+    if not chat_limiter.try_acquire():
+        return chat_busy_response()
+    try:
+        result = await aget_ai_chat_response(message, session_id)
+    finally:
+        chat_limiter.release()
+    count_answer(result)
+    return JsonResponse(result)
+
+@csrf_exempt
+@require_POST
+async def chat_stream(request):
+    """
+    Streaming variant of the AI Chatbot endpoint, as Server-Sent Events.
+    POST body: { "message": "...", "session_id": "..." (optional) }
+    Events: "token" {"text": "..."} for each piece of the answer as it is generated,
+    then "done" {"show_ticket_option", "ticket_context", "sources", "session_id", "answered_by"};
+    or a single "busy" event with the 503 reply if the chat capacity filled up meanwhile.
+    Public like /api/chat/ and sharing its concurrency cap and throttle. Gemini's
+    streaming API is synchronous, so each stream holds a thread of its own pool
+    (CHAT_STREAM_MAX_CONCURRENCY) until the answer ends; the event loop itself is
+    free between events.
+    """
+    throttled = await chat_throttled_response(request)
+    if throttled is not None:
+        return throttled
+    message, session_id = read_chat_request(request)
+    if not message:
+        return JsonResponse({"error": "Message required"}, status=400)
+    if chat_limiter.in_flight >= chat_limiter.limit or chat_stream_limiter.in_flight >= chat_stream_limiter.limit:
+        return chat_busy_response()
+
+    def release():
+        chat_stream_limiter.release()
+        chat_limiter.release()
+
+    async def events():
+        # The slot is only taken once the stream is being sent: a response that is
+        # dropped unsent never runs this generator, so it couldn't give one back
+        if not chat_limiter.try_acquire():
+            # The last slot went to another request since the check above
+            yield sse_event("busy", chat_busy_reply())
+            return
+        if not chat_stream_limiter.try_acquire():
+            chat_limiter.release()
+            yield sse_event("busy", chat_busy_reply())
+            return
+        # The producer thread gives the slots back once the Gemini stream has actually
+        # stopped, which is after the client has gone if it disconnects mid-answer
+        async for event, data in iterate_in_thread(stream_ai_chat_response, message, session_id,
+                                                   on_exit=release, executor=chat_stream_executor):
+            if event == "done":
+                count_answer(data)
+            yield sse_event(event, {"text": data} if event == "token" else data)
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
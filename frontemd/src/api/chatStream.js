@@ -0,0 +1,58 @@
+// src/api/chatStream.js
+import api from "./client";
+
+/**
+ * POST a chat message to the streaming endpoint and read its Server-Sent Events.
+ * sessionId (null for a new conversation) continues a server-side chat session.
+ * onToken(text) is called for each piece of the answer as it arrives;
+ * resolves with the final "done" payload (show_ticket_option, ticket_context, sources, session_id).
+ * When the server is at its chat capacity (a 503, or a "busy" event if it filled up
+ * as the stream opened), or this client is over its chat rate (429), the error
+ * carries the "busy" reply as err.busy.
+ */
+export async function streamChat(message, sessionId, onToken) {
+  const res = await fetch(`${api.defaults.baseURL}/api/chat/stream/`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ message, session_id: sessionId }),
+  });
+  if (res.status === 503 || res.status === 429) {
+    const err = new Error("Chat service busy");
+    err.busy = await res.json();
+    throw err;
+  }
+  if (!res.ok || !res.body) {
+    throw new Error(`Chat stream failed: ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let end;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = JSON.parse(data);
+      if (event === "token") onToken(payload.text);
+      else if (event === "done") return payload;
+      else if (event === "busy") {
+        const err = new Error("Chat service busy");
+        err.busy = payload;
+        throw err;
+      }
+    }
+  }
+  throw new Error("Chat stream ended early");
+}
@@ -0,0 +1,35 @@
+// src/api/tickets.js
+import api from "./client";
+
+export const TICKET_PAGE_SIZE = 50;
+
+/**
+ * GET /api/tickets/ is cursor-paginated ({ next, previous, results }), newest first.
+ * Pass `next` from the previous page to load the one after it (it already carries
+ * the cursor and filters), or null for the first page with the given filters
+ * (status, queue, priority_id, assigned_user).
+ */
+export async function fetchTicketPage(next = null, params = {}) {
+  const res = next
+    ? await api.get(next)
+    : await api.get("/api/tickets/", { params: { page_size: TICKET_PAGE_SIZE, ...params } });
+  return res.data;
+}
+
+/**
+ * Server-side ticket totals ({ total, by_status, by_queue, by_priority }) for the
+ * same tickets and filters as the list, so dashboards never count loaded rows.
+ */
+export async function fetchTicketCounts(params = {}) {
+  const res = await api.get("/api/tickets/counts/", { params });
+  return res.data;
+}
+
+/** List filters from "all"-or-id dropdown values; "all" means no filter. */
+export function ticketFilterParams(filters) {
+  const params = {};
+  for (const [field, value] of Object.entries(filters)) {
+    if (value !== "all" && value !== "") params[field] = value;
+  }
+  return params;
+}
@@ -1,6 +1,7 @@
 // src/components/ChatbotModal.jsx
 import { useState, useRef, useEffect } from "react";
 import api from "../api/client";
+import { streamChat } from "../api/chatStream";
 
 // ===== Modal Styles =====
 const modalOverlayStyle = {
@@ -119,6 +120,12 @@ export default function ChatbotModal({ onClose, onNavigate }) {
     const [suggestions, setSuggestions] = useState([]);
     const [showSuggestions, setShowSuggestions] = useState(false);
     const scrollRef = useRef(null);
+    // Server-side chat session: the backend keeps the conversation, we only send the new message
+    const sessionIdRef = useRef(null);
+
+    const rememberSession = (sessionId) => {
+        if (sessionId) sessionIdRef.current = sessionId;
+    };
 
     useEffect(() => {
         if (scrollRef.current) {
@@ -165,20 +172,67 @@ export default function ChatbotModal({ onClose, onNavigate }) {
         setShowSuggestions(false);
         setLoading(true);
 
+        let streamed = false;
         try {
-            // Gemini AI Chat Logic
-            const res = await api.post("/api/chat/", { message: userMsg.text });
-            const data = res.data;
+            // Gemini AI Chat Logic: show the answer as it is generated
+            const done = await streamChat(userMsg.text, sessionIdRef.current, (text) => {
+                if (!streamed) {
+                    streamed = true;
+                    setLoading(false);
+                    setMessages(prev => [...prev, { role: "ai", text }]);
+                } else {
+                    setMessages(prev => {
+                        const last = prev[prev.length - 1];
+                        return [...prev.slice(0, -1), { ...last, text: last.text + text }];
+                    });
+                }
+            });
+            rememberSession(done.session_id);
 
-            setMessages(prev => [...prev, {
-                role: "ai",
-                text: data.response,
-                showTicketAction: data.show_ticket_option,
-                ticketContext: data.ticket_context || userMsg.text
-            }]);
+            setMessages(prev => {
+                const last = prev[prev.length - 1];
+                return [...prev.slice(0, -1), {
+                    ...last,
+                    showTicketAction: done.show_ticket_option,
+                    ticketContext: done.ticket_context || userMsg.text
+                }];
+            });
 
         } catch (err) {
-            setMessages(prev => [...prev, { role: "ai", text: "Sorry, I had trouble connecting." }]);
+            if (streamed) {
+                // Keep the partial answer, offer a ticket
+                setMessages(prev => {
+                    const last = prev[prev.length - 1];
+                    return [...prev.slice(0, -1), { ...last, showTicketAction: true, ticketContext: userMsg.text }];
+                });
+            } else if (err.busy) {
+                // Too many chats in progress (or sent too fast); retrying the other endpoint won't help
+                setMessages(prev => [...prev, {
+                    role: "ai",
+                    text: err.busy.response,
+                    showTicketAction: err.busy.show_ticket_option,
+                    ticketContext: userMsg.text
+                }]);
+            } else {
+                // Streaming unavailable: fall back to the regular endpoint
+                try {
+                    const res = await api.post("/api/chat/", { message: userMsg.text, session_id: sessionIdRef.current });
+                    const data = res.data;
+                    rememberSession(data.session_id);
+
+                    setMessages(prev => [...prev, {
+                        role: "ai",
+                        text: data.response,
+                        showTicketAction: data.show_ticket_option,
+                        ticketContext: data.ticket_context || userMsg.text
+                    }]);
+                } catch (fallbackErr) {
+                    const busy = fallbackErr.response?.data?.busy ? fallbackErr.response.data : null;
+                    setMessages(prev => [...prev, busy
+                        ? { role: "ai", text: busy.response, showTicketAction: busy.show_ticket_option, ticketContext: userMsg.text }
+                        : { role: "ai", text: "Sorry, I had trouble connecting." }]);
+                }
+            }
         } finally {
             setLoading(false);
         }
@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import api from "../api/client";
+import { fetchTicketCounts, fetchTicketPage, ticketFilterParams } from "../api/tickets";
 import {
   Chart as ChartJS,
   ArcElement,
@@ -395,6 +396,8 @@ export default function AdminDashboard({ onLogout }) {
   const [activeTab, setActiveTab] = useState("overview");
   const [users, setUsers] = useState([]);
   const [tickets, setTickets] = useState([]);
+  const [nextTicketsUrl, setNextTicketsUrl] = useState(null);
+  const [ticketTotal, setTicketTotal] = useState(0);
 
   // Sorting State
   const [sortConfig, setSortConfig] = useState({ key: 'id', direction: 'desc' });
@@ -429,17 +432,9 @@ export default function AdminDashboard({ onLogout }) {
       );
     }
 
-    // 2. Filter by Status
-    if (statusFilter !== "all") {
-      result = result.filter(t => t.status === Number(statusFilter));
-    }
-
-    // 3. Filter by Queue
-    if (queueFilter !== "all") {
-      result = result.filter(t => t.queue === Number(queueFilter));
-    }
+    // Status and queue filters are applied by the server (fetchTickets)
 
-    // 4. Sort
+    // 2. Sort
     result.sort((a, b) => {
       const valA = a[sortConfig.key];
       const valB = b[sortConfig.key];
@@ -550,11 +545,15 @@ export default function AdminDashboard({ onLogout }) {
     }
   };
 
+  // First page only; further pages load on demand through `next`
   const fetchTickets = async () => {
     setLoading(true);
     try {
-      const res = await api.get("/api/tickets/");
-      setTickets(res.data);
+      const params = ticketFilterParams({ status: statusFilter, queue: queueFilter });
+      const [page, counts] = await Promise.all([fetchTicketPage(null, params), fetchTicketCounts(params)]);
+      setTickets(page.results);
+      setNextTicketsUrl(page.next);
+      setTicketTotal(counts.total);
     } catch (err) {
       console.error("Failed to fetch tickets:", err);
       showNotification("Failed to load tickets", "error");
@@ -563,6 +562,18 @@ export default function AdminDashboard({ onLogout }) {
     }
   };
 
+  const loadMoreTickets = async () => {
+    if (!nextTicketsUrl) return;
+    try {
+      const page = await fetchTicketPage(nextTicketsUrl);
+      setTickets(prev => [...prev, ...page.results]);
+      setNextTicketsUrl(page.next);
+    } catch (err) {
+      console.error("Failed to fetch tickets:", err);
+      showNotification("Failed to load more tickets", "error");
+    }
+  };
+
   const fetchFAQs = async () => {
     try {
       const res = await api.get("/api/faqs/");
@@ -738,7 +749,7 @@ export default function AdminDashboard({ onLogout }) {
       return;
     }
 
-    if (!window.confirm(`Resolve all ${openTickets.length} open tickets?`)) return;
+    if (!window.confirm(`Resolve the ${openTickets.length} open tickets loaded?`)) return;
 
     try {
       await Promise.all(
@@ -978,7 +989,6 @@ export default function AdminDashboard({ onLogout }) {
 
   useEffect(() => {
     fetchUsers();
-    fetchTickets();
     fetchKnowledgeBase();
     fetchCannedResponses();
     fetchSLASettings();
@@ -986,15 +996,18 @@ export default function AdminDashboard({ onLogout }) {
     fetchFAQs();
   }, []);
 
+  // Also the initial load
+  useEffect(() => {
+    fetchTickets();
+  }, [statusFilter, queueFilter]);
+
   const totalUsers = users.length;
   const agentCount = users.filter((u) => u.role === 3).length;
   const adminCount = users.filter((u) => u.role === 1).length;
-  const totalTickets = tickets.length;
-  const openTickets = tickets.filter((t) => t.status === 1).length;
-  const closedTickets = tickets.filter((t) => t.status === 2).length;
-  const hrTickets = tickets.filter(t => t.queue === 1).length;
-  const itTickets = tickets.filter(t => t.queue === 2).length;
-  const facilitiesTickets = tickets.filter(t => t.queue === 3).length;
+  // Server-side totals: only a page of tickets is loaded at a time
+  const totalTickets = analytics.total_tickets;
+  const openTickets = analytics.open_tickets;
+  const closedTickets = analytics.closed_tickets;
 
   const filteredUsers = users.filter(u =>
     u.username.toLowerCase().includes(userSearch.toLowerCase()) ||
@@ -1254,7 +1267,7 @@ export default function AdminDashboard({ onLogout }) {
       {activeTab === "tickets" && (
         <div style={panelStyle}>
           <div style={{ display: "flex", justifyContent: "space-between", alignItems: "center", marginBottom: "12px" }}>
-            <div style={sectionTitleStyle}>All Tickets ({getProcessedTickets().length})</div>
+            <div style={sectionTitleStyle}>All Tickets ({ticketTotal})</div>
             <div style={{ display: "flex", gap: "8px" }}>
               <button style={outlineBtnStyle} onClick={() => exportData("tickets")}>Export CSV</button>
               <button style={successBtnStyle} onClick={handleBulkResolve}>Resolve All Open</button>
@@ -1264,7 +1277,7 @@ export default function AdminDashboard({ onLogout }) {
           <div style={filterRowStyle}>
             <input
               style={searchInputStyle}
-              placeholder="Search tickets..."
+              placeholder="Search loaded tickets..."
               value={ticketSearch}
               onChange={(e) => setTicketSearch(e.target.value)}
             />
@@ -1328,6 +1341,13 @@ export default function AdminDashboard({ onLogout }) {
               </tbody>
             </table>
           </div>
+          {nextTicketsUrl && (
+            <div style={{ display: "flex", justifyContent: "center", marginTop: "12px" }}>
+              <button style={outlineBtnStyle} onClick={loadMoreTickets}>
+                Load more ({tickets.length} of {ticketTotal})
+              </button>
+            </div>
+          )}
         </div>
       )}
 
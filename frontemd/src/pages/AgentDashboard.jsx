@@ -1,6 +1,7 @@
 // src/pages/AgentDashboard.jsx - SPLIT PANE AGENT CONSOLE
 import { useEffect, useState } from "react";
 import api from "../api/client";
+import { fetchTicketCounts, fetchTicketPage, ticketFilterParams } from "../api/tickets";
 import ChatInterface from "../components/ChatInterface";
 
 // ===== Layout & Typography =====
@@ -197,6 +198,8 @@ const getPriorityBadge = (p) => {
 export default function AgentDashboard({ onLogout }) {
   const [tickets, setTickets] = useState([]);
   const [filteredTickets, setFilteredTickets] = useState([]);
+  const [nextTicketsUrl, setNextTicketsUrl] = useState(null);
+  const [ticketTotal, setTicketTotal] = useState(0);
   const [cannedResponses, setCannedResponses] = useState([]);
 
   // Selection
@@ -226,10 +229,25 @@ export default function AgentDashboard({ onLogout }) {
     role: Number(localStorage.getItem("role"))
   };
 
+  // First page only; further pages load on demand through `next`
   const fetchTickets = async () => {
     try {
-      const res = await api.get("/api/tickets/");
-      setTickets(res.data);
+      const params = ticketFilterParams({ queue: queueFilter, status: statusFilter });
+      const [page, counts] = await Promise.all([fetchTicketPage(null, params), fetchTicketCounts(params)]);
+      setTickets(page.results);
+      setNextTicketsUrl(page.next);
+      setTicketTotal(counts.total);
+    } catch (err) {
+      console.error("Failed to load tickets", err);
+    }
+  };
+
+  const loadMoreTickets = async () => {
+    if (!nextTicketsUrl) return;
+    try {
+      const page = await fetchTicketPage(nextTicketsUrl);
+      setTickets(prev => [...prev, ...page.results]);
+      setNextTicketsUrl(page.next);
     } catch (err) {
       console.error("Failed to load tickets", err);
     }
@@ -288,22 +306,18 @@ export default function AgentDashboard({ onLogout }) {
   };
 
   useEffect(() => {
-    fetchTickets();
     fetchCanned();
     fetchKnowledgeBase();
   }, []);
 
-  // Filter Logic
+  // Queue and status filters are applied by the server; also the initial load
   useEffect(() => {
-    let result = tickets;
-
-    if (queueFilter !== "all") {
-      result = result.filter(t => t.queue === Number(queueFilter));
-    }
+    fetchTickets();
+  }, [queueFilter, statusFilter]);
 
-    if (statusFilter !== "all") {
-      result = result.filter(t => t.status === Number(statusFilter));
-    }
+  // Filter Logic (search and sort over the loaded tickets)
+  useEffect(() => {
+    let result = [...tickets];
 
     if (search.trim()) {
       const q = search.toLowerCase();
@@ -325,7 +339,7 @@ export default function AgentDashboard({ onLogout }) {
     });
 
     setFilteredTickets(result);
-  }, [tickets, search, queueFilter, statusFilter, sortOption]);
+  }, [tickets, search, sortOption]);
 
   useEffect(() => {
     if (selectedTicketId) {
@@ -377,7 +391,7 @@ export default function AgentDashboard({ onLogout }) {
             📚 Knowledge Base
           </button>
           <div style={{ fontSize: "13px", color: "#94a3b8" }}>
-            {filteredTickets.length} tickets found
+            {ticketTotal} tickets found
           </div>
           <button style={outlineBtnStyle} onClick={onLogout}>Logout</button>
         </div>
@@ -446,6 +460,11 @@ export default function AgentDashboard({ onLogout }) {
                 </div>
               );
             })}
+            {nextTicketsUrl && (
+              <button style={outlineBtnStyle} onClick={loadMoreTickets}>
+                Load more ({tickets.length} of {ticketTotal})
+              </button>
+            )}
           </div>
         </div>
 
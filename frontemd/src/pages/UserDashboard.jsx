@@ -1,6 +1,7 @@
 // src/pages/UserDashboard.jsx - SPLIT PANE CHAT VERSION
 import { useEffect, useState } from "react";
 import api from "../api/client";
+import { fetchTicketPage } from "../api/tickets";
 import ChatInterface from "../components/ChatInterface";
 
 // ===== Layout + Typography =====
@@ -183,6 +184,7 @@ const getStatusBadge = (status) => {
 
 export default function UserDashboard({ onLogout }) {
   const [tickets, setTickets] = useState([]);
+  const [nextTicketsUrl, setNextTicketsUrl] = useState(null);
   const [selectedTicketId, setSelectedTicketId] = useState(null);
   const [ticketDetail, setTicketDetail] = useState(null);
 
@@ -206,10 +208,23 @@ export default function UserDashboard({ onLogout }) {
     role: Number(localStorage.getItem("role"))
   };
 
+  // First page only; older tickets load on demand through `next`
   const fetchTickets = async () => {
     try {
-      const res = await api.get("/api/tickets/");
-      setTickets(res.data);
+      const page = await fetchTicketPage();
+      setTickets(page.results);
+      setNextTicketsUrl(page.next);
+    } catch (err) {
+      console.error("Failed to load tickets", err);
+    }
+  };
+
+  const loadMoreTickets = async () => {
+    if (!nextTicketsUrl) return;
+    try {
+      const page = await fetchTicketPage(nextTicketsUrl);
+      setTickets(prev => [...prev, ...page.results]);
+      setNextTicketsUrl(page.next);
     } catch (err) {
       console.error("Failed to load tickets", err);
     }
@@ -425,6 +440,11 @@ export default function UserDashboard({ onLogout }) {
               );
             })
           )}
+          {nextTicketsUrl && (
+            <button style={{ ...outlineBtnStyle, marginTop: "8px" }} onClick={loadMoreTickets}>
+              Load older tickets
+            </button>
+          )}
         </div>
 
         {/* Right Pane: Content */}